@@ -1,17 +1,248 @@
 import os
+import sys
+import json
+import hashlib
+import time
 import yaml
-from typing import List, Dict, Any, Optional
+import argparse
+import multiprocessing
+import threading
+import torch
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Callable, Iterator
+from functools import partial
 from pathlib import Path
 from dotenv import load_dotenv
 
-from langchain_community.document_loaders import GitLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain.chains import RetrievalQA
 from langchain_anthropic import ChatAnthropic
+from langchain_core.documents import Document
+from git import Repo
 
-from embedding_switcher import EmbeddingSwitcher, CodeBERTAdapter
+from index_manifest import IndexKey, IndexManifest
+from git_blobs import BlobCache, GitBlobLoader
+from embedding_switcher import (
+    EmbeddingSwitcher, CodeBERTAdapter, GraphCodeBERTAdapter, UniXcoderAdapter, faiss_from_documents,
+    add_documents_np, save_index, load_index,
+    ServiceEmbeddingAdapter, SOCKET_ENV
+)
+
+# First stage of a progressive build for subsystems without key files
+PROGRESSIVE_FIRST_CHUNKS = 256
+
+# Share the C++ splitter, context packer and path matcher with v4
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from cpp_splitter import CppCodeSplitter
+from context_packer import ContextPacker, PackedRetriever, answer_packed, faiss_scored_search
+from path_matcher import PathMatcher
+
+def save_chunk_store(chunks: List[Document], path: Path):
+    """Write chunks as JSON lines so worker processes can share one chunking pass."""
+    with open(path, 'w') as f:
+        for chunk in chunks:
+            f.write(json.dumps({"page_content": chunk.page_content, "metadata": chunk.metadata}) + "\n")
+
+def load_chunk_store(path: Path) -> List[Document]:
+    """Read chunks written by save_chunk_store."""
+    with open(path, 'r') as f:
+        return [Document(**json.loads(line)) for line in f]
+
+def is_key_file(source: str, key_files: List[str]) -> bool:
+    """Check whether a repository path is one of the configured key files."""
+    return any(source == key_file or source.endswith("/" + key_file) for key_file in key_files)
+
+def file_boundary(chunks: List[Document], end: int) -> int:
+    """Move a stage end forward to the first chunk of the next file.
+    
+    Args:
+        chunks: Chunks with each file's chunks adjacent, as loaded
+        end: Proposed end of the stage
+    
+    Returns:
+        End at or after the proposed one that does not split a file
+    """
+    end = min(end, len(chunks))
+    while 0 < end < len(chunks) and chunks[end].metadata['source'] == chunks[end - 1].metadata['source']:
+        end += 1
+    return end
+
+def coverage_metadata(indexed: List[Document], total: List[Document]) -> Dict[str, Any]:
+    """Manifest metadata describing how much of a subsystem a build covers."""
+    return {
+        "chunks": len(indexed),
+        "chunks_total": len(total),
+        "files": len({chunk.metadata['source'] for chunk in indexed}),
+        "files_total": len({chunk.metadata['source'] for chunk in total}),
+        "coverage": round(100.0 * len(indexed) / len(total), 1) if total else 100.0,
+        "complete": len(indexed) == len(total)
+    }
+
+def _build_model_index(model_name: str, factory: Callable, chunk_store: str,
+                       index_root: str, key: IndexKey, num_threads: int,
+                       blob_cache: str, splitter_key: str, embedding_key: str) -> Dict[str, Any]:
+    """Build one model's index in a worker process and publish it to the manifest.
+    
+    Returns:
+        Throughput report for the model
+    """
+    # Split the cores between workers instead of each using all of them
+    torch.set_num_threads(num_threads)
+    chunks = load_chunk_store(Path(chunk_store))
+    
+    start_time = time.time()
+    adapter = factory()
+    load_seconds = time.time() - start_time
+    
+    # Blobs embedded by an earlier build, tag or model run are not re-embedded
+    start_time = time.time()
+    vectors, cached = BlobCache(Path(blob_cache)).embed(
+        chunks, splitter_key, embedding_key, partial(adapter.embed_documents_np, dtype=np.float32)
+    )
+    vector_store = faiss_from_documents(chunks, adapter, vectors=vectors)
+    embed_seconds = time.time() - start_time
+    index_dir = IndexManifest(Path(index_root)).publish(
+        key, partial(save_index, vector_store), coverage_metadata(chunks, chunks)
+    )
+    
+    metrics = adapter.get_model_info()["metrics"]
+    return {
+        "model": model_name,
+        "chunks": len(chunks),
+        "cached_chunks": cached,
+        "load_seconds": load_seconds,
+        "embed_seconds": embed_seconds,
+        "chunks_per_second": len(chunks) / embed_seconds if embed_seconds > 0 else 0,
+        "tokens_per_second": metrics["batching"]["effective_tokens_per_second"],
+        "padding_ratio": metrics["batching"]["padding_ratio"],
+        "index_dir": str(index_dir)
+    }
+
+def format_build_report(reports: List[Dict[str, Any]]) -> str:
+    """Render build_model_indexes reports as a markdown table."""
+    lines = [
+        "| Model | Chunks | Cached | Load (s) | Embed (s) | Chunks/s | Tokens/s | Padding |",
+        "|---|---|---|---|---|---|---|---|"
+    ]
+    for report in reports:
+        lines.append(
+            f"| {report['model']} | {report['chunks']} | {report['cached_chunks']} | {report['load_seconds']:.1f} "
+            f"| {report['embed_seconds']:.1f} | {report['chunks_per_second']:.1f} "
+            f"| {report['tokens_per_second']:.0f} | {report['padding_ratio']:.1%} |"
+        )
+    return "\n".join(lines)
+
+class RAGSession:
+    """Answers questions from indexes and QA chains kept in memory.
+    
+    Each index is loaded from disk once and its RetrievalQA chain built once.
+    Before every question the index manifest is checked; since published
+    builds are never modified, the index is only reloaded when the manifest
+    points its key at a new build, e.g. after build_model_indexes rebuilt it.
+    Embedding models stay under the switcher's residency limit: an index's
+    retriever is pointed at the switcher's current adapter when used, and
+    indexes whose model was unloaded drop their reference to it.
+    """
+    
+    def __init__(self, rag: "BitcoinRAG"):
+        """Initialize an empty session.
+        
+        Args:
+            rag: BitcoinRAG providing the index manifest, embedders and LLM
+        """
+        self.rag = rag
+        self._entries: Dict[IndexKey, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+    
+    def _load(self, key: IndexKey, index_dir: Path, previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Open an index and build its QA chain, carrying over the counters of the copy it replaces."""
+        start_time = time.time()
+        # Documents stay in the build's SQLite docstore; only the top-k
+        # results of each query are read from it
+        vector_store = load_index(index_dir, self.rag.embedding_switcher.get_embeddings(key.model))
+        load_seconds = time.time() - start_time
+        print(f"{'Reloaded' if previous else 'Loaded'} index {index_dir} in {load_seconds:.2f}s")
+        
+        previous = previous or {"loads": 0, "load_seconds": 0.0, "questions": 0}
+        entry = self._entries[key] = {
+            "index_dir": index_dir,
+            "vector_store": vector_store,
+            "qa_chain": self.rag.setup_qa_chain(vector_store),
+            "loads": previous["loads"] + 1,
+            "load_seconds": previous["load_seconds"] + load_seconds,
+            "questions": previous["questions"]
+        }
+        return entry
+    
+    def get_chain(self, key: IndexKey) -> RetrievalQA:
+        """Get the warm QA chain of an index, loading or reloading it if needed.
+        
+        Args:
+            key: Key of a published index
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            index_dir = self.rag.indexes.lookup(key)
+            if entry is None:
+                if index_dir is None:
+                    raise FileNotFoundError(f"No index published for {key}")
+                entry = self._load(key, index_dir, None)
+            elif index_dir is not None and index_dir != entry["index_dir"]:
+                try:
+                    entry = self._load(key, index_dir, entry)
+                except Exception as e:
+                    # Retried on the next question
+                    print(f"Keeping loaded index {entry['index_dir']}; reload failed: {e}")
+            
+            entry["vector_store"].embedding_function = self.rag.embedding_switcher.get_embeddings(key.model)
+            resident = set(self.rag.embedding_switcher.resident_embedders())
+            for other_key, other in self._entries.items():
+                if other_key.model not in resident:
+                    other["vector_store"].embedding_function = None
+            entry["questions"] += 1
+            return entry["qa_chain"]
+    
+    def ask(self, question: str, key: IndexKey) -> Dict[str, Any]:
+        """Answer a question from a warm index.
+        
+        Returns:
+            Dictionary with the answer, its source passages and the context
+            packing counts
+        """
+        answer, documents, context = answer_packed(self.get_chain(key), question)
+        return {
+            "answer": answer,
+            "context": context,
+            "sources": [
+                {
+                    "source": doc.metadata["source"],
+                    "content": doc.page_content
+                }
+                for doc in documents
+            ]
+        }
+    
+    def invalidate(self, key: IndexKey):
+        """Drop a loaded index so the next question reloads it."""
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get per-index load counts, load time, questions served and documents read."""
+        with self._lock:
+            return {
+                key.slug(): {
+                    "model": key.model,
+                    "subsystem": key.subsystem,
+                    "loads": entry["loads"],
+                    "load_seconds": entry["load_seconds"],
+                    "questions": entry["questions"],
+                    "documents_read": entry["vector_store"].docstore.lookups
+                }
+                for key, entry in self._entries.items()
+            }
 
 class BitcoinRAG:
     def __init__(self, config_path: str = "embedding_config.yaml"):
@@ -23,8 +254,27 @@ class BitcoinRAG:
             self.config = yaml.safe_load(f)
         
         # Initialize components
-        self.embedding_switcher = EmbeddingSwitcher()
-        self.embedding_switcher.register_adapter('codebert', CodeBERTAdapter())
+        # Models are loaded on first use; only max_resident_models stay in memory
+        embedding_config = self.config['embedding']
+        self.embedding_switcher = EmbeddingSwitcher(
+            max_resident=embedding_config.get('max_resident_models', 1)
+        )
+        adapter_kwargs = {
+            'backend': embedding_config.get('backend', 'torch'),
+            'onnx_cache_dir': str(Path(embedding_config['cache_dir']) / "onnx"),
+            'replicas': embedding_config.get('replicas', 0),
+            'threads_per_replica': embedding_config.get('threads_per_replica')
+        }
+        # With a shared embedding service, models stay resident there and are
+        # only loaded here if it cannot be reached
+        service_socket = embedding_config.get('service_socket') or os.getenv(SOCKET_ENV)
+        for name, adapter_class in (('codebert', CodeBERTAdapter),
+                                    ('graphcodebert', GraphCodeBERTAdapter),
+                                    ('unixcoder', UniXcoderAdapter)):
+            factory = partial(adapter_class, **adapter_kwargs)
+            if service_socket:
+                factory = partial(ServiceEmbeddingAdapter, name, service_socket, factory)
+            self.embedding_switcher.register_factory(name, factory)
         
         # Initialize LLM
         self.llm = ChatAnthropic(
@@ -33,124 +283,398 @@ class BitcoinRAG:
             max_tokens=4000
         )
         
-        # Initialize text splitter
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
+        # Pack retrieved chunks into the prompt: threshold, merge, dedupe, budget
+        retrieval_config = self.config.get('retrieval', {})
+        self.context_packer = ContextPacker(
+            token_budget=retrieval_config.get('token_budget', 1000),
+            score_threshold=retrieval_config.get('score_threshold'),
+            max_documents=retrieval_config.get('k', 5)
+        )
+        
+        # Initialize text splitter (namespace/class/function boundaries, no overlap)
+        self.text_splitter = CppCodeSplitter(
+            chunk_size=self.config['embedding']['chunk_size']
         )
         
         # Set up paths
         self.repo_path = Path("bitcoin")
+        self.rev = "master"
         self.cache_dir = Path("embedding_cache")
         self.cache_dir.mkdir(exist_ok=True)
-
-    def load_repository(self) -> List[Dict[str, Any]]:
-        """Load and process the Bitcoin repository."""
-        print("Loading Bitcoin repository...")
-        
-        # Load documents from Git repository
-        loader = GitLoader(
-            repo_path=str(self.repo_path),
-            branch="master",
-            file_filter=lambda file_path: file_path.endswith(('.cpp', '.h'))
+        
+        # Chunks and embeddings are cached per git blob, so unchanged files
+        # are never re-read or re-embedded across revisions and rebuilds
+        self.splitter_key = f"cpp:{self.config['embedding']['chunk_size']}"
+        self.blob_cache = BlobCache(self.cache_dir / "blobs.sqlite")
+        self._loader: Optional[GitBlobLoader] = None
+        
+        # Files to index; excluded trees are skipped without being read
+        file_patterns = self.config.get('file_patterns', {})
+        self.file_matcher = PathMatcher(
+            file_patterns.get('include', ["*.cpp", "*.h"]),
+            file_patterns.get('exclude', [])
         )
-        documents = loader.load()
-        
-        # Split documents into chunks
-        chunks = []
-        for doc in documents:
-            doc_chunks = self.text_splitter.split_documents([doc])
-            for chunk in doc_chunks:
-                chunk.metadata.update({
-                    'source': doc.metadata['source'],
-                    'file_type': Path(doc.metadata['source']).suffix
-                })
-            chunks.extend(doc_chunks)
         
+        # Every index build is published here under its IndexKey
+        self.indexes = IndexManifest(self.cache_dir / "indexes")
+        
+        # Indexes and QA chains stay loaded across analyze_code calls
+        self.session = RAGSession(self)
+        
+        # Background threads finishing progressive index builds, and a lock per
+        # index so only one caller starts each build
+        self._builds: Dict[IndexKey, threading.Thread] = {}
+        self._build_locks: Dict[IndexKey, threading.Lock] = {}
+        self._builds_lock = threading.Lock()
+    
+    def load_repository(self, rev: Optional[str] = None) -> List[Document]:
+        """Load and chunk the Bitcoin repository's C++ files at a revision.
+        
+        Files are streamed from the git object database without a checkout,
+        and only files whose blobs were not chunked before are read and split.
+        
+        Args:
+            rev: Branch, tag or commit to load, defaults to self.rev
+        """
+        rev = rev or self.rev
+        print(f"Loading Bitcoin repository at {rev}...")
+        if self._loader is None:
+            self._loader = GitBlobLoader(self.repo_path, self.text_splitter, self.splitter_key,
+                                         self.blob_cache, matcher=self.file_matcher)
+        blobs_read = self._loader.blobs_read
+        chunks = self._loader.load(rev)
+        print(f"Loaded {len(chunks)} chunks, {self._loader.blobs_read - blobs_read} files read")
         return chunks
-
+    
+    def repository_commit(self, rev: Optional[str] = None) -> str:
+        """Get the commit a revision, by default self.rev, points at."""
+        return Repo(self.repo_path).commit(rev or self.rev).hexsha
+    
+    def embedding_key(self, model_name: str) -> str:
+        """Identify a model's embeddings in the blob cache, including the backend."""
+        return f"{model_name}:{self.config['embedding'].get('backend', 'torch')}"
+    
+    def embed_chunks(self, chunks: List[Document], model_name: str) -> np.ndarray:
+        """Embed chunks as a float32 matrix, reusing embeddings of chunks seen before.
+        
+        Chunks that do not come from load_repository are embedded directly.
+        """
+        adapter = self.embedding_switcher.get_embeddings(model_name)
+        embed_np = partial(adapter.embed_documents_np, dtype=np.float32)
+        if not all('blob_sha' in chunk.metadata and 'blob_chunk' in chunk.metadata for chunk in chunks):
+            return embed_np([chunk.page_content for chunk in chunks])
+        vectors, cached = self.blob_cache.embed(chunks, self.splitter_key, self.embedding_key(model_name), embed_np)
+        print(f"Reused embeddings of {cached} of {len(chunks)} chunks")
+        return vectors
+    
+    def files_digest(self) -> str:
+        """Short hash of the include/exclude patterns, which decide an index's files."""
+        patterns = json.dumps([self.file_matcher.include, self.file_matcher.exclude])
+        return hashlib.sha256(patterns.encode()).hexdigest()[:12]
+    
+    def index_key(self, subsystem: Optional[str] = None,
+                  model_name: str = 'codebert',
+                  rev: Optional[str] = None) -> IndexKey:
+        """Get the key of the index for a subsystem and model at a revision.
+        
+        Args:
+            subsystem: Subsystem the index covers, None for the whole repository
+            model_name: Embedder of the index
+            rev: Branch, tag or commit, defaults to self.rev
+        """
+        embedding_config = self.config['embedding']
+        return IndexKey(
+            subsystem=subsystem,
+            model=model_name,
+            chunk_size=embedding_config['chunk_size'],
+            chunk_overlap=embedding_config.get('chunk_overlap', 0),
+            commit=self.repository_commit(rev),
+            files=self.files_digest()
+        )
+    
     def create_embeddings(self, chunks: List[Dict[str, Any]], 
-                         model_name: str = 'codebert') -> FAISS:
-        """Create embeddings for the document chunks."""
+                         model_name: str = 'codebert',
+                         subsystem: Optional[str] = None,
+                         rev: Optional[str] = None) -> FAISS:
+        """Create embeddings for the document chunks and publish their index.
+        
+        Args:
+            chunks: Chunks to index
+            model_name: Embedder to use
+            subsystem: Subsystem the chunks cover, None for the whole repository
+            rev: Revision the chunks were loaded from, defaults to self.rev
+        """
         print(f"Creating embeddings using {model_name}...")
         
         # Get embedding model
         embeddings = self.embedding_switcher.get_embeddings(model_name)
         
-        # Create vector store
-        vector_store = FAISS.from_documents(
-            chunks,
-            embeddings
-        )
+        # Create vector store straight from the float32 matrix
+        vector_store = faiss_from_documents(chunks, embeddings, vectors=self.embed_chunks(chunks, model_name))
         
-        # Save vector store
-        vector_store.save_local(str(self.cache_dir / "faiss_index"))
+        # Publish under its key; readers only see the build once it is complete
+        index_dir = self.indexes.publish(
+            self.index_key(subsystem, model_name, rev),
+            partial(save_index, vector_store),
+            coverage_metadata(chunks, chunks)
+        )
+        print(f"Published index {index_dir}")
         
         return vector_store
-
+    
     def create_subsystem_embeddings(self, chunks: List[Dict[str, Any]], 
-                                  subsystem: str) -> FAISS:
+                                  subsystem: str,
+                                  model_name: str = 'codebert',
+                                  rev: Optional[str] = None) -> FAISS:
         """Create embeddings for a specific subsystem."""
         print(f"Creating embeddings for {subsystem} subsystem...")
         
-        # Filter chunks for subsystem
-        subsystem_chunks = [
-            chunk for chunk in chunks 
+        return self.create_embeddings(self.subsystem_chunks(chunks, subsystem), model_name, subsystem, rev)
+    
+    def key_files(self, subsystem: Optional[str] = None) -> List[str]:
+        """Get the configured key files of a subsystem, or of every subsystem if None."""
+        subsystems = self.config.get('subsystems', {})
+        names = [subsystem] if subsystem else list(subsystems)
+        return [key_file for name in names for key_file in subsystems.get(name, {}).get('key_files', [])]
+    
+    def subsystem_chunks(self, chunks: List[Document], subsystem: str) -> List[Document]:
+        """Filter chunks to those whose path contains the subsystem or is one of its key files."""
+        key_files = self.key_files(subsystem)
+        return [
+            chunk for chunk in chunks
             if subsystem in chunk.metadata['source'].lower()
+            or is_key_file(chunk.metadata['source'], key_files)
         ]
+    
+    def _progressive_build(self, key: IndexKey) -> Iterator[Dict[str, Any]]:
+        """Build an index in stages, publishing and yielding coverage after each one.
         
-        return self.create_embeddings(subsystem_chunks)
-
+        The subsystem's key files are embedded first. The remaining chunks are
+        then added in stages that each roughly double the indexed chunk count,
+        so the builds written along the way add up to about twice the final
+        one. Stages end on file boundaries, so no file is half indexed.
+        Stages that would not raise the coverage already published, e.g. by an
+        interrupted earlier build, are embedded but not published.
+        """
+        chunks = self.load_repository(key.commit)
+        if key.subsystem:
+            chunks = self.subsystem_chunks(chunks, key.subsystem)
+        if not chunks:
+            raise ValueError(f"No files found for subsystem {key.subsystem}")
+        
+        key_files = self.key_files(key.subsystem)
+        ordered = (
+            [chunk for chunk in chunks if is_key_file(chunk.metadata['source'], key_files)]
+            + [chunk for chunk in chunks if not is_key_file(chunk.metadata['source'], key_files)]
+        )
+        first_stage = sum(is_key_file(chunk.metadata['source'], key_files) for chunk in chunks)
+        first_stage = first_stage or file_boundary(ordered, PROGRESSIVE_FIRST_CHUNKS)
+        
+        adapter = self.embedding_switcher.get_embeddings(key.model)
+        vector_store = faiss_from_documents(
+            ordered[:first_stage], adapter, vectors=self.embed_chunks(ordered[:first_stage], key.model)
+        )
+        indexed = first_stage
+        while True:
+            metadata = coverage_metadata(ordered[:indexed], ordered)
+            published = self.indexes.entry(key)
+            if published is None or metadata["coverage"] > published["metadata"].get("coverage", 100.0):
+                self.indexes.publish(key, partial(save_index, vector_store), metadata)
+                print(f"Published {key.slug()} at {metadata['coverage']:.1f}% coverage")
+            yield metadata
+            if indexed == len(ordered):
+                return
+            stage_end = file_boundary(ordered, indexed * 2)
+            stage = ordered[indexed:stage_end]
+            add_documents_np(vector_store, stage, adapter, vectors=self.embed_chunks(stage, key.model))
+            indexed = stage_end
+    
+    def build_progressive(self, subsystem: Optional[str] = None,
+                          model_name: str = 'codebert',
+                          rev: Optional[str] = None) -> IndexKey:
+        """Make an index queryable quickly and finish building it in the background.
+        
+        If the index has never been published, its key files are embedded and
+        published before returning, which takes seconds; the rest of the
+        subsystem streams in from a background thread, each stage swapped in
+        atomically through the manifest. An index left incomplete by an earlier
+        process is finished in the background.
+        
+        Args:
+            subsystem: Subsystem to index, None for the whole repository
+            model_name: Embedder of the index
+            rev: Branch, tag or commit to index, defaults to self.rev
+        
+        Returns:
+            Key of the index
+        """
+        key = self.index_key(subsystem, model_name, rev)
+        with self._builds_lock:
+            key_lock = self._build_locks.setdefault(key, threading.Lock())
+        
+        # The first stage runs under the index's own lock, so builds of other
+        # indexes are not held up by it
+        with key_lock:
+            with self._builds_lock:
+                build = self._builds.get(key)
+            if build is not None and build.is_alive():
+                return key
+            entry = self.indexes.entry(key)
+            if entry is not None and entry["metadata"].get("complete", True):
+                return key
+            
+            stages = self._progressive_build(key)
+            if entry is None:
+                next(stages)
+            
+            def finish():
+                try:
+                    for _ in stages:
+                        pass
+                except Exception as e:
+                    print(f"Progressive build of {key.slug()} failed: {e}")
+            
+            build = threading.Thread(target=finish, daemon=True)
+            with self._builds_lock:
+                self._builds[key] = build
+            build.start()
+            return key
+    
+    def index_coverage(self, key: IndexKey) -> Dict[str, Any]:
+        """Get how much of its subsystem a key's published index covers.
+        
+        Returns:
+            Dictionary with the coverage percentage, chunk and file counts,
+            whether the index is complete and whether a build is running
+        """
+        entry = self.indexes.entry(key)
+        metadata = entry["metadata"] if entry else {"coverage": 0.0, "complete": False}
+        with self._builds_lock:
+            build = self._builds.get(key)
+        return dict(metadata, building=build is not None and build.is_alive())
+    
+    def build_model_indexes(self, model_names: Optional[List[str]] = None,
+                            subsystem: Optional[str] = None,
+                            max_workers: Optional[int] = None,
+                            rev: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Build one index per embedding model from a single chunking pass.
+        
+        The repository is loaded and chunked once into a shared chunk store, then
+        each model embeds it in its own worker process and publishes its index
+        to the manifest in embedding_cache/indexes under its IndexKey. Chunks
+        and embeddings come from the blob cache where possible, so building
+        several release tags costs little more than building one.
+        
+        Args:
+            model_names: Registered embedders to build, defaults to all of them
+            subsystem: Only index chunks whose path contains this subsystem
+            max_workers: Concurrent worker processes, defaults to one per model
+            rev: Branch, tag or commit to index, defaults to self.rev
+        
+        Returns:
+            Throughput report per model
+        """
+        model_names = model_names or self.embedding_switcher.list_embedders()
+        unknown = [name for name in model_names if name not in self.embedding_switcher.factories]
+        if unknown:
+            raise ValueError(f"Embedders {unknown} are not registered as factories")
+        
+        chunks = self.load_repository(rev)
+        if subsystem:
+            chunks = self.subsystem_chunks(chunks, subsystem)
+        chunk_store = self.cache_dir / "chunks.jsonl"
+        save_chunk_store(chunks, chunk_store)
+        print(f"Saved {len(chunks)} chunks to {chunk_store}")
+        
+        max_workers = max_workers or len(model_names)
+        num_threads = max(1, (os.cpu_count() or 1) // max_workers)
+        
+        # Spawn rather than fork: forked workers would inherit torch thread state
+        reports = []
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+            futures = {
+                executor.submit(
+                    _build_model_index,
+                    name,
+                    self.embedding_switcher.factories[name],
+                    str(chunk_store),
+                    str(self.indexes.root),
+                    self.index_key(subsystem, name, rev),
+                    num_threads,
+                    str(self.blob_cache.path),
+                    self.splitter_key,
+                    self.embedding_key(name)
+                ): name
+                for name in model_names
+            }
+            for future in as_completed(futures):
+                try:
+                    report = future.result()
+                except Exception as e:
+                    raise RuntimeError(f"Building the {futures[future]} index failed: {e}") from e
+                print(f"Built {report['model']} index in {report['embed_seconds']:.1f}s")
+                reports.append(report)
+        
+        reports.sort(key=lambda report: model_names.index(report['model']))
+        print(format_build_report(reports))
+        return reports
+    
     def setup_qa_chain(self, vector_store: FAISS) -> RetrievalQA:
-        """Set up the question answering chain."""
+        """Set up the question answering chain over packed context."""
+        retriever = PackedRetriever(
+            searches=[faiss_scored_search(vector_store, self.config.get('retrieval', {}).get('fetch_k', 10))],
+            packer=self.context_packer
+        )
         return RetrievalQA.from_chain_type(
             llm=self.llm,
             chain_type="stuff",
-            retriever=vector_store.as_retriever(
-                search_kwargs={"k": 5}
-            ),
+            retriever=retriever,
             return_source_documents=True
         )
-
+    
     def analyze_code(self, question: str, 
-                    subsystem: Optional[str] = None) -> Dict[str, Any]:
-        """Analyze Bitcoin code using RAG."""
-        # Load or create embeddings
-        if (self.cache_dir / "faiss_index").exists():
-            vector_store = FAISS.load_local(
-                str(self.cache_dir / "faiss_index"),
-                self.embedding_switcher.get_embeddings('codebert'),
-                allow_dangerous_deserialization=True  # Only for local files we created
-            )
-        else:
-            chunks = self.load_repository()
-            if subsystem:
-                vector_store = self.create_subsystem_embeddings(chunks, subsystem)
-            else:
-                vector_store = self.create_embeddings(chunks)
-        
-        # Set up QA chain
-        qa_chain = self.setup_qa_chain(vector_store)
-        
-        # Generate response
-        result = qa_chain({"query": question})
+                    subsystem: Optional[str] = None,
+                    model_name: Optional[str] = None,
+                    rev: Optional[str] = None) -> Dict[str, Any]:
+        """Analyze Bitcoin code using RAG.
         
-        return {
-            "answer": result["result"],
-            "sources": [
-                {
-                    "source": doc.metadata["source"],
-                    "content": doc.page_content
-                }
-                for doc in result["source_documents"]
-            ]
-        }
+        Args:
+            question: Question to answer
+            subsystem: Subsystem whose index to search, None for the whole repository
+            model_name: Embedder whose index to search, defaults to CodeBERT
+            rev: Branch, tag or commit to answer about, defaults to self.rev
+        
+        Returns:
+            Dictionary with the answer, its source chunks and the coverage of
+            the index it was answered from
+        """
+        # Each (subsystem, model, chunking, commit) index is built once and
+        # kept warm by the session. A missing index is answered from its key
+        # files while the rest of the subsystem is indexed in the background
+        key = self.build_progressive(subsystem, model_name or 'codebert', rev)
+        result = self.session.ask(question, key)
+        result["coverage"] = self.index_coverage(key)
+        return result
 
 def main():
+    parser = argparse.ArgumentParser(description="Analyze Bitcoin code using RAG")
+    parser.add_argument("--build-indexes", nargs="*", metavar="MODEL",
+                        help="Build indexes for these embedders (default: all) and exit")
+    parser.add_argument("--subsystem", help="Only index this subsystem when building")
+    parser.add_argument("--workers", type=int, help="Worker processes for index builds")
+    parser.add_argument("--rev", action="append",
+                        help="Branch, tag or commit to index (repeatable, default: master)")
+    args = parser.parse_args()
+    
     # Initialize RAG system
     rag = BitcoinRAG()
     
+    if args.build_indexes is not None:
+        for rev in args.rev or [None]:
+            rag.build_model_indexes(args.build_indexes or None, args.subsystem, args.workers, rev)
+        return
+    
     # Example questions
     questions = [
         {
@@ -170,6 +694,7 @@ def main():
         
         print("\nAnswer:")
         print(result["answer"])
+        print(f"\nIndex coverage: {result['coverage']['coverage']:.1f}%")
         
         print("\nSources:")
         for source in result["sources"]:
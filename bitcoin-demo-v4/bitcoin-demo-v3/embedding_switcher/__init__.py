@@ -1,13 +1,50 @@
-from typing import Dict, Any, List, Optional
-from .base import BaseEmbeddingAdapter
+from typing import Dict, Any, List, Optional, Callable
+from collections import OrderedDict
+import gc
+import time
+import threading
+import torch
+from .base import BaseEmbeddingAdapter, TransformerEmbeddingAdapter
 from .codebert import CodeBERTAdapter
+from .graphcodebert import GraphCodeBERTAdapter
+from .unixcoder import UniXcoderAdapter
+from .vectorstore import faiss_from_documents, add_documents_np
+from .docstore import SQLiteDocstore, save_index, load_index
+from .onnx_backend import BACKENDS, check_parity, benchmark_backends, format_backend_report
+from .query_cache import QueryEmbeddingCache, CachedQueryEmbeddings, SHARED_QUERY_CACHE
+from .replicas import ReplicaRunner, benchmark_replica_splits, best_replica_split, format_replica_report
+from .sentence_transformer import SentenceTransformerAdapter
+from .service import (
+    EmbeddingService, EmbeddingServiceClient, ServiceEmbeddingAdapter,
+    EmbeddingServiceUnavailable, SOCKET_ENV
+)
 
 class EmbeddingSwitcher:
-    """A flexible embedding switcher for code analysis."""
+    """A flexible embedding switcher for code analysis.
     
-    def __init__(self):
-        """Initialize the embedding switcher."""
-        self.embedders = {}
+    Adapters can be registered ready-made or as factories. Factory adapters are
+    constructed on first use and, when max_resident or memory_budget_bytes is
+    set, the least recently used ones are unloaded to stay within the limit and
+    rebuilt on their next use. Adapters registered as instances are never
+    unloaded, since they cannot be rebuilt.
+    """
+    
+    def __init__(self, max_resident: Optional[int] = None,
+                 memory_budget_bytes: Optional[int] = None):
+        """Initialize the embedding switcher.
+        
+        Args:
+            max_resident: Maximum number of adapters kept loaded, None for no limit
+            memory_budget_bytes: Maximum model bytes kept loaded, None for no limit
+        """
+        self.max_resident = max_resident
+        self.memory_budget_bytes = memory_budget_bytes
+        self.embedders: "OrderedDict[str, BaseEmbeddingAdapter]" = OrderedDict()
+        self.factories: Dict[str, Callable[[], BaseEmbeddingAdapter]] = {}
+        self._sizes: Dict[str, int] = {}
+        self._load_times: Dict[str, List[float]] = {}
+        self._evictions: Dict[str, int] = {}
+        self._lock = threading.RLock()
     
     def register_adapter(self, name: str, adapter: BaseEmbeddingAdapter):
         """Register an embedding adapter.
@@ -16,21 +53,56 @@ class EmbeddingSwitcher:
             name: Name of the adapter
             adapter: The adapter instance
         """
-        self.embedders[name] = adapter
+        with self._lock:
+            self.factories.pop(name, None)
+            self.embedders[name] = adapter
+            self._sizes[name] = adapter.memory_bytes()
+    
+    def register_factory(self, name: str, factory: Callable[[], BaseEmbeddingAdapter]):
+        """Register a factory that constructs an adapter on first use.
+        
+        Args:
+            name: Name of the adapter
+            factory: Callable returning the adapter, e.g. an adapter class or a
+                functools.partial of one with its arguments
+        """
+        with self._lock:
+            if name in self.embedders:
+                self._unload(name)
+            self.factories[name] = factory
     
     def get_embeddings(self, name: str) -> BaseEmbeddingAdapter:
         """Get an embedder by name.
         
         Args:
             name: The name of the embedder
-            
+        
         Returns:
             An initialized embedder instance
         """
-        if name not in self.embedders:
-            raise ValueError(f"Embedder '{name}' not found")
-        
-        return self.embedders[name]
+        with self._lock:
+            if name in self.embedders:
+                self.embedders.move_to_end(name)
+                return self.embedders[name]
+            
+            if name not in self.factories:
+                raise ValueError(f"Embedder '{name}' not found")
+            
+            # Make room first so the old and new models are not both resident;
+            # a model loaded before is expected to need its previous size
+            self._enforce_limits(extra=1, extra_bytes=self._sizes.get(name, 0))
+            
+            start_time = time.time()
+            adapter = self.factories[name]()
+            load_time = time.time() - start_time
+            
+            self.embedders[name] = adapter
+            self._sizes[name] = adapter.memory_bytes()
+            self._load_times.setdefault(name, []).append(load_time)
+            print(f"Loaded embedder '{name}' in {load_time:.2f}s")
+            
+            self._enforce_limits(keep=name)
+            return adapter
     
     def list_embedders(self) -> List[str]:
         """List all available embedders.
@@ -38,6 +110,89 @@ class EmbeddingSwitcher:
         Returns:
             List of embedder names
         """
-        return list(self.embedders.keys())
+        with self._lock:
+            return list(self.embedders.keys()) + [n for n in self.factories if n not in self.embedders]
+    
+    def resident_embedders(self) -> List[str]:
+        """List loaded embedders, least recently used first."""
+        with self._lock:
+            return list(self.embedders.keys())
+    
+    def resident_bytes(self) -> int:
+        """Model bytes held by loaded embedders."""
+        with self._lock:
+            return sum(self._sizes.get(name, 0) for name in self.embedders)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get residency and load time statistics.
+        
+        Returns:
+            Dictionary with resident embedders, their bytes, and per-embedder
+            load counts, load times and evictions
+        """
+        with self._lock:
+            return {
+                "resident": self.resident_embedders(),
+                "resident_bytes": self.resident_bytes(),
+                "max_resident": self.max_resident,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "embedders": {
+                    name: {
+                        "resident": name in self.embedders,
+                        "bytes": self._sizes.get(name, 0),
+                        "loads": len(self._load_times.get(name, [])),
+                        "last_load_seconds": self._load_times[name][-1] if self._load_times.get(name) else None,
+                        "total_load_seconds": sum(self._load_times.get(name, [])),
+                        "evictions": self._evictions.get(name, 0)
+                    }
+                    for name in self.list_embedders()
+                }
+            }
+    
+    def _over_limits(self, extra: int = 0, extra_bytes: int = 0) -> bool:
+        """Check whether resident embedders exceed max_resident or the byte budget."""
+        if self.max_resident is not None and len(self.embedders) + extra > self.max_resident:
+            return True
+        if (self.memory_budget_bytes is not None
+                and self.resident_bytes() + extra_bytes > self.memory_budget_bytes):
+            return True
+        return False
+    
+    def _enforce_limits(self, keep: Optional[str] = None, extra: int = 0, extra_bytes: int = 0):
+        """Unload least recently used factory embedders until within limits.
+        
+        Args:
+            keep: Embedder that must stay resident, e.g. the one just loaded
+            extra: Slots to free for embedders about to be loaded
+            extra_bytes: Bytes to free for embedders about to be loaded
+        """
+        for name in list(self.embedders.keys()):
+            if not self._over_limits(extra, extra_bytes):
+                break
+            if name == keep or name not in self.factories:
+                continue
+            self._unload(name)
+            self._evictions[name] = self._evictions.get(name, 0) + 1
+            print(f"Unloaded embedder '{name}'")
+    
+    def _unload(self, name: str):
+        """Drop an embedder so its model memory can be reclaimed.
+        
+        Replica processes stop at once; the in-process model is only released
+        once no vector store or chain holds the adapter.
+        """
+        adapter = self.embedders.pop(name, None)
+        if adapter is not None:
+            adapter.close()
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
 
-__all__ = ['CodeBERTAdapter', 'EmbeddingSwitcher'] 
\ No newline at end of file
+__all__ = ['CodeBERTAdapter', 'GraphCodeBERTAdapter', 'UniXcoderAdapter', 'EmbeddingSwitcher',
+           'TransformerEmbeddingAdapter', 'faiss_from_documents', 'add_documents_np',
+           'SQLiteDocstore', 'save_index', 'load_index',
+           'BACKENDS', 'check_parity', 'benchmark_backends', 'format_backend_report',
+           'QueryEmbeddingCache', 'CachedQueryEmbeddings', 'SHARED_QUERY_CACHE',
+           'ReplicaRunner', 'benchmark_replica_splits', 'best_replica_split', 'format_replica_report',
+           'SentenceTransformerAdapter', 'EmbeddingService', 'EmbeddingServiceClient',
+           'ServiceEmbeddingAdapter', 'EmbeddingServiceUnavailable', 'SOCKET_ENV']
@@ -1,5 +1,17 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from abc import ABC, abstractmethod
+from collections import Counter, deque
+import gc
+import threading
+import time
+import numpy as np
+import torch
+from transformers import AutoConfig, AutoTokenizer, AutoModel
+from .batching import TOKENIZE_WINDOW, plan_batches, prefetch
+from .onnx_backend import BACKENDS, OnnxEncoder, export_onnx, onnx_model_path
+from .query_cache import SHARED_QUERY_CACHE, normalize_query
+from .replicas import POOLING_MODES, ReplicaRunner, benchmark_replica_splits, best_replica_split, pool_hidden_states
+from .stats import EmbeddingStats
 
 class BaseEmbeddingAdapter(ABC):
     """Base class for embedding adapters."""
@@ -10,7 +22,7 @@ class BaseEmbeddingAdapter(ABC):
         
         Args:
             texts: List of text documents to embed
-            
+        
         Returns:
             List of embeddings as float lists
         """
@@ -22,7 +34,7 @@ class BaseEmbeddingAdapter(ABC):
         
         Args:
             text: Query text to embed
-            
+        
         Returns:
             Embedding as a list of floats
         """
@@ -35,4 +47,396 @@ class BaseEmbeddingAdapter(ABC):
         Returns:
             Dictionary with model information
         """
-        pass 
\ No newline at end of file
+        pass
+    
+    def embed_documents_np(self, texts: List[str], dtype: type = np.float32) -> np.ndarray:
+        """Create embeddings for a list of documents as a matrix.
+        
+        Args:
+            texts: List of text documents to embed
+            dtype: Output dtype, np.float32 or np.float16
+        
+        Returns:
+            C-contiguous array of shape (len(texts), dimension)
+        """
+        return np.ascontiguousarray(self.embed_documents(texts), dtype=dtype)
+    
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the adapter's model, 0 if unknown."""
+        return 0
+    
+    def close(self):
+        """Release background resources such as replica processes."""
+        pass
+
+class TransformerEmbeddingAdapter(BaseEmbeddingAdapter):
+    """Shared implementation for HuggingFace encoder adapters.
+    
+    Embeddings use [CLS] pooling unless a call asks for masked mean pooling,
+    so one loaded model can serve both kinds of index.
+    
+    With an ONNX backend the torch model is only loaded to export a graph
+    that is not cached yet, and released afterwards; torch-backend calls,
+    e.g. parity checks, load it again on demand.
+    """
+    
+    def __init__(self, model_name: str,
+                 max_length: int = 512,
+                 batch_size: int = 32,
+                 max_batch_tokens: int = 8192,
+                 device: str = None,
+                 backend: str = "torch",
+                 onnx_cache_dir: str = "embedding_cache/onnx",
+                 prefetch_batches: int = 2,
+                 replicas: int = 0,
+                 threads_per_replica: Optional[int] = None,
+                 **model_kwargs: Any):
+        """Load the tokenizer and model.
+        
+        Args:
+            model_name: HuggingFace model name
+            max_length: Maximum sequence length
+            batch_size: Maximum number of documents per batch
+            max_batch_tokens: Budget of padded tokens per batch; documents are
+                sorted by tokenized length so batches pad to similar lengths
+            device: Device to run on ('cuda' or 'cpu')
+            backend: 'torch', or 'onnx' / 'onnx-int8' to run an exported (and
+                optionally int8-quantized) graph with ONNX Runtime on CPU
+            onnx_cache_dir: Directory where exported ONNX graphs are cached
+            prefetch_batches: Batches a background thread tokenizes and pads
+                ahead of the model; 0 runs tokenization inline
+            replicas: CPU only: run this many copies of the model in worker
+                processes pinned to disjoint cores; 0 runs it in-process
+            threads_per_replica: Cores per replica, defaults to an even split
+            model_kwargs: Additional model arguments
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}'. Available backends: {list(BACKENDS)}")
+        self.model_name = model_name
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        self.model_kwargs = model_kwargs
+        self.backend = backend
+        self.onnx_cache_dir = onnx_cache_dir
+        self.prefetch_batches = prefetch_batches
+        if replicas and not self.device.startswith("cpu"):
+            print(f"Ignoring replicas={replicas} for {model_name}: replicas run on CPU only")
+            replicas = 0
+        self.replicas = replicas
+        self.threads_per_replica = threads_per_replica
+        self.dispatch = "queue_depth"
+        self._runner: Optional[ReplicaRunner] = None
+        self._onnx_encoders: Dict[str, OnnxEncoder] = {}
+        self._model: Optional[torch.nn.Module] = None
+        self._model_lock = threading.Lock()
+        self._num_parameters: Optional[int] = None
+        # Shared across adapters and reloads; set to None to disable
+        self.query_cache = SHARED_QUERY_CACHE
+        
+        # Initialize metrics
+        self.stats = EmbeddingStats()
+        start_time = time.time()
+        
+        # Initialize tokenizer and model config
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.config = AutoConfig.from_pretrained(model_name)
+        
+        if backend == "torch":
+            self._load_model()
+        else:
+            # Export (or reuse the cached export) up front rather than on first
+            # query, then drop the torch weights the session no longer needs
+            self._get_onnx_encoder(backend)
+            self.release_torch_model()
+        self.load_seconds = time.time() - start_time
+    
+    def _load_model(self) -> torch.nn.Module:
+        """Load the torch model in evaluation mode on the device, if not loaded."""
+        with self._model_lock:
+            if self._model is None:
+                model = AutoModel.from_pretrained(self.model_name, **self.model_kwargs)
+                model.eval()
+                self._model = model.to(self.device)
+                self._num_parameters = self._model.num_parameters()
+            return self._model
+    
+    @property
+    def model(self) -> torch.nn.Module:
+        """The torch model, loaded on first use if it was released."""
+        return self._model if self._model is not None else self._load_model()
+    
+    def release_torch_model(self):
+        """Drop the torch model of an ONNX-backed adapter to free its memory.
+        
+        Does nothing for the torch backend, which serves from the model.
+        """
+        if self.backend == "torch":
+            return
+        with self._model_lock:
+            released = self._model is not None
+            self._model = None
+        if released:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+    
+    def num_parameters(self) -> int:
+        """Parameters of the torch model, counted without loading its weights if released."""
+        if self._num_parameters is None:
+            # Meta tensors have shapes but no storage
+            with torch.device("meta"):
+                self._num_parameters = AutoModel.from_config(self.config).num_parameters()
+        return self._num_parameters
+    
+    def _get_onnx_encoder(self, backend: str) -> OnnxEncoder:
+        """Get the ONNX Runtime session for a backend, exporting the graph if needed."""
+        if backend not in self._onnx_encoders:
+            quantize = backend == "onnx-int8"
+            path = onnx_model_path(self.onnx_cache_dir, self.model_name, quantize)
+            if not path.exists():
+                path = export_onnx(self.model, self.tokenizer, self.model_name, self.onnx_cache_dir,
+                                   quantize=quantize)
+            self._onnx_encoders[backend] = OnnxEncoder(path)
+        return self._onnx_encoders[backend]
+    
+    def _get_runner(self) -> ReplicaRunner:
+        """Get the replica runner, starting its processes on first use."""
+        if self._runner is None:
+            onnx_path = None
+            if self.backend != "torch":
+                onnx_path = self._get_onnx_encoder(self.backend).path
+            self._runner = ReplicaRunner(
+                self.model_name, self.replicas, self.threads_per_replica,
+                backend=self.backend, onnx_path=onnx_path, dispatch=self.dispatch,
+                **self.model_kwargs
+            )
+            print(f"Started {self._runner.replicas} replicas of {self.model_name} "
+                  f"in {self._runner.startup_seconds:.2f}s")
+        return self._runner
+    
+    def _prepare_batches(self, texts: List[str], return_tensors: str) -> Iterator[Tuple[List[int], Dict[str, Any]]]:
+        """Tokenize, batch and pad documents one window at a time.
+        
+        Yields:
+            Tuples of (document indices, padded model inputs)
+        """
+        # Page-locked buffers let the copy to the GPU run asynchronously
+        pin_memory = return_tensors == "pt" and self.device.startswith("cuda")
+        
+        for window_start in range(0, len(texts), TOKENIZE_WINDOW):
+            start_time = time.time()
+            window = texts[window_start:window_start + TOKENIZE_WINDOW]
+            # Tokenize without padding to get true lengths; overflow rows mark
+            # documents cut off at max_length and are dropped
+            encoded = self.tokenizer(
+                window,
+                truncation=True,
+                max_length=self.max_length,
+                return_overflowing_tokens=True
+            )
+            sample_mapping = encoded.pop("overflow_to_sample_mapping")
+            first_rows = [
+                row for row, sample in enumerate(sample_mapping)
+                if row == 0 or sample_mapping[row - 1] != sample
+            ]
+            encoded = {key: [values[row] for row in first_rows] for key, values in encoded.items()}
+            lengths = [len(ids) for ids in encoded["input_ids"]]
+            truncated = sum(1 for rows in Counter(sample_mapping).values() if rows > 1)
+            self.stats.record_tokenization(len(window), truncated, time.time() - start_time)
+            
+            for batch in plan_batches(lengths, self.max_batch_tokens, self.batch_size):
+                # Pad only to the longest member of this batch
+                inputs = self.tokenizer.pad(
+                    {key: [encoded[key][i] for i in batch] for key in encoded.keys()},
+                    return_tensors=return_tensors
+                )
+                if pin_memory:
+                    inputs = {k: v.pin_memory() for k, v in inputs.items()}
+                yield [window_start + i for i in batch], inputs
+    
+    def _embed_batch(self, inputs: Dict[str, Any], backend: str,
+                     torch_dtype: torch.dtype, pooling: str = "cls") -> np.ndarray:
+        """Get pooled embeddings for one padded batch."""
+        if backend != "torch":
+            hidden = self._get_onnx_encoder(backend).last_hidden_state(inputs)
+            return pool_hidden_states(hidden, inputs["attention_mask"], pooling)
+        
+        # Move to device
+        inputs = {k: v.to(self.device, non_blocking=True) for k, v in inputs.items()}
+        
+        # Get embeddings
+        with torch.no_grad():
+            hidden = self.model(**inputs).last_hidden_state
+            if pooling == "cls":
+                # Use [CLS] token embedding
+                pooled = hidden[:, 0, :]
+            else:
+                # Average over real tokens only
+                mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+            return pooled.to(torch_dtype).cpu().numpy()
+    
+    def embed_documents_np(self, texts: List[str], dtype: type = np.float32,
+                           backend: Optional[str] = None, pooling: str = "cls") -> np.ndarray:
+        """Create embeddings for documents as a matrix.
+        
+        Documents are tokenized once, grouped into length-bucketed batches under
+        max_batch_tokens, and written straight into a preallocated matrix in their
+        original order, without building per-float Python objects. Tokenization
+        is pipelined with inference, up to prefetch_batches batches ahead.
+        
+        Args:
+            texts: List of text documents to embed
+            dtype: Output dtype, np.float32 or np.float16
+            backend: Backend to run, defaults to the adapter's backend
+            pooling: 'cls' for the [CLS] token or 'mean' for masked averaging
+        
+        Returns:
+            C-contiguous array of shape (len(texts), hidden_size)
+        """
+        if pooling not in POOLING_MODES:
+            raise ValueError(f"Unknown pooling '{pooling}'. Available pooling: {list(POOLING_MODES)}")
+        backend = backend or self.backend
+        embeddings = np.empty((len(texts), self.config.hidden_size), dtype=dtype)
+        if not texts:
+            return embeddings
+        
+        start_time = time.time()
+        torch_dtype = torch.float16 if dtype == np.float16 else torch.float32
+        # Replicas serve the adapter's own backend; other backends, e.g. for
+        # parity checks, run in-process
+        use_replicas = bool(self.replicas) and backend == self.backend
+        return_tensors = "pt" if backend == "torch" and not use_replicas else "np"
+        
+        # A background thread tokenizes and pads upcoming batches while the
+        # current one runs through the model
+        batches = prefetch(self._prepare_batches(texts, return_tensors), self.prefetch_batches)
+        if use_replicas:
+            self._embed_with_replicas(batches, embeddings, pooling)
+            self.stats.record_call(time.time() - start_time)
+            return embeddings
+        
+        for indices, inputs in batches:
+            batch_start = time.time()
+            # Scatter back to original order
+            embeddings[indices] = self._embed_batch(inputs, backend, torch_dtype, pooling)
+            # Count real tokens from the attention mask, padding excluded
+            self.stats.record_batch(inputs["attention_mask"], time.time() - batch_start)
+        
+        self.stats.record_call(time.time() - start_time)
+        return embeddings
+    
+    def _embed_with_replicas(self, batches: Iterator[Tuple[List[int], Dict[str, Any]]],
+                             embeddings: np.ndarray, pooling: str):
+        """Fan batches out to the replicas, keeping each one's queue fed.
+        
+        Up to two batches per replica are in flight; results are written back
+        in submission order, and batch latency is measured from submission.
+        """
+        runner = self._get_runner()
+        in_flight = deque()
+        
+        def finish_oldest():
+            indices, attention_mask, submitted, future = in_flight.popleft()
+            embeddings[indices] = future.result()
+            self.stats.record_batch(attention_mask, time.time() - submitted)
+        
+        for indices, inputs in batches:
+            in_flight.append((indices, inputs["attention_mask"], time.time(), runner.submit(inputs, pooling)))
+            if len(in_flight) >= 2 * runner.replicas:
+                finish_oldest()
+        while in_flight:
+            finish_oldest()
+    
+    def tune_replicas(self, texts: List[str],
+                      splits: Optional[List[Tuple[int, int]]] = None) -> List[Dict[str, Any]]:
+        """Benchmark replica x thread splits on sample documents and adopt the fastest.
+        
+        Args:
+            texts: Representative documents, e.g. a few hundred chunks
+            splits: (replicas, threads_per_replica) pairs, defaults to every
+                power-of-two split of the available cores
+        
+        Returns:
+            Rows from benchmark_replica_splits
+        """
+        batches = [inputs for _, inputs in self._prepare_batches(texts, "np")]
+        onnx_path = self._get_onnx_encoder(self.backend).path if self.backend != "torch" else None
+        rows = benchmark_replica_splits(
+            self.model_name, batches, splits,
+            backend=self.backend, onnx_path=onnx_path, dispatch=self.dispatch,
+            **self.model_kwargs
+        )
+        self.close()
+        self.replicas, self.threads_per_replica = best_replica_split(rows)
+        return rows
+    
+    def close(self):
+        """Stop replica processes; they restart on the next embedding call."""
+        if self._runner is not None:
+            self._runner.close()
+            self._runner = None
+    
+    def _torch_bytes(self) -> int:
+        """Bytes of the loaded torch model's parameters and buffers, 0 if released."""
+        model = self._model
+        if model is None:
+            return 0
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    
+    def memory_bytes(self) -> int:
+        """Bytes held by the torch model and ONNX sessions, including running replicas.
+        
+        An ONNX session is counted as the size of its graph file.
+        """
+        onnx_bytes = {backend: encoder.path.stat().st_size for backend, encoder in self._onnx_encoders.items()}
+        in_process = self._torch_bytes() + sum(onnx_bytes.values())
+        if self._runner is None:
+            return in_process
+        per_replica = self._torch_bytes() if self.backend == "torch" else onnx_bytes.get(self.backend, 0)
+        return in_process + self._runner.replicas * per_replica
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Create embeddings for documents as float lists."""
+        return self.embed_documents_np(texts).tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Create embedding for a single query.
+        
+        Queries are whitespace-normalized and cached per model and backend, so a
+        question fanned out to several retrievers is embedded once.
+        """
+        text = normalize_query(text)
+        if self.query_cache is None:
+            return self.embed_documents_np([text])[0].tolist()
+        
+        key = (self.model_name, self.backend, self.max_length, text)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = self.embed_documents_np([text])[0].tolist()
+            self.query_cache.put(key, embedding)
+        return embedding
+    
+    def reset_stats(self):
+        """Zero the embedding statistics, e.g. before measuring a workload."""
+        self.stats.reset()
+    
+    def _metrics(self) -> Dict[str, Any]:
+        """Get runtime metrics shared by all transformer adapters."""
+        return {
+            "total_tokens_processed": self.stats.real_tokens,
+            "avg_tokens_per_second": self.stats.tokens_per_second,
+            "load_seconds": self.load_seconds,
+            "device": self.device,
+            "backend": self.backend,
+            "max_length": self.max_length,
+            "batch_size": self.batch_size,
+            "max_batch_tokens": self.max_batch_tokens,
+            "prefetch_batches": self.prefetch_batches,
+            "replicas": self._runner.stats() if self._runner is not None else self.replicas,
+            "batching": self.stats.as_dict(),
+            "query_cache": self.query_cache.stats() if self.query_cache is not None else None
+        }
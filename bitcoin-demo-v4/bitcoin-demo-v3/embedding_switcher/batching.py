@@ -0,0 +1,106 @@
+from typing import List, Iterable, Iterator, TypeVar
+import queue
+import threading
+
+T = TypeVar("T")
+
+# A batch never mixes inputs more than this factor shorter than its longest member
+MAX_LENGTH_SPREAD = 2
+
+# Documents tokenized and length-sorted together; later windows are tokenized
+# in the background while earlier ones run through the model
+TOKENIZE_WINDOW = 512
+
+def plan_batches(lengths: List[int], max_batch_tokens: int, max_batch_size: int) -> List[List[int]]:
+    """Group inputs into batches of similar length.
+    
+    Inputs are sorted by tokenized length (longest first) and packed into
+    batches whose padded size, batch count times longest member, stays within
+    max_batch_tokens. A batch is also closed once inputs get more than
+    MAX_LENGTH_SPREAD times shorter than its longest member, so one long
+    input does not make many short ones pay for its length.
+    
+    Args:
+        lengths: Tokenized length of each input
+        max_batch_tokens: Budget of padded tokens per batch
+        max_batch_size: Maximum number of inputs per batch
+    
+    Returns:
+        Batches as lists of indices into lengths
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = []
+    current = []
+    for i in order:
+        # Sorted descending, so the first member is the longest
+        if current and (
+            len(current) >= max_batch_size
+            or (len(current) + 1) * lengths[current[0]] > max_batch_tokens
+            or lengths[i] * MAX_LENGTH_SPREAD < lengths[current[0]]
+        ):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+class _Failure:
+    """Carries an exception from the producer thread to the consumer."""
+    
+    def __init__(self, error: BaseException):
+        self.error = error
+
+def prefetch(items: Iterable[T], depth: int) -> Iterator[T]:
+    """Iterate over items produced by a background thread.
+    
+    The producer runs at most depth items ahead of the consumer, so prepared
+    batches are bounded in memory. Exceptions raised while producing are
+    re-raised in the consumer, and the producer stops if the consumer does.
+    
+    Args:
+        items: Iterable to produce from, e.g. a generator of tokenized batches
+        depth: Maximum number of items produced ahead; 0 disables the thread
+    
+    Returns:
+        Iterator over the same items in the same order
+    """
+    if depth <= 0:
+        yield from items
+        return
+    
+    buffer = queue.Queue(maxsize=depth)
+    stopped = threading.Event()
+    done = object()
+    
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+            return
+        put(done)
+    
+    thread = threading.Thread(target=produce, name="embedding-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
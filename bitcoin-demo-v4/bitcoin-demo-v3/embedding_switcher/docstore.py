@@ -0,0 +1,158 @@
+from typing import Optional, Union, Iterator
+from collections.abc import Mapping
+from pathlib import Path
+import json
+import os
+import sqlite3
+import threading
+import faiss
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite"
+
+class VectorIdMap(Mapping):
+    """index_to_docstore_id for stores whose docstore ids are the vector ids.
+    
+    Answers FAISS lookups arithmetically instead of holding one id string per
+    vector in memory.
+    """
+    
+    def __init__(self, size: int):
+        self.size = size
+    
+    def __getitem__(self, i: int) -> str:
+        if not 0 <= i < self.size:
+            raise KeyError(i)
+        return str(i)
+    
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.size))
+    
+    def __len__(self) -> int:
+        return self.size
+
+class SQLiteDocstore(Docstore):
+    """Read-only docstore of chunk text and metadata in SQLite, keyed by vector id.
+    
+    The database is opened on the first lookup and each search reads one row
+    by primary key, so only the documents a query returns are ever loaded.
+    """
+    
+    def __init__(self, path: Union[str, Path]):
+        """Initialize the docstore without opening the database.
+        
+        Args:
+            path: SQLite file written by save_index
+        """
+        self.path = Path(path)
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.lookups = 0
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database read-only on first use; call with the lock held."""
+        if self._connection is None:
+            if not self.path.exists():
+                raise FileNotFoundError(f"No docstore at {self.path}")
+            self._connection = sqlite3.connect(
+                f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+            )
+        return self._connection
+    
+    def search(self, search: str) -> Union[str, Document]:
+        """Get the document of a vector id, or a message if there is none."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT page_content, metadata FROM documents WHERE id = ?", (int(search),)
+            ).fetchone()
+            self.lookups += 1
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    
+    def close(self):
+        """Close the database; the next lookup reopens it."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+def save_index(vector_store: FAISS, folder_path: Union[str, Path]):
+    """Save a FAISS vector store without pickling its documents.
+    
+    Writes the FAISS index to index.faiss and every document to docstore.sqlite
+    under its vector id, the row number of its vector in the index.
+    
+    Args:
+        vector_store: Vector store to save
+        folder_path: Directory to write, created if missing
+    """
+    folder = Path(folder_path)
+    folder.mkdir(parents=True, exist_ok=True)
+    faiss.write_index(vector_store.index, str(folder / INDEX_FILE))
+    
+    def rows():
+        for i, doc_id in sorted(vector_store.index_to_docstore_id.items()):
+            doc = vector_store.docstore.search(doc_id)
+            yield i, doc.page_content, json.dumps(doc.metadata)
+    
+    db_path = folder / DOCSTORE_FILE
+    tmp_path = db_path.with_suffix(".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+    connection = sqlite3.connect(str(tmp_path))
+    try:
+        connection.execute(
+            "CREATE TABLE documents (id INTEGER PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        connection.executemany("INSERT INTO documents VALUES (?, ?, ?)", rows())
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(tmp_path, db_path)
+
+def load_index(folder_path: Union[str, Path], embeddings: Optional[Embeddings],
+               mmap: bool = True) -> FAISS:
+    """Open a vector store saved by save_index.
+    
+    Nothing is unpickled: the docstore is opened lazily on the first query and
+    the index vectors are memory-mapped where FAISS supports it for the index
+    type, so load time and resident memory do not grow with the corpus.
+    
+    Args:
+        folder_path: Directory written by save_index
+        embeddings: Embeddings used for queries
+        mmap: Memory-map the index instead of reading it into memory
+    
+    Returns:
+        LangChain FAISS vector store backed by the saved files
+    """
+    folder = Path(folder_path)
+    if not (folder / DOCSTORE_FILE).exists():
+        raise FileNotFoundError(f"No docstore at {folder / DOCSTORE_FILE}")
+    
+    index_path = str(folder / INDEX_FILE)
+    index = None
+    if mmap and hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC)
+        except RuntimeError:
+            # Index types without mmap support are read into memory
+            index = None
+    if index is None:
+        index = faiss.read_index(index_path)
+    
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=SQLiteDocstore(folder / DOCSTORE_FILE),
+        index_to_docstore_id=VectorIdMap(index.ntotal)
+    )
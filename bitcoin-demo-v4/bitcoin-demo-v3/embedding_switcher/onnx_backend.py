@@ -0,0 +1,215 @@
+from typing import List, Dict, Any, Optional, Sequence
+from pathlib import Path
+import os
+import time
+import inspect
+import numpy as np
+import torch
+
+# Backends accepted by TransformerEmbeddingAdapter
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_OPSET = 14
+
+def _import_onnxruntime():
+    """Import onnxruntime, which is only needed for the ONNX backends."""
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError(
+            "The ONNX backends require onnxruntime: pip install onnx onnxruntime"
+        ) from e
+    return onnxruntime
+
+def onnx_model_path(cache_dir: str, model_name: str, quantize: bool = False) -> Path:
+    """Get where the exported graph for a model is cached."""
+    filename = f"model.opset{ONNX_OPSET}{'.int8' if quantize else ''}.onnx"
+    return Path(cache_dir) / model_name.replace("/", "--") / filename
+
+class _LastHiddenState(torch.nn.Module):
+    """Wraps an encoder so tracing sees positional inputs and a single output."""
+    
+    def __init__(self, model: torch.nn.Module, input_names: List[str]):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+    
+    def forward(self, *inputs: torch.Tensor) -> torch.Tensor:
+        return self.model(**dict(zip(self.input_names, inputs))).last_hidden_state
+
+def export_onnx(model: torch.nn.Module, tokenizer: Any, model_name: str,
+                cache_dir: str, quantize: bool = False) -> Path:
+    """Export an encoder to ONNX once, optionally with dynamic int8 quantization.
+    
+    The exported graph takes the tokenizer's inputs with dynamic batch and
+    sequence axes and returns last_hidden_state. Files are written under a
+    temporary name and renamed, so an interrupted export is never reused.
+    
+    Args:
+        model: HuggingFace encoder model
+        tokenizer: Tokenizer matching the model
+        model_name: HuggingFace model name, used as the cache key
+        cache_dir: Directory holding exported graphs
+        quantize: Quantize weights of linear layers to int8
+    
+    Returns:
+        Path of the cached ONNX graph
+    """
+    path = onnx_model_path(cache_dir, model_name, quantize)
+    if path.exists():
+        return path
+    
+    if quantize:
+        _import_onnxruntime()
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        source = export_onnx(model, tokenizer, model_name, cache_dir)
+        tmp_path = path.with_suffix(".tmp")
+        quantize_dynamic(str(source), str(tmp_path), weight_type=QuantType.QInt8)
+        os.replace(tmp_path, path)
+        return path
+    
+    path.parent.mkdir(parents=True, exist_ok=True)
+    device = next(model.parameters()).device
+    dummy = tokenizer(["int main() { return 0; }"], return_tensors="pt")
+    input_names = list(dummy.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    
+    # Newer torch defaults to the dynamo exporter; keep the TorchScript one,
+    # which handles dynamic_axes on every supported torch version
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs["dynamo"] = False
+    
+    tmp_path = path.with_suffix(".tmp")
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(model, input_names).eval(),
+            tuple(dummy[name].to(device) for name in input_names),
+            str(tmp_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            **export_kwargs
+        )
+    os.replace(tmp_path, path)
+    return path
+
+class OnnxEncoder:
+    """Runs an exported encoder graph with ONNX Runtime on CPU."""
+    
+    def __init__(self, path: Path, num_threads: Optional[int] = None):
+        """Open an inference session.
+        
+        Args:
+            path: Path of the ONNX graph
+            num_threads: Intra-op threads, defaults to ONNX Runtime's choice
+        """
+        ort = _import_onnxruntime()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.path = path
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+    
+    def last_hidden_state(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        """Get the final hidden states for a padded batch of tokenizer outputs."""
+        feeds = {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names}
+        return self.session.run(["last_hidden_state"], feeds)[0]
+    
+    def cls_embeddings(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        """Get [CLS] embeddings for a padded batch of tokenizer outputs."""
+        return self.last_hidden_state(inputs)[:, 0, :]
+
+def _cosine_drift(reference: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    """Row-wise 1 - cosine similarity between two embedding matrices."""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return 1 - np.sum(reference * candidate, axis=1)
+
+def check_parity(adapter: Any, texts: List[str], backend: Optional[str] = None,
+                 max_cosine_drift: float = 0.01) -> Dict[str, Any]:
+    """Bound how far a backend's embeddings drift from the torch backend.
+    
+    The torch model is loaded for the reference embeddings and released again
+    afterwards if the adapter serves from ONNX.
+    
+    Args:
+        adapter: A TransformerEmbeddingAdapter
+        texts: Sample documents to embed with both backends
+        backend: Backend to check, defaults to the adapter's backend
+        max_cosine_drift: Largest allowed 1 - cosine similarity per document
+    
+    Returns:
+        Dictionary with the max and mean drift and whether the check passed
+    """
+    backend = backend or adapter.backend
+    reference = adapter.embed_documents_np(texts, backend="torch")
+    candidate = adapter.embed_documents_np(texts, backend=backend)
+    adapter.release_torch_model()
+    drift = _cosine_drift(reference, candidate)
+    return {
+        "backend": backend,
+        "documents": len(texts),
+        "max_cosine_drift": float(drift.max()),
+        "mean_cosine_drift": float(drift.mean()),
+        "threshold": max_cosine_drift,
+        "passed": bool(drift.max() <= max_cosine_drift)
+    }
+
+def benchmark_backends(adapter: Any, texts: List[str],
+                       backends: Sequence[str] = BACKENDS,
+                       repeats: int = 3) -> List[Dict[str, Any]]:
+    """Time embedding texts with each backend and report speedup over torch.
+    
+    Each backend is warmed up once (which also exports and caches its graph)
+    before the best of repeats runs is taken.
+    
+    Args:
+        adapter: A TransformerEmbeddingAdapter
+        texts: Documents to embed
+        backends: Backends to compare
+        repeats: Timed runs per backend
+    
+    Returns:
+        One row per backend with timing, speedup and cosine drift vs torch
+    """
+    reference = adapter.embed_documents_np(texts, backend="torch")
+    rows = []
+    for backend in backends:
+        embeddings = adapter.embed_documents_np(texts, backend=backend)
+        timings = []
+        for _ in range(repeats):
+            start_time = time.time()
+            adapter.embed_documents_np(texts, backend=backend)
+            timings.append(time.time() - start_time)
+        seconds = min(timings)
+        rows.append({
+            "backend": backend,
+            "seconds": seconds,
+            "docs_per_second": len(texts) / seconds if seconds > 0 else 0,
+            "max_cosine_drift": float(_cosine_drift(reference, embeddings).max())
+        })
+    
+    adapter.release_torch_model()
+    
+    torch_seconds = next((row["seconds"] for row in rows if row["backend"] == "torch"), None)
+    for row in rows:
+        row["speedup"] = torch_seconds / row["seconds"] if torch_seconds and row["seconds"] > 0 else None
+    return rows
+
+def format_backend_report(rows: List[Dict[str, Any]]) -> str:
+    """Render benchmark_backends rows as a markdown table."""
+    lines = [
+        "| Backend | Time (s) | Docs/s | Speedup | Max cosine drift |",
+        "|---|---|---|---|---|"
+    ]
+    for row in rows:
+        speedup = f"{row['speedup']:.2f}x" if row["speedup"] is not None else "-"
+        lines.append(
+            f"| {row['backend']} | {row['seconds']:.3f} | {row['docs_per_second']:.1f} "
+            f"| {speedup} | {row['max_cosine_drift']:.5f} |"
+        )
+    return "\n".join(lines)
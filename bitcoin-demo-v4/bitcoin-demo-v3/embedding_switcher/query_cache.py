@@ -0,0 +1,104 @@
+from typing import List, Dict, Any, Hashable, Optional
+from collections import OrderedDict
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+def normalize_query(text: str) -> str:
+    """Collapse runs of whitespace so trivially different queries share an entry.
+    
+    Case is kept, since code identifiers are case sensitive.
+    """
+    return " ".join(text.split())
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU cache of query embeddings with hit/miss counters."""
+    
+    def __init__(self, max_entries: int = 1024):
+        """Initialize an empty cache.
+        
+        Args:
+            max_entries: Maximum number of embeddings kept
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[List[float]]:
+        """Get a cached embedding and mark it as recently used, or None on a miss."""
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return list(embedding)
+    
+    def put(self, key: Hashable, embedding: List[float]):
+        """Store an embedding, evicting the least recently used beyond max_entries."""
+        with self._lock:
+            self._entries[key] = tuple(embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get the entry count, hit/miss counters and hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+# Shared by all adapters; keys include the model, so entries never mix
+SHARED_QUERY_CACHE = QueryEmbeddingCache()
+
+class CachedQueryEmbeddings(Embeddings):
+    """Wraps LangChain embeddings so repeated queries are embedded once."""
+    
+    def __init__(self, embeddings: Embeddings, model_name: str,
+                 cache: Optional[QueryEmbeddingCache] = None):
+        """Wrap an embeddings object.
+        
+        Args:
+            embeddings: Embeddings to delegate to
+            model_name: Model identifier used in cache keys
+            cache: Cache to use, defaults to the shared cache
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache if cache is not None else SHARED_QUERY_CACHE
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents without caching."""
+        return self.embeddings.embed_documents(texts)
+    
+    def embed_documents_np(self, texts: List[str], dtype: type = np.float32) -> np.ndarray:
+        """Embed documents as a matrix, skipping float lists when the wrapped embeddings can."""
+        if hasattr(self.embeddings, "embed_documents_np"):
+            return self.embeddings.embed_documents_np(texts, dtype=dtype)
+        return np.ascontiguousarray(self.embeddings.embed_documents(texts), dtype=dtype)
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, reusing the cached embedding of the same normalized text."""
+        text = normalize_query(text)
+        key = (self.model_name, text)
+        embedding = self.cache.get(key)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(text)
+            self.cache.put(key, embedding)
+        return embedding
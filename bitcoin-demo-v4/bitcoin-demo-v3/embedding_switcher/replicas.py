@@ -0,0 +1,411 @@
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Callable
+from concurrent.futures import Future
+from pathlib import Path
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+import traceback
+import numpy as np
+import torch
+from .onnx_backend import BACKENDS, OnnxEncoder
+
+# How a batch picks its replica: strictly in turn, or the one with the
+# fewest unfinished batches (ties broken in turn)
+DISPATCH_POLICIES = ("round_robin", "queue_depth")
+POOLING_MODES = ("cls", "mean")
+
+def available_cores() -> List[int]:
+    """CPU cores this process is allowed to run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def partition_cores(replicas: int, threads_per_replica: Optional[int] = None,
+                    cores: Optional[Sequence[int]] = None) -> List[List[int]]:
+    """Split cores into disjoint sets, one per replica.
+    
+    Args:
+        replicas: Number of core sets
+        threads_per_replica: Cores per set, defaults to an even split
+        cores: Cores to split, defaults to the cores available to this process
+    
+    Returns:
+        One list of core ids per replica
+    """
+    cores = list(cores) if cores is not None else available_cores()
+    if replicas < 1:
+        raise ValueError("replicas must be at least 1")
+    threads = threads_per_replica or len(cores) // replicas
+    if threads < 1 or replicas * threads > len(cores):
+        raise ValueError(
+            f"Cannot pin {replicas} replicas x {threads_per_replica or 'an even share of'} "
+            f"threads to {len(cores)} cores"
+        )
+    return [cores[i * threads:(i + 1) * threads] for i in range(replicas)]
+
+def candidate_splits(cores: int) -> List[Tuple[int, int]]:
+    """Replica x thread splits from one wide replica, doubling up to one per core."""
+    splits = []
+    replicas = 1
+    while replicas <= cores:
+        splits.append((replicas, cores // replicas))
+        replicas *= 2
+    if splits[-1][0] != cores:
+        splits.append((cores, 1))
+    return splits
+
+def pool_hidden_states(hidden: np.ndarray, attention_mask: np.ndarray,
+                       pooling: str = "cls") -> np.ndarray:
+    """Pool (batch, sequence, hidden) states into one vector per input.
+    
+    'cls' takes the first token; 'mean' averages the unpadded positions.
+    """
+    if pooling == "cls":
+        return hidden[:, 0, :]
+    mask = np.asarray(attention_mask)[:, :, None].astype(hidden.dtype)
+    return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1)
+
+def _load_encoder(model_name: str, backend: str, onnx_path: Optional[str],
+                  num_threads: int, model_kwargs: Dict[str, Any]) -> Callable[[Dict[str, np.ndarray]], np.ndarray]:
+    """Load a replica's model as a function from padded inputs to hidden states."""
+    if backend != "torch":
+        return OnnxEncoder(Path(onnx_path), num_threads).last_hidden_state
+    
+    from transformers import AutoModel
+    model = AutoModel.from_pretrained(model_name, **model_kwargs)
+    model.eval()
+    
+    def encode(inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        with torch.no_grad():
+            outputs = model(**{k: torch.from_numpy(v) for k, v in inputs.items()})
+            return outputs.last_hidden_state.numpy()
+    return encode
+
+def _replica_main(replica_id: int, cores: List[int], model_name: str, backend: str,
+                  onnx_path: Optional[str], pooling: str, model_kwargs: Dict[str, Any],
+                  requests: Any, results: Any):
+    """Worker process: pin to cores, load the model, then serve batches until None.
+    
+    pooling is the default for requests that do not name their own.
+    """
+    try:
+        # Pin before torch starts its thread pool, so every worker thread
+        # inherits the affinity
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        torch.set_num_threads(len(cores))
+        encode = _load_encoder(model_name, backend, onnx_path, len(cores), model_kwargs)
+    except Exception:
+        results.put((None, replica_id, False, traceback.format_exc()))
+        return
+    results.put((None, replica_id, True, None))
+    
+    parent = mp.parent_process()
+    while True:
+        try:
+            item = requests.get(timeout=1.0)
+        except queue.Empty:
+            # Exit with a parent that was killed before it could close us
+            if parent is not None and not parent.is_alive():
+                return
+            continue
+        if item is None:
+            return
+        request_id, inputs, request_pooling = item
+        try:
+            hidden = encode(inputs)
+            embeddings = pool_hidden_states(hidden, inputs["attention_mask"], request_pooling or pooling)
+            results.put((request_id, replica_id, True, np.ascontiguousarray(embeddings, dtype=np.float32)))
+        except Exception:
+            results.put((request_id, replica_id, False, traceback.format_exc()))
+
+class ReplicaRunner:
+    """Runs copies of an encoder in worker processes pinned to disjoint CPU cores.
+    
+    A single model with many intra-op threads scales poorly on large CPU
+    servers, and threads sharing one model contend for the same thread pool.
+    Each replica here is its own process, restricted to its own cores with
+    torch.set_num_threads matching them, so replicas never compete for a core.
+    Batches are dispatched round-robin or to the replica with the shortest
+    queue, and results come back as futures of pooled float32 embeddings.
+    """
+    
+    def __init__(self, model_name: str, replicas: int,
+                 threads_per_replica: Optional[int] = None,
+                 backend: str = "torch",
+                 onnx_path: Optional[str] = None,
+                 pooling: str = "cls",
+                 dispatch: str = "queue_depth",
+                 cores: Optional[Sequence[int]] = None,
+                 startup_timeout: float = 600.0,
+                 **model_kwargs: Any):
+        """Start the replicas and wait until each has loaded its model.
+        
+        Args:
+            model_name: HuggingFace model name
+            replicas: Number of worker processes
+            threads_per_replica: Cores (and torch threads) per replica,
+                defaults to an even split of the available cores
+            backend: 'torch', or 'onnx' / 'onnx-int8' to run onnx_path
+            onnx_path: Exported graph, required for the ONNX backends
+            pooling: Default pooling, 'cls' for the first token or 'mean'
+                for masked averaging
+            dispatch: 'round_robin' or 'queue_depth'
+            cores: Cores to partition, defaults to those available
+            startup_timeout: Seconds to wait for the models to load
+            model_kwargs: Additional model arguments
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}'. Available backends: {list(BACKENDS)}")
+        if backend != "torch" and onnx_path is None:
+            raise ValueError(f"Backend '{backend}' needs onnx_path")
+        if pooling not in POOLING_MODES:
+            raise ValueError(f"Unknown pooling '{pooling}'. Available pooling: {list(POOLING_MODES)}")
+        if dispatch not in DISPATCH_POLICIES:
+            raise ValueError(f"Unknown dispatch '{dispatch}'. Available policies: {list(DISPATCH_POLICIES)}")
+        
+        self.model_name = model_name
+        self.backend = backend
+        self.pooling = pooling
+        self.dispatch = dispatch
+        self.core_sets = partition_cores(replicas, threads_per_replica, cores)
+        
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Tuple[int, Future]] = {}
+        self._outstanding = [0] * replicas
+        self._completed = [0] * replicas
+        self._alive = [True] * replicas
+        self._next_request = 0
+        self._next_replica = 0
+        self._closed = False
+        self._collector: Optional[threading.Thread] = None
+        
+        # Spawn rather than fork: the parent may already hold torch threads
+        context = mp.get_context("spawn")
+        self._results = context.Queue()
+        self._requests = [context.Queue() for _ in self.core_sets]
+        self._processes = [
+            context.Process(
+                target=_replica_main,
+                args=(i, cores, model_name, backend, str(onnx_path) if onnx_path else None,
+                      pooling, model_kwargs, self._requests[i], self._results),
+                daemon=True
+            )
+            for i, cores in enumerate(self.core_sets)
+        ]
+        
+        start_time = time.time()
+        for process in self._processes:
+            process.start()
+        self._wait_ready(startup_timeout)
+        self.startup_seconds = time.time() - start_time
+        
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+    
+    @property
+    def replicas(self) -> int:
+        """Number of replicas started."""
+        return len(self.core_sets)
+    
+    def _wait_ready(self, timeout: float):
+        """Block until every replica reports its model loaded, or fail."""
+        deadline = time.time() + timeout
+        ready = set()
+        while len(ready) < self.replicas:
+            try:
+                _, replica, ok, error = self._results.get(timeout=max(deadline - time.time(), 0.01))
+            except queue.Empty:
+                self.close()
+                raise TimeoutError(f"Replicas of {self.model_name} did not start within {timeout}s")
+            if not ok:
+                self.close()
+                raise RuntimeError(f"Replica {replica} of {self.model_name} failed to start:\n{error}")
+            ready.add(replica)
+    
+    def _pick_replica(self) -> int:
+        """Choose the replica for the next batch; call with the lock held."""
+        count = self.replicas
+        order = [(self._next_replica + i) % count for i in range(count)]
+        order = [replica for replica in order if self._alive[replica]]
+        if not order:
+            raise RuntimeError(f"All replicas of {self.model_name} have exited")
+        self._next_replica = (order[0] + 1) % count
+        if self.dispatch == "round_robin":
+            return order[0]
+        return min(order, key=lambda replica: self._outstanding[replica])
+    
+    def submit(self, inputs: Dict[str, Any], pooling: Optional[str] = None) -> Future:
+        """Queue one padded batch of tokenizer outputs.
+        
+        Args:
+            inputs: Tokenizer outputs as numpy arrays (or CPU tensors)
+            pooling: Pooling for this batch, defaults to the runner's
+        
+        Returns:
+            Future of the pooled float32 embeddings, shape (batch, hidden_size)
+        """
+        if pooling is not None and pooling not in POOLING_MODES:
+            raise ValueError(f"Unknown pooling '{pooling}'. Available pooling: {list(POOLING_MODES)}")
+        inputs = {key: np.asarray(value) for key, value in inputs.items()}
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ReplicaRunner is closed")
+            replica = self._pick_replica()
+            request_id = self._next_request
+            self._next_request += 1
+            self._pending[request_id] = (replica, future)
+            self._outstanding[replica] += 1
+        self._requests[replica].put((request_id, inputs, pooling))
+        return future
+    
+    def map(self, batches: List[Dict[str, Any]]) -> List[np.ndarray]:
+        """Embed several batches concurrently and return results in order."""
+        futures = [self.submit(inputs) for inputs in batches]
+        return [future.result() for future in futures]
+    
+    def _collect(self):
+        """Resolve futures as replicas return results; runs in a background thread."""
+        while True:
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                self._fail_exited_replicas()
+                continue
+            if message is None:
+                return
+            
+            request_id, replica, ok, payload = message
+            with self._lock:
+                entry = self._pending.pop(request_id, None)
+                if entry is not None:
+                    self._outstanding[replica] -= 1
+                    self._completed[replica] += 1
+            if entry is None:
+                continue
+            if ok:
+                entry[1].set_result(payload)
+            else:
+                entry[1].set_exception(RuntimeError(f"Replica {replica} failed:\n{payload}"))
+    
+    def _fail_exited_replicas(self):
+        """Fail the unfinished batches of replicas that died, e.g. killed for memory.
+        
+        Dead replicas get no further batches, so callers never wait forever.
+        """
+        failed = []
+        with self._lock:
+            for replica, process in enumerate(self._processes):
+                if self._alive[replica] and not process.is_alive():
+                    self._alive[replica] = False
+                    for request_id, (owner, future) in list(self._pending.items()):
+                        if owner == replica:
+                            del self._pending[request_id]
+                            failed.append(future)
+                    self._outstanding[replica] = 0
+        for future in failed:
+            future.set_exception(RuntimeError(f"A replica of {self.model_name} exited"))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get the core partition, dispatch policy and per-replica batch counts."""
+        with self._lock:
+            return {
+                "replicas": self.replicas,
+                "threads_per_replica": len(self.core_sets[0]),
+                "cores": self.core_sets,
+                "dispatch": self.dispatch,
+                "alive": list(self._alive),
+                "outstanding": list(self._outstanding),
+                "completed": list(self._completed)
+            }
+    
+    def close(self):
+        """Stop the replicas; unfinished batches fail."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        
+        for requests in self._requests:
+            requests.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        if self._collector is not None:
+            self._results.put(None)
+            self._collector.join()
+        
+        with self._lock:
+            pending = [future for _, future in self._pending.values()]
+            self._pending.clear()
+        for future in pending:
+            future.set_exception(RuntimeError("ReplicaRunner was closed"))
+    
+    def __enter__(self) -> "ReplicaRunner":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def benchmark_replica_splits(model_name: str, batches: List[Dict[str, Any]],
+                             splits: Optional[Sequence[Tuple[int, int]]] = None,
+                             cores: Optional[Sequence[int]] = None,
+                             **runner_kwargs: Any) -> List[Dict[str, Any]]:
+    """Time embedding the same batches with each replica x thread split.
+    
+    Every replica is warmed up with one batch before timing, so rows compare
+    steady-state throughput; model startup is reported separately.
+    
+    Args:
+        model_name: HuggingFace model name
+        batches: Padded tokenizer outputs, as numpy arrays
+        splits: (replicas, threads_per_replica) pairs, defaults to
+            candidate_splits of the available cores
+        cores: Cores to partition, defaults to those available
+        runner_kwargs: Further ReplicaRunner arguments, e.g. backend
+    
+    Returns:
+        One row per split with timing and throughput
+    """
+    cores = list(cores) if cores is not None else available_cores()
+    documents = sum(len(inputs["attention_mask"]) for inputs in batches)
+    tokens = int(sum(np.asarray(inputs["attention_mask"]).sum() for inputs in batches))
+    
+    rows = []
+    for replicas, threads in splits or candidate_splits(len(cores)):
+        with ReplicaRunner(model_name, replicas, threads, cores=cores, **runner_kwargs) as runner:
+            runner.map(batches[:1] * replicas)
+            start_time = time.time()
+            runner.map(batches)
+            seconds = time.time() - start_time
+        rows.append({
+            "replicas": replicas,
+            "threads_per_replica": threads,
+            "startup_seconds": runner.startup_seconds,
+            "seconds": seconds,
+            "docs_per_second": documents / seconds if seconds > 0 else 0,
+            "tokens_per_second": tokens / seconds if seconds > 0 else 0
+        })
+    return rows
+
+def best_replica_split(rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """Get the (replicas, threads_per_replica) with the highest throughput."""
+    best = max(rows, key=lambda row: row["docs_per_second"])
+    return best["replicas"], best["threads_per_replica"]
+
+def format_replica_report(rows: List[Dict[str, Any]]) -> str:
+    """Render benchmark_replica_splits rows as a markdown table."""
+    lines = [
+        "| Replicas x threads | Startup (s) | Time (s) | Docs/s | Tokens/s |",
+        "|---|---|---|---|---|"
+    ]
+    for row in rows:
+        lines.append(
+            f"| {row['replicas']} x {row['threads_per_replica']} | {row['startup_seconds']:.1f} "
+            f"| {row['seconds']:.3f} | {row['docs_per_second']:.1f} | {row['tokens_per_second']:.0f} |"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,55 @@
+from typing import List, Dict, Any, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .base import BaseEmbeddingAdapter
+
+class SentenceTransformerAdapter(BaseEmbeddingAdapter, Embeddings):
+    """Adapter for sentence-transformers models, e.g. kno_sdk's all-MiniLM-L6-v2."""
+    
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2",
+                 batch_size: int = 32,
+                 device: Optional[str] = None):
+        """Load the model.
+        
+        Args:
+            model_name: sentence-transformers model name
+            batch_size: Documents per forward pass
+            device: Device to run on, defaults to sentence-transformers' choice
+        """
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "SentenceTransformerAdapter requires sentence-transformers: "
+                "pip install sentence-transformers"
+            ) from e
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device=device)
+    
+    def embed_documents_np(self, texts: List[str], dtype: type = np.float32) -> np.ndarray:
+        """Create embeddings for documents as a matrix, pooled as the model defines."""
+        embeddings = self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+        return np.ascontiguousarray(embeddings, dtype=dtype)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Create embeddings for documents as float lists."""
+        return self.embed_documents_np(texts).tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Create embedding for a single query."""
+        return self.embed_documents_np([text])[0].tolist()
+    
+    def memory_bytes(self) -> int:
+        """Bytes held by the model's parameters and buffers."""
+        tensors = list(self.model.parameters()) + list(self.model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    
+    def get_model_info(self) -> Dict[str, Any]:
+        """Get information about the sentence-transformers model."""
+        return {
+            "name": self.model_name,
+            "dimension": self.model.get_sentence_embedding_dimension(),
+            "max_length": self.model.max_seq_length,
+            "batch_size": self.batch_size
+        }
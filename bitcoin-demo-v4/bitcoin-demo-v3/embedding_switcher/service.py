@@ -0,0 +1,532 @@
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from concurrent.futures import Future
+from functools import partial
+from itertools import groupby
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .base import BaseEmbeddingAdapter
+from .query_cache import SHARED_QUERY_CACHE, normalize_query
+
+# Components use the service at this socket when the variable is set
+SOCKET_ENV = "EMBEDDING_SERVICE_SOCKET"
+DEFAULT_SOCKET = "/tmp/btc-rag-embeddings.sock"
+
+# Frames are a 4-byte header length, a JSON header, then payload_bytes raw bytes
+_LENGTH = struct.Struct("!I")
+
+# Served model name -> (embedder, pooling). Names sharing an embedder share
+# its weights; pooling None leaves pooling to the model
+DEFAULT_SERVED_MODELS = {
+    "codebert": ("codebert", "cls"),
+    "codebert-mean": ("codebert", "mean"),
+    "graphcodebert": ("graphcodebert", "cls"),
+    "unixcoder": ("unixcoder", "cls"),
+    "all-MiniLM-L6-v2": ("all-MiniLM-L6-v2", None)
+}
+
+class EmbeddingServiceUnavailable(ConnectionError):
+    """Raised when the embedding service cannot be reached."""
+
+def default_socket_path() -> str:
+    """Socket path from EMBEDDING_SERVICE_SOCKET, or the default."""
+    return os.getenv(SOCKET_ENV) or DEFAULT_SOCKET
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytearray:
+    """Read exactly size bytes into a writable buffer."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if not count:
+            raise ConnectionError("Connection closed mid-frame")
+        received += count
+    return buffer
+
+def send_frame(sock: socket.socket, header: Dict[str, Any], payload: Any = b""):
+    """Send a JSON header followed by a raw payload (bytes or a byte memoryview)."""
+    data = json.dumps(dict(header, payload_bytes=len(payload))).encode("utf-8")
+    sock.sendall(_LENGTH.pack(len(data)) + data)
+    if len(payload):
+        sock.sendall(payload)
+
+def recv_frame(sock: socket.socket) -> Optional[Tuple[Dict[str, Any], bytearray]]:
+    """Receive one frame, or None if the peer closed the connection between frames."""
+    prefix = sock.recv(_LENGTH.size)
+    if not prefix:
+        return None
+    if len(prefix) < _LENGTH.size:
+        prefix += _recv_exactly(sock, _LENGTH.size - len(prefix))
+    (length,) = _LENGTH.unpack(prefix)
+    header = json.loads(_recv_exactly(sock, length).decode("utf-8"))
+    return header, _recv_exactly(sock, header.get("payload_bytes", 0))
+
+class _MicroBatcher:
+    """Merges concurrent requests for one embedder into shared forward passes."""
+    
+    def __init__(self, embed: Callable[[List[str], Optional[str]], np.ndarray],
+                 max_batch_documents: int, max_wait_seconds: float):
+        self.embed = embed
+        self.max_batch_documents = max_batch_documents
+        self.max_wait_seconds = max_wait_seconds
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.documents = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def submit(self, texts: List[str], pooling: Optional[str]) -> Future:
+        """Queue texts; the future resolves to their embedding matrix."""
+        future = Future()
+        self.requests.put((texts, pooling, future))
+        return future
+    
+    def close(self):
+        """Stop after the requests already queued."""
+        self.requests.put(None)
+    
+    def _gather(self) -> Optional[List[Tuple[List[str], Optional[str], Future]]]:
+        """Wait for a request, then collect others arriving within max_wait_seconds."""
+        first = self.requests.get()
+        if first is None:
+            return None
+        items = [first]
+        count = len(first[0])
+        deadline = time.time() + self.max_wait_seconds
+        while count < self.max_batch_documents:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Finish this batch, then stop
+                self.requests.put(None)
+                break
+            items.append(item)
+            count += len(item[0])
+        return items
+    
+    def _run(self):
+        """Embed gathered requests, one forward call per pooling mode."""
+        while True:
+            items = self._gather()
+            if items is None:
+                return
+            items.sort(key=lambda item: item[1] or "")
+            for _, group in groupby(items, key=lambda item: item[1]):
+                group = list(group)
+                texts = [text for item in group for text in item[0]]
+                try:
+                    embeddings = self.embed(texts, group[0][1])
+                except Exception as e:
+                    for item in group:
+                        item[2].set_exception(e)
+                    continue
+                self.batches += 1
+                self.documents += len(texts)
+                start = 0
+                for item_texts, _, future in group:
+                    future.set_result(embeddings[start:start + len(item_texts)])
+                    start += len(item_texts)
+
+class _ServiceHandler(socketserver.BaseRequestHandler):
+    """Serves frames on one client connection until the client disconnects."""
+    
+    def setup(self):
+        self.server.service._track_connection(self.request, True)
+    
+    def finish(self):
+        self.server.service._track_connection(self.request, False)
+    
+    def handle(self):
+        while True:
+            try:
+                frame = recv_frame(self.request)
+            except (ConnectionError, OSError):
+                return
+            if frame is None:
+                return
+            header, _ = frame
+            try:
+                response, payload = self.server.service.handle_request(header)
+            except Exception as e:
+                response, payload = {"ok": False, "error": f"{type(e).__name__}: {e}"}, b""
+            try:
+                send_frame(self.request, response, payload)
+            except OSError:
+                return
+
+class EmbeddingService:
+    """Keeps embedding models resident and serves them to local processes.
+    
+    Clients connect over a Unix socket, so every component on a host shares
+    one copy of each model. Concurrent requests for the same embedder are
+    merged into micro-batches: the first request waits up to max_wait_ms for
+    others, up to max_batch_documents, so many small calls share forward
+    passes. Responses carry the float32 matrix as raw bytes.
+    """
+    
+    def __init__(self, switcher: Any,
+                 served_models: Optional[Dict[str, Tuple[str, Optional[str]]]] = None,
+                 max_batch_documents: int = 256,
+                 max_wait_ms: float = 5.0):
+        """Initialize the service.
+        
+        Args:
+            switcher: EmbeddingSwitcher holding the embedders
+            served_models: Served name -> (embedder, pooling), defaults to
+                DEFAULT_SERVED_MODELS restricted to the switcher's embedders
+            max_batch_documents: Documents merged into one micro-batch at most
+            max_wait_ms: How long a request waits for others to batch with
+        """
+        self.switcher = switcher
+        if served_models is None:
+            available = set(switcher.list_embedders())
+            served_models = {
+                name: spec for name, spec in DEFAULT_SERVED_MODELS.items() if spec[0] in available
+            }
+        self.served_models = served_models
+        self.max_batch_documents = max_batch_documents
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.requests = 0
+        self._batchers: Dict[str, _MicroBatcher] = {}
+        self._connections = set()
+        self._lock = threading.Lock()
+        self._server: Optional[socketserver.ThreadingUnixStreamServer] = None
+    
+    def _track_connection(self, sock: socket.socket, open_: bool):
+        """Record open client connections so shutdown can close them."""
+        with self._lock:
+            if open_:
+                self._connections.add(sock)
+            else:
+                self._connections.discard(sock)
+    
+    def _embed_with(self, embedder: str, texts: List[str], pooling: Optional[str]) -> np.ndarray:
+        """Run one micro-batch through an embedder."""
+        adapter = self.switcher.get_embeddings(embedder)
+        if pooling is None:
+            return adapter.embed_documents_np(texts, dtype=np.float32)
+        return adapter.embed_documents_np(texts, dtype=np.float32, pooling=pooling)
+    
+    def _get_batcher(self, embedder: str) -> _MicroBatcher:
+        """Get the micro-batcher of an embedder, starting it on first use."""
+        with self._lock:
+            if embedder not in self._batchers:
+                self._batchers[embedder] = _MicroBatcher(
+                    partial(self._embed_with, embedder),
+                    self.max_batch_documents, self.max_wait_seconds
+                )
+            return self._batchers[embedder]
+    
+    def embed(self, model: str, texts: List[str]) -> np.ndarray:
+        """Embed texts with a served model, batched with concurrent requests.
+        
+        Args:
+            model: Served model name
+            texts: Documents to embed
+        
+        Returns:
+            float32 array of shape (len(texts), dimension)
+        """
+        if model not in self.served_models:
+            raise ValueError(f"Model '{model}' is not served. Available models: {list(self.served_models)}")
+        embedder, pooling = self.served_models[model]
+        with self._lock:
+            self.requests += 1
+        return self._get_batcher(embedder).submit(texts, pooling).result()
+    
+    def handle_request(self, header: Dict[str, Any]) -> Tuple[Dict[str, Any], Any]:
+        """Answer one request frame.
+        
+        Returns:
+            Tuple of (response header, payload)
+        """
+        op = header.get("op")
+        if op == "embed":
+            embeddings = np.ascontiguousarray(self.embed(header["model"], header["texts"]), dtype=np.float32)
+            response = {"ok": True, "shape": list(embeddings.shape), "dtype": "float32"}
+            return response, memoryview(embeddings).cast("B")
+        if op == "ping":
+            return {"ok": True, "models": list(self.served_models)}, b""
+        if op == "stats":
+            return {"ok": True, "stats": self.stats()}, b""
+        raise ValueError(f"Unknown op '{op}'")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get request and micro-batch counts and model residency."""
+        with self._lock:
+            batchers = dict(self._batchers)
+            requests = self.requests
+        return {
+            "served_models": {name: list(spec) for name, spec in self.served_models.items()},
+            "requests": requests,
+            "micro_batches": {
+                embedder: {
+                    "batches": batcher.batches,
+                    "documents": batcher.documents,
+                    "avg_documents_per_batch": batcher.documents / batcher.batches if batcher.batches else 0.0
+                }
+                for embedder, batcher in batchers.items()
+            },
+            "residency": self.switcher.get_stats()
+        }
+    
+    def serve_forever(self, socket_path: Optional[str] = None):
+        """Listen on a Unix socket until shutdown is called.
+        
+        A socket file left behind by a service that crashed is replaced; a
+        live one is not.
+        """
+        socket_path = socket_path or default_socket_path()
+        if os.path.exists(socket_path):
+            if EmbeddingServiceClient(socket_path).available():
+                raise RuntimeError(f"An embedding service is already listening on {socket_path}")
+            os.unlink(socket_path)
+        
+        server = socketserver.ThreadingUnixStreamServer(socket_path, _ServiceHandler)
+        server.daemon_threads = True
+        server.service = self
+        # Only the owner and group may connect
+        os.chmod(socket_path, 0o660)
+        self._server = server
+        print(f"Embedding service listening on {socket_path}: {', '.join(self.served_models)}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+    
+    def shutdown(self):
+        """Stop serving; call from another thread than serve_forever.
+        
+        Open client connections are closed too, so clients fall back to
+        in-process models rather than keep talking to a stopped service.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+        with self._lock:
+            for sock in self._connections:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            for batcher in self._batchers.values():
+                batcher.close()
+            self._batchers.clear()
+
+class EmbeddingServiceClient:
+    """Client for an EmbeddingService, with one persistent connection per thread."""
+    
+    def __init__(self, socket_path: Optional[str] = None, timeout: float = 300.0):
+        """Initialize the client; connections are opened on first request.
+        
+        Args:
+            socket_path: Service socket, defaults to default_socket_path()
+            timeout: Seconds to wait for a response
+        """
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self._local = threading.local()
+    
+    def _connect(self) -> socket.socket:
+        """Open a connection to the service."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise EmbeddingServiceUnavailable(f"No embedding service at {self.socket_path}: {e}") from e
+        return sock
+    
+    def _request(self, header: Dict[str, Any]) -> Tuple[Dict[str, Any], bytearray]:
+        """Send a request and get the response, reconnecting once if the service restarted."""
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None)
+            reused = sock is not None
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            try:
+                send_frame(sock, header)
+                frame = recv_frame(sock)
+                if frame is None:
+                    raise ConnectionError("Connection closed by the embedding service")
+            except OSError as e:
+                self.close()
+                if reused and attempt == 0:
+                    continue
+                raise EmbeddingServiceUnavailable(f"Embedding service at {self.socket_path} failed: {e}") from e
+            response, payload = frame
+            if not response.get("ok"):
+                raise RuntimeError(f"Embedding service error: {response.get('error')}")
+            return response, payload
+    
+    def embed(self, model: str, texts: List[str]) -> np.ndarray:
+        """Embed texts with a served model.
+        
+        Returns:
+            float32 array of shape (len(texts), dimension)
+        """
+        response, payload = self._request({"op": "embed", "model": model, "texts": list(texts)})
+        return np.frombuffer(payload, dtype=response["dtype"]).reshape(response["shape"])
+    
+    def ping(self) -> Dict[str, Any]:
+        """Check the service and list its served models."""
+        return self._request({"op": "ping"})[0]
+    
+    def available(self) -> bool:
+        """Whether the service can be reached."""
+        try:
+            self.ping()
+            return True
+        except EmbeddingServiceUnavailable:
+            return False
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get the service's request, micro-batch and residency statistics."""
+        return self._request({"op": "stats"})[0]["stats"]
+    
+    def close(self):
+        """Close this thread's connection."""
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+class ServiceEmbeddingAdapter(BaseEmbeddingAdapter, Embeddings):
+    """Embeds through the shared embedding service, with an in-process fallback.
+    
+    The fallback model is only built if the service cannot be reached, so on
+    a host running the service each model's memory is paid once. Once fallen
+    back, the adapter stays in-process.
+    """
+    
+    def __init__(self, model: str, socket_path: Optional[str] = None,
+                 fallback: Optional[Callable[[], Any]] = None,
+                 timeout: float = 300.0):
+        """Initialize the adapter.
+        
+        Args:
+            model: Served model name, e.g. 'codebert'
+            socket_path: Service socket, defaults to default_socket_path()
+            fallback: Callable building equivalent in-process embeddings, e.g.
+                a functools.partial of an adapter; None raises instead
+            timeout: Seconds to wait for the service to respond
+        """
+        self.model_name = model
+        self.client = EmbeddingServiceClient(socket_path, timeout)
+        self.fallback = fallback
+        self._fallback_embeddings = None
+        self._lock = threading.Lock()
+        # Shared across adapters; set to None to disable
+        self.query_cache = SHARED_QUERY_CACHE
+    
+    def _get_fallback(self) -> Any:
+        """Build the in-process embeddings on first use."""
+        with self._lock:
+            if self._fallback_embeddings is None:
+                print(f"Embedding service at {self.client.socket_path} unavailable; "
+                      f"loading '{self.model_name}' in-process")
+                self._fallback_embeddings = self.fallback()
+            return self._fallback_embeddings
+    
+    def embed_documents_np(self, texts: List[str], dtype: type = np.float32) -> np.ndarray:
+        """Create embeddings for documents as a matrix."""
+        if self._fallback_embeddings is None:
+            try:
+                return self.client.embed(self.model_name, texts).astype(dtype, copy=False)
+            except EmbeddingServiceUnavailable:
+                if self.fallback is None:
+                    raise
+        
+        embeddings = self._get_fallback()
+        if hasattr(embeddings, "embed_documents_np"):
+            return embeddings.embed_documents_np(texts, dtype=dtype)
+        return np.ascontiguousarray(embeddings.embed_documents(texts), dtype=dtype)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Create embeddings for documents as float lists."""
+        return self.embed_documents_np(texts).tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Create embedding for a single query, cached per served model."""
+        text = normalize_query(text)
+        if self.query_cache is None:
+            return self.embed_documents_np([text])[0].tolist()
+        
+        key = ("service", self.model_name, text)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = self.embed_documents_np([text])[0].tolist()
+            self.query_cache.put(key, embedding)
+        return embedding
+    
+    def memory_bytes(self) -> int:
+        """Bytes held in this process, which is only the fallback model, if loaded."""
+        if self._fallback_embeddings is not None and hasattr(self._fallback_embeddings, "memory_bytes"):
+            return self._fallback_embeddings.memory_bytes()
+        return 0
+    
+    def close(self):
+        """Close the service connection and stop any fallback replicas."""
+        self.client.close()
+        if self._fallback_embeddings is not None and hasattr(self._fallback_embeddings, "close"):
+            self._fallback_embeddings.close()
+    
+    def get_model_info(self) -> Dict[str, Any]:
+        """Get information about the served model."""
+        info = {
+            "name": self.model_name,
+            "socket_path": self.client.socket_path,
+            "in_process": self._fallback_embeddings is not None
+        }
+        if self._fallback_embeddings is not None and hasattr(self._fallback_embeddings, "get_model_info"):
+            info["fallback"] = self._fallback_embeddings.get_model_info()
+        return info
+
+def main():
+    from . import EmbeddingSwitcher, CodeBERTAdapter, GraphCodeBERTAdapter, UniXcoderAdapter
+    from .sentence_transformer import SentenceTransformerAdapter
+    
+    parser = argparse.ArgumentParser(description="Serve embedding models over a Unix socket")
+    parser.add_argument("--socket", help=f"Socket path (default: ${SOCKET_ENV} or {DEFAULT_SOCKET})")
+    parser.add_argument("--backend", default="torch", help="torch, onnx or onnx-int8")
+    parser.add_argument("--replicas", type=int, default=0, help="Core-pinned replicas per model (CPU)")
+    parser.add_argument("--max-batch-documents", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--preload", nargs="*", default=[], metavar="EMBEDDER",
+                        help="Embedders to load before serving instead of on first request")
+    args = parser.parse_args()
+    
+    adapter_kwargs = {"backend": args.backend, "replicas": args.replicas}
+    switcher = EmbeddingSwitcher()
+    switcher.register_factory("codebert", partial(CodeBERTAdapter, **adapter_kwargs))
+    switcher.register_factory("graphcodebert", partial(GraphCodeBERTAdapter, **adapter_kwargs))
+    switcher.register_factory("unixcoder", partial(UniXcoderAdapter, **adapter_kwargs))
+    switcher.register_factory("all-MiniLM-L6-v2", SentenceTransformerAdapter)
+    for name in args.preload:
+        switcher.get_embeddings(name)
+    
+    service = EmbeddingService(switcher, max_batch_documents=args.max_batch_documents,
+                               max_wait_ms=args.max_wait_ms)
+    try:
+        service.serve_forever(args.socket)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
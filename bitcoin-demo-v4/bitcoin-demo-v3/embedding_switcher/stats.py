@@ -0,0 +1,111 @@
+from typing import Dict, Any, Optional
+from bisect import bisect_left
+import threading
+
+# Upper bounds of the per-batch latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+class EmbeddingStats:
+    """Resettable counters describing an adapter's embedding workload.
+    
+    Token counts come from the attention mask, so they are real model tokens
+    rather than characters, and padded positions are counted separately.
+    Updates are thread-safe, since tokenization runs in a prefetch thread.
+    """
+    
+    def __init__(self):
+        """Initialize all counters to zero."""
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Zero all counters, e.g. before measuring a new workload."""
+        with self._lock:
+            self.documents = 0
+            self.truncated_documents = 0
+            self.real_tokens = 0
+            self.padded_tokens = 0
+            self.batches = 0
+            self.seconds = 0.0
+            self.tokenize_seconds = 0.0
+            self.inference_seconds = 0.0
+            self.max_batch_latency_ms = 0.0
+            self.batch_latency_counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    
+    def record_tokenization(self, documents: int, truncated: int, seconds: float):
+        """Record tokenizing documents, of which truncated exceeded max_length."""
+        with self._lock:
+            self.documents += documents
+            self.truncated_documents += truncated
+            self.tokenize_seconds += seconds
+    
+    def record_batch(self, attention_mask: Any, seconds: float):
+        """Record one forward pass given its (batch, sequence) attention mask."""
+        latency_ms = seconds * 1000
+        with self._lock:
+            self.real_tokens += int(attention_mask.sum())
+            self.padded_tokens += attention_mask.shape[0] * attention_mask.shape[1]
+            self.batches += 1
+            self.inference_seconds += seconds
+            self.max_batch_latency_ms = max(self.max_batch_latency_ms, latency_ms)
+            self.batch_latency_counts[bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+    
+    def record_call(self, seconds: float):
+        """Record the wall-clock time of one embedding call."""
+        with self._lock:
+            self.seconds += seconds
+    
+    @property
+    def padding_ratio(self) -> float:
+        """Fraction of computed positions that were padding."""
+        if not self.padded_tokens:
+            return 0.0
+        return 1 - self.real_tokens / self.padded_tokens
+    
+    @property
+    def tokens_per_second(self) -> float:
+        """Real (non-padding) tokens embedded per wall-clock second."""
+        return self.real_tokens / self.seconds if self.seconds > 0 else 0
+    
+    @property
+    def truncation_rate(self) -> float:
+        """Fraction of documents cut off at max_length."""
+        return self.truncated_documents / self.documents if self.documents else 0.0
+    
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Upper bound of the histogram bucket holding a batch latency percentile, in ms."""
+        if not self.batches:
+            return None
+        rank = percentile / 100 * self.batches
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.batch_latency_counts):
+            seen += count
+            if seen >= rank:
+                return min(float(bound), self.max_batch_latency_ms)
+        return self.max_batch_latency_ms
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """Get the counters and derived rates as a dictionary."""
+        with self._lock:
+            histogram = {f"<={bound}": count for bound, count in zip(LATENCY_BUCKETS_MS, self.batch_latency_counts)}
+            histogram[f">{LATENCY_BUCKETS_MS[-1]}"] = self.batch_latency_counts[-1]
+            return {
+                "documents": self.documents,
+                "truncated_documents": self.truncated_documents,
+                "truncation_rate": self.truncation_rate,
+                "real_tokens": self.real_tokens,
+                "padded_tokens": self.padded_tokens,
+                "padding_ratio": self.padding_ratio,
+                "batches": self.batches,
+                "seconds": self.seconds,
+                "tokenize_seconds": self.tokenize_seconds,
+                "inference_seconds": self.inference_seconds,
+                "effective_tokens_per_second": self.tokens_per_second,
+                "batch_latency_ms": {
+                    "histogram": histogram,
+                    "mean": self.inference_seconds * 1000 / self.batches if self.batches else None,
+                    "p50": self.latency_percentile(50),
+                    "p95": self.latency_percentile(95),
+                    "max": self.max_batch_latency_ms
+                }
+            }
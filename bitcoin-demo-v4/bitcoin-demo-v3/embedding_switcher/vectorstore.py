@@ -0,0 +1,63 @@
+from typing import List, Optional
+import uuid
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from .base import BaseEmbeddingAdapter
+
+def faiss_from_documents(documents: List[Document],
+                         adapter: BaseEmbeddingAdapter,
+                         index: Optional[faiss.Index] = None,
+                         vectors: Optional[np.ndarray] = None) -> FAISS:
+    """Build a FAISS vector store from an adapter's embedding matrix.
+    
+    Unlike FAISS.from_documents, the float32 matrix from embed_documents_np is
+    added to the index as-is, without a round trip through Python float lists.
+    
+    Args:
+        documents: Documents to index
+        adapter: Adapter used for the documents and, later, for queries
+        index: Empty FAISS index to fill; defaults to an exact L2 index
+        vectors: The documents' float32 embeddings if already computed, e.g.
+            from a cache
+    
+    Returns:
+        LangChain FAISS vector store over the documents
+    """
+    if vectors is None:
+        vectors = adapter.embed_documents_np([doc.page_content for doc in documents], dtype=np.float32)
+    if index is None:
+        index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    
+    ids = [str(uuid.uuid4()) for _ in documents]
+    return FAISS(
+        embedding_function=adapter,
+        index=index,
+        docstore=InMemoryDocstore(dict(zip(ids, documents))),
+        index_to_docstore_id=dict(enumerate(ids))
+    )
+
+def add_documents_np(vector_store: FAISS, documents: List[Document],
+                     adapter: BaseEmbeddingAdapter,
+                     vectors: Optional[np.ndarray] = None):
+    """Embed documents as a matrix and add them to a store from faiss_from_documents.
+    
+    Args:
+        vector_store: Vector store with an addable docstore
+        documents: Documents to add
+        adapter: Adapter the store was built with
+        vectors: The documents' float32 embeddings if already computed
+    """
+    if not documents:
+        return
+    if vectors is None:
+        vectors = adapter.embed_documents_np([doc.page_content for doc in documents], dtype=np.float32)
+    start = vector_store.index.ntotal
+    vector_store.index.add(vectors)
+    
+    ids = [str(uuid.uuid4()) for _ in documents]
+    vector_store.docstore.add(dict(zip(ids, documents)))
+    vector_store.index_to_docstore_id.update({start + i: doc_id for i, doc_id in enumerate(ids)})
@@ -0,0 +1,216 @@
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Callable
+from pathlib import Path
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+from git import Repo, Blob
+from langchain_core.documents import Document
+
+class BlobCache:
+    """Chunks and embeddings of git blobs, keyed by blob SHA.
+    
+    A blob's SHA is a hash of its content, so a file that is unchanged between
+    branches, tags or rebuilds maps to the same entries and is neither re-read
+    nor re-embedded. Chunks are keyed by (blob, splitter) and embeddings by
+    (blob, splitter, model, chunk number), so any subset of a blob's chunks
+    can be served; both live in one SQLite file that several processes may
+    share.
+    """
+    
+    def __init__(self, path: Path):
+        """Open (or create) a blob cache.
+        
+        Args:
+            path: SQLite file holding the cache
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "blob_sha TEXT, splitter TEXT, chunks TEXT NOT NULL, "
+                "PRIMARY KEY (blob_sha, splitter))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+                "blob_sha TEXT, splitter TEXT, model TEXT, chunk INTEGER, vector BLOB NOT NULL, "
+                "PRIMARY KEY (blob_sha, splitter, model, chunk))"
+            )
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection, waiting on writers from other processes."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(str(self.path), timeout=60)
+        return connection
+    
+    def get_chunks(self, blob_sha: str, splitter: str) -> Optional[List[Dict[str, Any]]]:
+        """Get a blob's cached chunks as page_content/metadata dicts, or None."""
+        row = self._connect().execute(
+            "SELECT chunks FROM chunks WHERE blob_sha = ? AND splitter = ?", (blob_sha, splitter)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def put_chunks(self, blob_sha: str, splitter: str, chunks: List[Dict[str, Any]]):
+        """Cache a blob's chunks."""
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)", (blob_sha, splitter, json.dumps(chunks))
+            )
+    
+    def embed(self, chunks: List[Document], splitter: str, model: str,
+              embed_np: Callable[[List[str]], np.ndarray]) -> Tuple[np.ndarray, int]:
+        """Get embeddings for chunks, computing only those not cached.
+        
+        Args:
+            chunks: Chunks from GitBlobLoader, carrying blob_sha and blob_chunk
+                metadata; any subset of a blob's chunks may be passed
+            splitter: Splitter key the chunks were produced with
+            model: Key of the embedding model, including anything that changes
+                its vectors, e.g. the backend
+            embed_np: Embeds texts as a float32 matrix, e.g. an adapter's
+                embed_documents_np
+        
+        Returns:
+            float32 matrix aligned with chunks, and how many chunks were cached
+        """
+        by_blob: Dict[str, List[int]] = {}
+        for i, chunk in enumerate(chunks):
+            by_blob.setdefault(chunk.metadata["blob_sha"], []).append(i)
+        
+        connection = self._connect()
+        vectors: List[Optional[np.ndarray]] = [None] * len(chunks)
+        for blob_sha, positions in by_blob.items():
+            cached = dict(connection.execute(
+                "SELECT chunk, vector FROM chunk_embeddings WHERE blob_sha = ? AND splitter = ? AND model = ?",
+                (blob_sha, splitter, model)
+            ).fetchall())
+            for i in positions:
+                vector = cached.get(chunks[i].metadata["blob_chunk"])
+                if vector is not None:
+                    vectors[i] = np.frombuffer(vector, dtype=np.float32)
+        
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = np.ascontiguousarray(embed_np([chunks[i].page_content for i in missing]), dtype=np.float32)
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO chunk_embeddings VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (chunks[i].metadata["blob_sha"], splitter, model,
+                         chunks[i].metadata["blob_chunk"], vector.tobytes())
+                        for i, vector in zip(missing, computed)
+                    ]
+                )
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        
+        if not chunks:
+            return np.empty((0, 0), dtype=np.float32), 0
+        return np.vstack(vectors), len(chunks) - len(missing)
+    
+    def stats(self) -> Dict[str, int]:
+        """Get the number of cached chunk lists and embedding matrices."""
+        connection = self._connect()
+        return {
+            "chunked_blobs": connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0],
+            "embedded_blobs": connection.execute(
+                "SELECT COUNT(DISTINCT blob_sha) FROM chunk_embeddings"
+            ).fetchone()[0]
+        }
+
+class GitBlobLoader:
+    """Loads and splits a revision's files straight from the git object database.
+    
+    The revision's tree is walked without checking it out. Blobs whose chunks
+    are cached are not read at all; the others are streamed from the object
+    database, split, and cached under their SHA.
+    """
+    
+    def __init__(self, repo_path: Path, splitter, splitter_key: str,
+                 cache: BlobCache, matcher=None, suffixes: Tuple[str, ...] = ('.cpp', '.h')):
+        """Initialize the loader.
+        
+        Args:
+            repo_path: Path of the git repository
+            splitter: Splitter with split_documents, e.g. CppCodeSplitter
+            splitter_key: Identifies the splitter and its settings in the cache
+            cache: Cache for the chunks
+            matcher: PathMatcher selecting files; trees it prunes are not read
+            suffixes: File suffixes to load when there is no matcher
+        """
+        self.repo = Repo(repo_path)
+        self.splitter = splitter
+        self.splitter_key = splitter_key
+        self.cache = cache
+        self.matcher = matcher
+        self.suffixes = suffixes
+        self.blobs_read = 0
+        self.blobs_cached = 0
+        # GitPython's object database readers are not thread-safe
+        self._lock = threading.Lock()
+    
+    def _prune(self, item, depth: int) -> bool:
+        """Skip trees the matcher rules out, without reading their entries."""
+        return self.matcher is not None and item.type == "tree" and self.matcher.prunes(item.path)
+    
+    def _selects(self, path: str) -> bool:
+        if self.matcher is not None:
+            return self.matcher.matches(path)
+        return path.endswith(self.suffixes)
+    
+    def iter_blobs(self, rev: str) -> Iterator[Blob]:
+        """Walk the blobs of a revision's tree that the matcher selects."""
+        for item in self.repo.commit(rev).tree.traverse(prune=self._prune):
+            if isinstance(item, Blob) and self._selects(item.path):
+                yield item
+    
+    def _split_blob(self, blob: Blob) -> Optional[List[Dict[str, Any]]]:
+        """Read and split a blob, or None if it is not UTF-8 text."""
+        try:
+            text = blob.data_stream.read().decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+        self.blobs_read += 1
+        return [
+            {"page_content": chunk.page_content, "metadata": chunk.metadata}
+            for chunk in self.splitter.split_documents([Document(page_content=text)])
+        ]
+    
+    def lazy_load(self, rev: str) -> Iterator[Document]:
+        """Yield the chunks of a revision, file by file.
+        
+        Each chunk's metadata has the splitter's fields plus source, file_path,
+        file_name, file_type, blob_sha and blob_chunk, the chunk's number
+        within its blob.
+        """
+        for blob in self.iter_blobs(rev):
+            chunks = self.cache.get_chunks(blob.hexsha, self.splitter_key)
+            if chunks is None:
+                chunks = self._split_blob(blob)
+                if chunks is None:
+                    continue
+                self.cache.put_chunks(blob.hexsha, self.splitter_key, chunks)
+            else:
+                self.blobs_cached += 1
+            file_metadata = {
+                "source": blob.path,
+                "file_path": blob.path,
+                "file_name": blob.name,
+                "file_type": os.path.splitext(blob.name)[1],
+                "blob_sha": blob.hexsha
+            }
+            for number, chunk in enumerate(chunks):
+                yield Document(
+                    page_content=chunk["page_content"],
+                    metadata={**chunk["metadata"], **file_metadata, "blob_chunk": number}
+                )
+    
+    def load(self, rev: str) -> List[Document]:
+        """Load the chunks of a revision."""
+        with self._lock:
+            return list(self.lazy_load(rev))
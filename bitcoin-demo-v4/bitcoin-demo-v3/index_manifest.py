@@ -0,0 +1,148 @@
+from typing import List, Dict, Any, Optional, Callable
+from dataclasses import dataclass, asdict
+from contextlib import contextmanager
+from pathlib import Path
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+# Version 2 builds keep documents in docstore.sqlite instead of index.pkl
+MANIFEST_VERSION = 2
+
+@dataclass(frozen=True)
+class IndexKey:
+    """Everything that determines an index's contents."""
+    subsystem: Optional[str]  # None indexes the whole repository
+    model: str
+    chunk_size: int
+    chunk_overlap: int
+    commit: str
+    files: str = ""  # digest of the include/exclude file patterns
+    
+    def digest(self) -> str:
+        """Short stable hash of the key."""
+        return hashlib.sha256(json.dumps(asdict(self), sort_keys=True).encode()).hexdigest()[:12]
+    
+    def slug(self) -> str:
+        """Readable directory name prefix for builds of this key."""
+        return f"{self.subsystem or 'all'}-{self.model}-{self.commit[:10]}-{self.digest()}"
+
+class IndexManifest:
+    """Directory of saved indexes, looked up by IndexKey through a manifest.
+    
+    Each build is saved into its own new directory under builds/ and only then
+    recorded in manifest.json, which is replaced atomically under a file lock.
+    Readers therefore only ever see complete builds, and worker processes can
+    publish concurrently. A rebuilt key keeps its previous build on disk until
+    the next rebuild, so readers that resolved the old path can finish loading.
+    """
+    
+    def __init__(self, root: Path):
+        """Open (or create) an index directory.
+        
+        Args:
+            root: Directory holding manifest.json and builds/
+        """
+        self.root = Path(root)
+        self.builds_dir = self.root / "builds"
+        self.manifest_path = self.root / "manifest.json"
+        self.builds_dir.mkdir(parents=True, exist_ok=True)
+        self._cache: Optional[Dict[str, Any]] = None
+        self._cache_mtime: Optional[int] = None
+    
+    @contextmanager
+    def _locked(self):
+        """Hold the manifest lock across processes."""
+        with open(self.root / "manifest.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _read(self) -> Dict[str, Any]:
+        """Read the manifest, reparsing it only when the file changed."""
+        try:
+            mtime = self.manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {"version": MANIFEST_VERSION, "indexes": {}}
+        if self._cache is None or mtime != self._cache_mtime:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+            # Builds in an older format are rebuilt rather than loaded
+            if manifest.get("version") != MANIFEST_VERSION:
+                manifest = {"version": MANIFEST_VERSION, "indexes": {}}
+            self._cache = manifest
+            self._cache_mtime = mtime
+        return self._cache
+    
+    def _write(self, manifest: Dict[str, Any]):
+        """Replace the manifest atomically; call with the lock held."""
+        tmp_path = self.manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+    
+    def entry(self, key: IndexKey) -> Optional[Dict[str, Any]]:
+        """Get the manifest entry of a key's current build, or None if never built."""
+        return self._read()["indexes"].get(key.digest())
+    
+    def lookup(self, key: IndexKey) -> Optional[Path]:
+        """Get the directory of the current build of a key, or None if never built."""
+        entry = self.entry(key)
+        if entry is None:
+            return None
+        path = self.root / entry["path"]
+        return path if path.exists() else None
+    
+    def publish(self, key: IndexKey, save: Callable[[str], None],
+                metadata: Optional[Dict[str, Any]] = None) -> Path:
+        """Save a new build of a key and make it the one lookup returns.
+        
+        Args:
+            key: Key of the index
+            save: Writes the index into the directory it is given, e.g. a
+                vector store's save_local
+            metadata: Extra details to record, e.g. document counts
+        
+        Returns:
+            Directory of the published build
+        """
+        build_dir = self.builds_dir / f"{key.slug()}-{uuid.uuid4().hex[:8]}"
+        staging_dir = self.builds_dir / f".staging-{build_dir.name}"
+        try:
+            save(str(staging_dir))
+            os.replace(staging_dir, build_dir)
+        except BaseException:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        
+        with self._locked():
+            self._cache = None
+            manifest = self._read()
+            digest = key.digest()
+            previous = manifest["indexes"].get(digest)
+            manifest["indexes"][digest] = {
+                "key": asdict(key),
+                "path": str(build_dir.relative_to(self.root)),
+                "previous_path": previous["path"] if previous else None,
+                "created": time.time(),
+                "metadata": metadata or {}
+            }
+            self._write(manifest)
+        
+        # The build superseded two generations ago is no longer referenced
+        if previous and previous.get("previous_path"):
+            shutil.rmtree(self.root / previous["previous_path"], ignore_errors=True)
+        return build_dir
+    
+    def entries(self) -> List[Dict[str, Any]]:
+        """List the current build of every key, newest first."""
+        entries = list(self._read()["indexes"].values())
+        return sorted(entries, key=lambda entry: entry["created"], reverse=True)
@@ -4,11 +4,20 @@ import json
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Tuple
 from kno_cache import KnoCacheManager, KnoCacheEntry
+from hybrid_search import BM25Index, HybridRetriever
+from context_packer import ContextPacker, PackedRetriever, answer_packed, faiss_scored_search, unscored_search
+from cpp_splitter import CppCodeSplitter
+from path_matcher import cached_matcher
+from vector_index import (
+    IndexConfig, AUTO_INDEX, build_index, auto_tune_index, set_nprobe, apply_search_params,
+    compare_index_types, faiss_index_bytes, save_index_config, load_index_config
+)
 from transformers import AutoTokenizer, AutoModel
 import torch
 import numpy as np
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.chains import RetrievalQA
 from langchain_anthropic import ChatAnthropic
 import time
@@ -21,9 +30,16 @@ from dataclasses import dataclass
 import git
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 import threading
 import gc
-import fnmatch
+from collections import OrderedDict
+import uuid
+
+# Embedding utilities shared with the v3 embedding_switcher package
+sys.path.append(str(Path(__file__).resolve().parent / "bitcoin-demo-v3"))
+from embedding_switcher.query_cache import CachedQueryEmbeddings
+from embedding_switcher.service import ServiceEmbeddingAdapter, SOCKET_ENV
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -33,16 +49,54 @@ _model_cache = {}
 _model_lock = threading.Lock()
 
 def get_embedding_model():
-    """Get or create embedding model with caching."""
+    """Get or create embedding model with caching.
+    
+    Query embeddings are cached too, so a question asked of every subsystem
+    is embedded once rather than once per retriever. When EMBEDDING_SERVICE_SOCKET
+    is set, CodeBERT (mean pooled, as HuggingFaceEmbeddings does) is served by
+    the shared embedding service and only loaded here if it is unreachable.
+    """
     global _model_cache
     with _model_lock:
         if 'embedding_model' not in _model_cache:
-            _model_cache['embedding_model'] = HuggingFaceEmbeddings(
+            load_local = partial(
+                HuggingFaceEmbeddings,
                 model_name="microsoft/codebert-base",
                 model_kwargs={"device": "cuda" if torch.cuda.is_available() else "cpu"}
             )
+            service_socket = os.getenv(SOCKET_ENV)
+            if service_socket:
+                embeddings = ServiceEmbeddingAdapter("codebert-mean", service_socket, fallback=load_local)
+                # Cached by the wrapper below instead
+                embeddings.query_cache = None
+            else:
+                embeddings = load_local()
+            _model_cache['embedding_model'] = CachedQueryEmbeddings(
+                embeddings,
+                model_name="microsoft/codebert-base"
+            )
         return _model_cache['embedding_model']
 
+def _documents_bytes(documents) -> int:
+    """Return the in-memory size of document text and metadata."""
+    total = 0
+    for doc in documents:
+        total += sys.getsizeof(doc.page_content)
+        total += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in doc.metadata.items())
+    return total
+
+def _vectorstore_bytes(vectorstore: FAISS) -> int:
+    """Return the memory held by a FAISS vectorstore: index, docstore and id map.
+    
+    Documents are read through the public docstore API, one per vector id.
+    """
+    documents = (vectorstore.docstore.search(doc_id) for doc_id in vectorstore.index_to_docstore_id.values())
+    return (
+        faiss_index_bytes(vectorstore.index)
+        + _documents_bytes(doc for doc in documents if isinstance(doc, Document))
+        + sys.getsizeof(vectorstore.index_to_docstore_id)
+    )
+
 @dataclass
 class KnoCacheEntry:
     """A cache entry for storing knowledge about a file."""
@@ -54,20 +108,51 @@ class KnoCacheEntry:
 class BitcoinRAG:
     """Bitcoin RAG system with .kno cache support and optimized performance."""
     
-    def __init__(self, repo_path: str, cache_dir: str = ".kno_cache", max_workers: int = 4):
+    def __init__(
+        self,
+        repo_path: str,
+        cache_dir: str = ".kno_cache",
+        max_workers: int = 4,
+        memory_budget_bytes: Optional[int] = None,
+        index_configs: Optional[Dict[str, IndexConfig]] = None,
+        hybrid_search: bool = True,
+        context_token_budget: int = 1000,
+        score_threshold: Optional[float] = None
+    ):
         """Initialize the Bitcoin RAG system.
         
         Args:
             repo_path: Path to the Bitcoin repository
             cache_dir: Root directory for the cache
             max_workers: Maximum number of worker threads
+            memory_budget_bytes: Optional cap on the in-memory chunk and index caches.
+                When exceeded, the least recently used subsystem indexes are evicted
+                and reloaded from disk on their next query.
+            index_configs: Optional FAISS index configuration per subsystem. Subsystems
+                without an entry choose and tune an index automatically by corpus size.
+            hybrid_search: Fuse dense results with a BM25 identifier index using
+                reciprocal rank fusion, so questions naming C++ symbols find them.
+            context_token_budget: Maximum tokens of code context per question.
+                Overlapping chunks of a file are merged and duplicates dropped
+                before the budget is filled by score.
+            score_threshold: Minimum relevance, 1 / (1 + distance), of chunks
+                sent to the LLM; None sends every retrieved chunk. Embeddings are
+                not normalized, so distances are large; calibrate before setting.
+                The best chunk is sent even when none passes.
         """
         self.repo_path = repo_path
         self.cache_dir = Path(cache_dir)
         self.max_workers = max_workers
+        self.memory_budget_bytes = memory_budget_bytes
+        self.index_configs = index_configs or {}
+        self._tuned_index_configs = {}
+        self.hybrid_search = hybrid_search
+        self.context_packer = ContextPacker(token_budget=context_token_budget, score_threshold=score_threshold)
         self.llm = None
         self.retrievers = {}
         self.qa_chains = {}
+        self._pooled_qa_chain = None
+        self._qa_prompt = None
         
         # Create cache directory if it doesn't exist
         os.makedirs(cache_dir, exist_ok=True)
@@ -84,11 +169,8 @@ class BitcoinRAG:
         self.cache_manager = KnoCacheManager(cache_dir)
         self.embedding_model = get_embedding_model()  # Use cached model
         
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-        )
+        # Split at namespace/class/function boundaries without overlap
+        self.text_splitter = CppCodeSplitter(chunk_size=1000)
         
         # Define subsystem keywords
         self.subsystem_keywords = {
@@ -99,9 +181,127 @@ class BitcoinRAG:
             'consensus': ['consensus', 'rules', 'protocol', 'fork', 'chain']
         }
         
-        self._chunk_cache = {}
-        self._chunk_cache_lock = threading.Lock()
+        # LRU-ordered cache: least recently used entries come first
+        self._chunk_cache = OrderedDict()
+        self._chunk_cache_sizes = {}
+        self._chunk_cache_lock = threading.RLock()
         
+        # Retriever settings of subsystems evicted from memory, for reloading
+        self._evicted_subsystems = {}
+        
+    def _index_dir(self, subsystem: str) -> Path:
+        """Get the on-disk location of a subsystem's FAISS index."""
+        return self.cache_dir / "indexes" / subsystem
+    
+    def _entry_size(self, value: Any) -> int:
+        """Measure the memory held by a chunk cache entry."""
+        if isinstance(value, list):
+            return _documents_bytes(value) + sys.getsizeof(value)
+        size = _vectorstore_bytes(value['vectorstore'])
+        if value.get('lexical_index') is not None:
+            size += value['lexical_index'].memory_bytes()
+        return size
+    
+    def _cache_get(self, key: str) -> Any:
+        """Get a chunk cache entry and mark it as recently used."""
+        with self._chunk_cache_lock:
+            if key not in self._chunk_cache:
+                return None
+            self._chunk_cache.move_to_end(key)
+            return self._chunk_cache[key]
+    
+    def _cache_put(self, key: str, value: Any):
+        """Store a chunk cache entry and evict cold entries if over budget."""
+        size = self._entry_size(value)
+        with self._chunk_cache_lock:
+            self._chunk_cache[key] = value
+            self._chunk_cache.move_to_end(key)
+            self._chunk_cache_sizes[key] = size
+            self._enforce_memory_budget(keep=key)
+    
+    def _cache_bytes(self) -> int:
+        """Total bytes accounted to the chunk cache."""
+        return sum(self._chunk_cache_sizes.values())
+    
+    def _enforce_memory_budget(self, keep: Optional[str] = None):
+        """Evict least recently used entries until the cache fits the budget.
+        
+        Args:
+            keep: Key that must stay resident, e.g. the entry just inserted
+        """
+        if self.memory_budget_bytes is None:
+            return
+        
+        with self._chunk_cache_lock:
+            for key in list(self._chunk_cache.keys()):
+                if self._cache_bytes() <= self.memory_budget_bytes:
+                    break
+                if key == keep:
+                    continue
+                self._evict(key)
+    
+    def _evict(self, key: str):
+        """Drop a chunk cache entry from memory.
+        
+        Chunk lists are reloaded from chunks.json and subsystem indexes from
+        their saved FAISS index when next needed.
+        """
+        with self._chunk_cache_lock:
+            self._chunk_cache.pop(key, None)
+            size = self._chunk_cache_sizes.pop(key, 0)
+            
+            if key.startswith('embeddings_'):
+                subsystem = key[len('embeddings_'):]
+                retriever = self.retrievers.pop(subsystem, None)
+                self.qa_chains.pop(subsystem, None)
+                self._evicted_subsystems[subsystem] = {
+                    "search_type": getattr(retriever, "search_type", "similarity"),
+                    "search_kwargs": getattr(retriever, "search_kwargs", {"k": 4})
+                }
+        
+        logger.info(f"Evicted {key} from memory ({size} bytes)")
+        gc.collect()
+    
+    def _reload_subsystem(self, subsystem: str):
+        """Reload an evicted subsystem index from disk and rebuild its QA chain."""
+        with self._chunk_cache_lock:
+            settings = self._evicted_subsystems.pop(subsystem)
+            
+            start_time = time.time()
+            vectorstore = FAISS.load_local(
+                str(self._index_dir(subsystem)),
+                self.embedding_model,
+                allow_dangerous_deserialization=True  # Only for local files we created
+            )
+            config = load_index_config(str(self._index_dir(subsystem)))
+            if config is not None:
+                apply_search_params(vectorstore.index, config)
+            retriever = vectorstore.as_retriever(**settings)
+            documents = [
+                vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+                for i in range(len(vectorstore.index_to_docstore_id))
+            ]
+            
+            self._cache_put(f"embeddings_{subsystem}", {
+                'vectorstore': vectorstore,
+                'retriever': retriever,
+                'lexical_index': self._build_lexical_index(documents)
+            })
+            self.retrievers[subsystem] = retriever
+            if self.llm:
+                self.qa_chains[subsystem] = self._build_qa_chain(subsystem, retriever)
+        
+        logger.info(f"Reloaded {subsystem} index from disk in {time.time() - start_time:.2f}s")
+    
+    def _get_qa_chain(self, subsystem: str) -> RetrievalQA:
+        """Get the QA chain for a subsystem, reloading its index if evicted."""
+        with self._chunk_cache_lock:
+            if subsystem in self._evicted_subsystems:
+                self._reload_subsystem(subsystem)
+            else:
+                self._cache_get(f"embeddings_{subsystem}")
+            return self.qa_chains[subsystem]
+
     def _process_file_chunk(self, file_path: str) -> List[Any]:
         """Process a single file and return its chunks."""
         try:
@@ -115,7 +315,7 @@ class BitcoinRAG:
 
     def matches_any_pattern(self, path: str, patterns: List[str]) -> bool:
         """Check if a path matches any of the given glob patterns."""
-        return any(fnmatch.fnmatch(path, pattern) for pattern in patterns)
+        return cached_matcher(tuple(patterns)).matches(path)
 
     def load_repository(
         self, 
@@ -125,10 +325,16 @@ class BitcoinRAG:
     ):
         """Load and process the Bitcoin repository with parallel processing and file filtering.
         
+        Patterns are matched with fnmatch against the path relative to the
+        repository root, so `*` also matches `/`; patterns containing `**`
+        follow .gitignore rules instead. An exclude pattern matching a
+        directory drops everything below it. Excluded directories, and
+        directories no include pattern can match below, are not walked.
+        
         Args:
             repo_path: Path to the repository
             include_patterns: List of glob patterns for files to include (e.g. ["*.cpp", "*.h"])
-            exclude_patterns: List of glob patterns for files to exclude (e.g. ["*/test/*"])
+            exclude_patterns: List of glob patterns for files or directories to exclude (e.g. ["src/test", "src/qt"])
         """
         if not os.path.exists(repo_path):
             raise ValueError(f"Repository not found at {repo_path}")
@@ -141,24 +347,9 @@ class BitcoinRAG:
         
         logger.info(f"Loading repository with include patterns: {include_patterns}, exclude patterns: {exclude_patterns}")
         
-        # Get all relevant files
-        cpp_files = []
-        for root, _, files in os.walk(repo_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, repo_path)
-                
-                # Check if file matches include patterns
-                if not self.matches_any_pattern(rel_path, include_patterns):
-                    continue
-                
-                # Check if file matches exclude patterns
-                if self.matches_any_pattern(rel_path, exclude_patterns):
-                    logger.debug(f"Excluding file: {rel_path}")
-                    continue
-                
-                cpp_files.append(file_path)
-                logger.debug(f"Including file: {rel_path}")
+        # Get all relevant files, skipping subtrees that cannot match
+        matcher = cached_matcher(tuple(include_patterns), tuple(exclude_patterns))
+        cpp_files = list(matcher.walk(repo_path))
         
         logger.info(f"Found {len(cpp_files)} files matching patterns")
         
@@ -178,8 +369,7 @@ class BitcoinRAG:
                     logger.error(f"Error processing {file}: {e}")
         
         # Cache the chunks
-        with self._chunk_cache_lock:
-            self._chunk_cache['all_chunks'] = chunks
+        self._cache_put('all_chunks', chunks)
         
         # Save chunks to disk
         chunk_path = self.cache_dir / "chunks.json"
@@ -191,20 +381,10 @@ class BitcoinRAG:
         
         return chunks
 
-    def create_embeddings(self, subsystem: str):
-        """Create embeddings for a specific subsystem with optimized memory usage."""
-        logger.info(f"Processing subsystem: {subsystem}")
-        
-        # Try to load from cache first
-        cache_key = f"embeddings_{subsystem}"
-        if cache_key in self._chunk_cache:
-            return
-        
+    def _get_subsystem_chunks(self, subsystem: str) -> List[Document]:
+        """Get the cached chunks that belong to a subsystem."""
         # Load or get cached chunks
-        chunks = None
-        with self._chunk_cache_lock:
-            if 'all_chunks' in self._chunk_cache:
-                chunks = self._chunk_cache['all_chunks']
+        chunks = self._cache_get('all_chunks')
         
         if not chunks:
             try:
@@ -218,6 +398,7 @@ class BitcoinRAG:
                         )
                         for chunk in chunks_data
                     ]
+                self._cache_put('all_chunks', chunks)
             except FileNotFoundError:
                 chunks = self.load_repository("bitcoin")
         
@@ -231,31 +412,146 @@ class BitcoinRAG:
         if not subsystem_chunks:
             raise ValueError(f"No chunks found for subsystem {subsystem}")
         
-        # Create vectorstore
-        vectorstore = FAISS.from_documents(
-            documents=subsystem_chunks,
-            embedding=self.embedding_model
+        return subsystem_chunks
+
+    def _embed_chunks(self, chunks: List[Document]) -> np.ndarray:
+        """Embed chunk text into a contiguous float32 matrix.
+        
+        Embedders exposing embed_documents_np (the embedding_switcher adapters)
+        return the matrix directly instead of nested float lists.
+        """
+        texts = [chunk.page_content for chunk in chunks]
+        if hasattr(self.embedding_model, "embed_documents_np"):
+            return self.embedding_model.embed_documents_np(texts, dtype=np.float32)
+        return np.ascontiguousarray(self.embedding_model.embed_documents(texts), dtype=np.float32)
+
+    def _build_vectorstore(
+        self,
+        chunks: List[Document],
+        config: IndexConfig
+    ) -> Tuple[FAISS, IndexConfig, Dict[str, Any]]:
+        """Build a FAISS vectorstore over chunks with the configured index type.
+        
+        Returns:
+            Tuple of (vectorstore, resolved index configuration, tuning report)
+        """
+        vectors = self._embed_chunks(chunks)
+        report = {}
+        if config.index_type == AUTO_INDEX:
+            index, config, report = auto_tune_index(vectors, config)
+        else:
+            index = build_index(vectors, config)
+        
+        ids = [str(uuid.uuid4()) for _ in chunks]
+        vectorstore = FAISS(
+            embedding_function=self.embedding_model,
+            index=index,
+            docstore=InMemoryDocstore(dict(zip(ids, chunks))),
+            index_to_docstore_id=dict(enumerate(ids))
         )
+        return vectorstore, config, report
+
+    def create_embeddings(self, subsystem: str, index_config: Optional[IndexConfig] = None):
+        """Create embeddings for a specific subsystem with optimized memory usage.
+        
+        Args:
+            subsystem: Subsystem to index
+            index_config: FAISS index configuration, overriding index_configs.
+                The resolved configuration is saved next to the index.
+        """
+        logger.info(f"Processing subsystem: {subsystem}")
+        
+        # Try to load from cache first
+        cache_key = f"embeddings_{subsystem}"
+        if self._cache_get(cache_key) is not None:
+            return
+        if subsystem in self._evicted_subsystems:
+            self._reload_subsystem(subsystem)
+            return
+        
+        subsystem_chunks = self._get_subsystem_chunks(subsystem)
+        config = (
+            index_config
+            or self.index_configs.get(subsystem)
+            or IndexConfig(index_type=AUTO_INDEX)
+        )
+        
+        # Create vectorstore
+        vectorstore, config, report = self._build_vectorstore(subsystem_chunks, config)
+        self._tuned_index_configs[subsystem] = config
+        logger.info(f"Built {config.index_type} index for {subsystem} with {vectorstore.index.ntotal} vectors")
         
         retriever = vectorstore.as_retriever(
             search_type="similarity",
             search_kwargs={"k": 4}
         )
         
-        # Cache results
-        with self._chunk_cache_lock:
-            self._chunk_cache[cache_key] = {
-                'vectorstore': vectorstore,
-                'retriever': retriever
-            }
+        # Persist the index and its tuned configuration so it can be reloaded after eviction
+        vectorstore.save_local(str(self._index_dir(subsystem)))
+        save_index_config(str(self._index_dir(subsystem)), config, report)
         
+        # Cache results
         self.retrievers[subsystem] = retriever
+        self._cache_put(cache_key, {
+            'vectorstore': vectorstore,
+            'retriever': retriever,
+            'lexical_index': self._build_lexical_index(subsystem_chunks)
+        })
         
         # Clean up memory
         gc.collect()
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
 
+    def set_nprobe(self, subsystem: str, nprobe: int):
+        """Set how many IVF cells a subsystem index probes per query.
+        
+        Args:
+            subsystem: Subsystem whose index to tune
+            nprobe: Number of cells to probe, trading latency for recall
+        """
+        entry = self._cache_get(f"embeddings_{subsystem}")
+        if entry is None:
+            raise ValueError(f"Subsystem {subsystem} is not loaded")
+        if not set_nprobe(entry['vectorstore'].index, nprobe):
+            raise ValueError(f"Subsystem {subsystem} does not use an IVF index")
+
+    def benchmark_index_types(
+        self,
+        subsystem: str,
+        questions: Optional[List[str]] = None,
+        k: int = 4,
+        configs: Optional[List[IndexConfig]] = None,
+        nprobe_values: Tuple[int, ...] = (1, 4, 8, 16, 32),
+        num_sample_queries: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Compare recall@k, latency and memory of index types for a subsystem.
+        
+        The subsystem chunks are re-embedded, so this is meant as an offline
+        sizing tool rather than something to run per query.
+        
+        Args:
+            subsystem: Subsystem whose chunks to index
+            questions: Queries to evaluate; defaults to a sample of the chunks themselves
+            k: Number of neighbours to compare against exact search
+            configs: Index configurations to evaluate, defaults to every index type
+            nprobe_values: nprobe settings to sweep for IVF indexes
+            num_sample_queries: Number of chunks to sample when no questions are given
+        
+        Returns:
+            Report rows as produced by vector_index.compare_index_types
+        """
+        vectors = self._embed_chunks(self._get_subsystem_chunks(subsystem))
+        
+        if questions:
+            queries = np.asarray(self.embedding_model.embed_documents(questions), dtype=np.float32)
+        else:
+            rng = np.random.default_rng(0)
+            rows = rng.choice(len(vectors), size=min(num_sample_queries, len(vectors)), replace=False)
+            queries = vectors[rows]
+        
+        return compare_index_types(vectors, queries, k=k, configs=configs, nprobe_values=nprobe_values)
+
     def setup_qa_chain(self, anthropic_api_key: str):
         """Set up the QA chain with Claude model."""
         if not anthropic_api_key:
@@ -272,7 +568,41 @@ class BitcoinRAG:
         # Create QA chains for each subsystem
         for subsystem, retriever in self.retrievers.items():
             if subsystem not in self.qa_chains:
-                prompt_template = """You are an expert Bitcoin Core developer analyzing the codebase. Use the following code context to answer the question. If you cannot answer the question based on the context, say so.
+                self.qa_chains[subsystem] = self._build_qa_chain(subsystem, retriever)
+    
+    def _build_lexical_index(self, documents: List[Document]) -> Optional[BM25Index]:
+        """Build the BM25 identifier index for a subsystem, if hybrid search is on."""
+        if not self.hybrid_search:
+            return None
+        lexical_index = BM25Index()
+        lexical_index.add_documents(documents)
+        return lexical_index
+    
+    def _build_qa_chain(self, subsystem: str, retriever) -> RetrievalQA:
+        """Build a QA chain over a retriever using the shared prompt.
+        
+        With hybrid search on, the dense retriever is fused with the subsystem's
+        BM25 identifier index. Retrieved chunks are packed into the context
+        budget by context_packer.
+        """
+        entry = self._cache_get(f"embeddings_{subsystem}")
+        if entry is not None and entry.get('lexical_index') is not None:
+            search = HybridRetriever(
+                dense_retriever=retriever,
+                lexical_index=entry['lexical_index'],
+                k=retriever.search_kwargs.get("k", 4)
+            ).scored_search
+        elif getattr(retriever, "search_type", None) == "similarity":
+            search = faiss_scored_search(retriever.vectorstore, retriever.search_kwargs.get("k", 4))
+        else:
+            search = unscored_search(retriever)
+        
+        return self._packed_qa_chain([search])
+    
+    def _packed_qa_chain(self, searches: List[Any]) -> RetrievalQA:
+        """Build a QA chain over packed context pooled from scored searches."""
+        if self._qa_prompt is None:
+            prompt_template = """You are an expert Bitcoin Core developer analyzing the codebase. Use the following code context to answer the question. If you cannot answer the question based on the context, say so.
 
                 Context:
                 {context}
@@ -280,21 +610,40 @@ class BitcoinRAG:
                 Question: {question}
 
                 Answer: Let me analyze the code and provide a detailed response."""
-                
-                PROMPT = PromptTemplate(
-                    template=prompt_template,
-                    input_variables=["context", "question"]
-                )
-                
-                self.qa_chains[subsystem] = RetrievalQA.from_chain_type(
-                    llm=self.llm,
-                    chain_type="stuff",
-                    retriever=retriever,
-                    chain_type_kwargs={
-                        "prompt": PROMPT,
-                    },
-                    return_source_documents=True
-                )
+            
+            self._qa_prompt = PromptTemplate(
+                template=prompt_template,
+                input_variables=["context", "question"]
+            )
+        
+        return RetrievalQA.from_chain_type(
+            llm=self.llm,
+            chain_type="stuff",
+            retriever=PackedRetriever(searches=searches, packer=self.context_packer),
+            chain_type_kwargs={
+                "prompt": self._qa_prompt,
+            },
+            return_source_documents=True
+        )
+    
+    def _available_subsystems(self) -> List[str]:
+        """Subsystems with a QA chain, loaded or evicted."""
+        return list(self.qa_chains.keys()) + [
+            s for s in self._evicted_subsystems if s not in self.qa_chains
+        ]
+    
+    def _pooled_search(self, query: str) -> List[Tuple[Document, float]]:
+        """Scored search over every subsystem, reloading evicted ones as needed."""
+        scored = []
+        for name in self._available_subsystems():
+            try:
+                searches = self._get_qa_chain(name).retriever.searches
+            except Exception as e:
+                logger.error(f"Error loading subsystem {name}: {e}")
+                continue
+            for search in searches:
+                scored.extend(search(query))
+        return scored
     
     def ask_question(self, question: str, subsystem: str = None) -> Dict[str, Any]:
         """Ask a question about the Bitcoin codebase.
@@ -311,79 +660,73 @@ class BitcoinRAG:
         
         start_time = time.time()
         
-        if subsystem and subsystem not in self.qa_chains:
-            raise ValueError(f"Subsystem {subsystem} not found. Available subsystems: {list(self.qa_chains.keys())}")
-        
-        # If no subsystem specified, try all of them
-        subsystems_to_try = [subsystem] if subsystem else list(self.qa_chains.keys())
-        
-        best_answer = None
-        best_confidence = 0
-        used_sources = set()
-        all_sources = []
-        
-        for sys in subsystems_to_try:
-            try:
-                result = self.qa_chains[sys]({"query": question})
-                
-                # Extract answer and source documents
-                answer = result.get("result", "")
-                sources = result.get("source_documents", [])
-                
-                # Calculate confidence based on source document relevance
-                confidence = sum(1 for doc in sources if any(keyword in doc.page_content.lower() 
-                                                          for keyword in question.lower().split()))
-                confidence /= len(sources) if sources else 1
-                
-                # Track unique sources
-                for doc in sources:
-                    source_path = doc.metadata.get("source", "")
-                    if source_path not in used_sources:
-                        used_sources.add(source_path)
-                        all_sources.append({
-                            "path": source_path,
-                            "content": doc.page_content[:200] + "..."  # Truncate for readability
-                        })
-                
-                # Update best answer if this one is better
-                if confidence > best_confidence:
-                    best_confidence = confidence
-                    best_answer = {
-                        "answer": answer,
-                        "subsystem": sys,
-                        "confidence": confidence,
-                    }
-            
-            except Exception as e:
-                logger.error(f"Error processing subsystem {sys}: {e}")
-                continue
+        available = self._available_subsystems()
+        if subsystem and subsystem not in available:
+            raise ValueError(f"Subsystem {subsystem} not found. Available subsystems: {available}")
         
-        if not best_answer:
+        # If no subsystem specified, ask once over context pooled from all of
+        # them, so chunks indexed by several subsystems are only sent once
+        try:
+            if subsystem:
+                chain = self._get_qa_chain(subsystem)
+            else:
+                if self._pooled_qa_chain is None:
+                    self._pooled_qa_chain = self._packed_qa_chain([self._pooled_search])
+                chain = self._pooled_qa_chain
+            answer, sources, context = answer_packed(chain, question)
+        except Exception as e:
+            logger.error(f"Error answering question: {e}")
             return {
                 "error": "No valid answers found",
-                "sources": all_sources
+                "sources": []
             }
         
+        # Calculate confidence based on source document relevance
+        confidence = sum(1 for doc in sources if any(keyword in doc.page_content.lower() 
+                                                  for keyword in question.lower().split()))
+        confidence /= len(sources) if sources else 1
+        
+        # Track unique sources
+        used_sources = set()
+        all_sources = []
+        for doc in sources:
+            source_path = doc.metadata.get("source", "")
+            if source_path not in used_sources:
+                used_sources.add(source_path)
+                all_sources.append({
+                    "path": source_path,
+                    "content": doc.page_content[:200] + "..."  # Truncate for readability
+                })
+        
         # Add metadata to the response
         response = {
-            **best_answer,
+            "answer": answer,
+            "subsystem": subsystem or "all",
+            "confidence": confidence,
             "sources": all_sources,
             "query_time": time.time() - start_time,
-            "total_sources": len(used_sources)
+            "total_sources": len(used_sources),
+            "context": context
         }
         
         return response
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get statistics about the cache usage."""
-        stats = {
-            "total_chunks": len(self._chunk_cache.get('all_chunks', [])),
-            "cached_subsystems": [k.replace('embeddings_', '') for k in self._chunk_cache.keys() if k.startswith('embeddings_')],
-            "memory_usage": {
-                "chunk_cache_size": sum(sys.getsizeof(v) for v in self._chunk_cache.values()),
-                "model_cache_size": sum(sys.getsizeof(v) for v in _model_cache.values())
+        with self._chunk_cache_lock:
+            stats = {
+                "total_chunks": len(self._chunk_cache.get('all_chunks', [])),
+                "cached_subsystems": [k.replace('embeddings_', '') for k in self._chunk_cache.keys() if k.startswith('embeddings_')],
+                "evicted_subsystems": list(self._evicted_subsystems.keys()),
+                "index_types": {s: c.index_type for s, c in self._tuned_index_configs.items()},
+                "query_cache": self.embedding_model.cache.stats(),
+                "memory_usage": {
+                    "chunk_cache_size": self._cache_bytes(),
+                    "chunk_cache_entries": dict(self._chunk_cache_sizes),
+                    "memory_budget": self.memory_budget_bytes,
+                    "model_cache_size": sum(sys.getsizeof(v) for v in _model_cache.values())
+                }
             }
-        }
         
         if torch.cuda.is_available():
             stats["gpu_memory"] = {
@@ -396,7 +739,10 @@ class BitcoinRAG:
     def cleanup(self):
         """Clean up resources and free memory."""
         # Clear caches
-        self._chunk_cache.clear()
+        with self._chunk_cache_lock:
+            self._chunk_cache.clear()
+            self._chunk_cache_sizes.clear()
+            self._evicted_subsystems.clear()
         with _model_lock:
             _model_cache.clear()
         
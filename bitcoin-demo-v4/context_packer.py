@@ -0,0 +1,213 @@
+import math
+from typing import Dict, List, Any, Callable, Optional, Tuple
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# (document, relevance) pairs for a query; relevance is in (0, 1], higher is closer
+ScoredSearch = Callable[[str], List[Tuple[Document, float]]]
+
+def approximate_tokens(text: str) -> int:
+    """Estimate LLM tokens as one per four characters, which suits C++ source."""
+    return math.ceil(len(text) / 4)
+
+def distance_relevance(distance: float) -> float:
+    """Map a distance to a relevance in (0, 1]: 1.0 for an exact match, falling with distance."""
+    return 1.0 / (1.0 + max(float(distance), 0.0))
+
+def faiss_scored_search(vectorstore, k: int = 10) -> ScoredSearch:
+    """Search a FAISS store, scoring hits by an absolute relevance.
+    
+    Relevance is the store's override_relevance_score_fn if it has one, else
+    1 / (1 + distance), so a score threshold means the same for every query
+    and an exact match does not push the other hits to zero.
+    """
+    relevance = getattr(vectorstore, "override_relevance_score_fn", None) or distance_relevance
+    
+    def search(query: str) -> List[Tuple[Document, float]]:
+        results = vectorstore.similarity_search_with_score(query, k=k)
+        return [(doc, float(relevance(distance))) for doc, distance in results]
+    return search
+
+def unscored_search(retriever: BaseRetriever) -> ScoredSearch:
+    """Wrap a retriever without scores, e.g. MMR, so every hit passes the threshold."""
+    def search(query: str) -> List[Tuple[Document, float]]:
+        return [(doc, 1.0) for doc in retriever.invoke(query)]
+    return search
+
+def _line_range(doc: Document) -> Optional[Tuple[int, int]]:
+    """Line range of a CppCodeSplitter chunk, or None for other chunks."""
+    start, end = doc.metadata.get("start_line"), doc.metadata.get("end_line")
+    if isinstance(start, int) and isinstance(end, int):
+        return start, end
+    return None
+
+def _text_overlap(first: str, second: str, min_overlap: int = 20) -> int:
+    """Length of the longest suffix of first that is a prefix of second."""
+    for size in range(min(len(first), len(second)), min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+class ContextPacker:
+    """Chooses the chunks stuffed into a QA prompt.
+    
+    Candidates below the score threshold are dropped, except the best one
+    when nothing passes, so a question never gets an empty context; duplicates
+    (the same chunk from several indexes) are kept once, adjacent or overlapping chunks
+    of a file are merged into one passage, and passages are taken by score
+    until the token budget or document limit is reached.
+    """
+    
+    def __init__(self, token_budget: int = 1000,
+                 score_threshold: Optional[float] = None,
+                 max_documents: Optional[int] = None,
+                 count_tokens: Callable[[str], int] = approximate_tokens,
+                 merge_gap_lines: int = 2):
+        """Initialize the packer.
+        
+        Args:
+            token_budget: Maximum context tokens; the best passage is always kept
+            score_threshold: Minimum relevance in (0, 1], None to keep all. With
+                1 / (1 + distance) over unnormalized embeddings, squared L2
+                distances are large and typical hits score well below 0.5, so
+                calibrate a threshold against real scores before setting one
+            max_documents: Maximum passages, None for no limit
+            count_tokens: Counts the tokens of a passage
+            merge_gap_lines: Chunks of a file at most this many lines apart are
+                merged; chunks are stripped, so neighbours are usually separated
+                by blank lines
+        """
+        self.token_budget = token_budget
+        self.score_threshold = score_threshold
+        self.max_documents = max_documents
+        self.count_tokens = count_tokens
+        self.merge_gap_lines = merge_gap_lines
+    
+    def _merge(self, first: Document, second: Document) -> Optional[Document]:
+        """Join two chunks of one file if they touch or overlap, else None."""
+        first_range, second_range = _line_range(first), _line_range(second)
+        if first_range and second_range:
+            gap = second_range[0] - first_range[1] - 1
+            if gap > self.merge_gap_lines:
+                return None
+            if second_range[1] <= first_range[1]:
+                return first
+            if gap >= 0:
+                # Only whitespace separates CppCodeSplitter chunks
+                content = first.page_content + "\n" * (gap + 1) + second.page_content
+            else:
+                tail = second.page_content.split("\n")[-gap:]
+                content = "\n".join([first.page_content] + tail)
+            return Document(page_content=content, metadata={**first.metadata, "end_line": second_range[1]})
+        
+        # Chunks without line ranges, e.g. from a character splitter with overlap
+        overlap = _text_overlap(first.page_content, second.page_content)
+        if overlap:
+            return Document(page_content=first.page_content + second.page_content[overlap:], metadata=first.metadata)
+        overlap = _text_overlap(second.page_content, first.page_content)
+        if overlap:
+            return Document(page_content=second.page_content + first.page_content[overlap:], metadata=first.metadata)
+        return None
+    
+    def _merge_file(self, chunks: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """Merge touching chunks of one file; a passage scores as its best chunk."""
+        chunks.sort(key=lambda item: _line_range(item[0]) or (0, 0))
+        merged = [chunks[0]]
+        for doc, score in chunks[1:]:
+            joined = self._merge(merged[-1][0], doc)
+            if joined is None:
+                merged.append((doc, score))
+            else:
+                merged[-1] = (joined, max(merged[-1][1], score))
+        return merged
+    
+    def pack(self, scored: List[Tuple[Document, float]]) -> Tuple[List[Document], Dict[str, Any]]:
+        """Pack scored candidates into context passages.
+        
+        Args:
+            scored: (document, relevance) pairs, higher relevance first to be kept
+        
+        Returns:
+            Passages best first, and counts of what was dropped, merged and kept
+        """
+        stats = {"candidates": len(scored), "below_threshold": 0, "duplicates": 0,
+                 "merged": 0, "over_budget": 0, "passages": 0, "tokens": 0}
+        
+        best: Dict[Tuple[str, str], Tuple[Document, float]] = {}
+        best_below: Optional[Tuple[Document, float]] = None
+        for doc, score in scored:
+            if self.score_threshold is not None and score < self.score_threshold:
+                stats["below_threshold"] += 1
+                if best_below is None or score > best_below[1]:
+                    best_below = (doc, score)
+                continue
+            key = (doc.metadata.get("source", ""), doc.page_content)
+            if key in best:
+                stats["duplicates"] += 1
+                if score <= best[key][1]:
+                    continue
+            best[key] = (doc, score)
+        if not best and best_below is not None:
+            # Nothing passed: fall back to the top-ranked candidate
+            stats["below_threshold"] -= 1
+            doc = best_below[0]
+            best[(doc.metadata.get("source", ""), doc.page_content)] = best_below
+        
+        by_file: Dict[str, List[Tuple[Document, float]]] = {}
+        for (source, _), item in best.items():
+            by_file.setdefault(source, []).append(item)
+        passages = []
+        for chunks in by_file.values():
+            merged = self._merge_file(chunks)
+            stats["merged"] += len(chunks) - len(merged)
+            passages.extend(merged)
+        passages.sort(key=lambda item: item[1], reverse=True)
+        
+        packed = []
+        for doc, _ in passages:
+            if self.max_documents is not None and len(packed) >= self.max_documents:
+                stats["over_budget"] += 1
+                continue
+            tokens = self.count_tokens(doc.page_content)
+            if packed and stats["tokens"] + tokens > self.token_budget:
+                stats["over_budget"] += 1
+                continue
+            packed.append(doc)
+            stats["tokens"] += tokens
+        stats["passages"] = len(packed)
+        return packed, stats
+
+class PackedRetriever(BaseRetriever):
+    """Retriever returning packed context from one or more scored searches.
+    
+    Results of all searches, e.g. one per subsystem index, are pooled before
+    packing, so a chunk found by several of them is sent once.
+    """
+    
+    searches: List[Any]
+    packer: Any
+    
+    def pack(self, query: str) -> Tuple[List[Document], Dict[str, Any]]:
+        """Retrieve and pack the context of a query, with this call's packing counts."""
+        scored = [item for search in self.searches for item in search(query)]
+        return self.packer.pack(scored)
+    
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.pack(query)[0]
+
+def answer_packed(chain, question: str) -> Tuple[str, List[Document], Dict[str, Any]]:
+    """Answer a question with a RetrievalQA chain over a PackedRetriever.
+    
+    The context is packed here and handed to the chain's combine step, so the
+    packing counts returned belong to this question even when several threads
+    share the chain.
+    
+    Returns:
+        The answer, the passages it was given and the packing counts
+    """
+    documents, stats = chain.retriever.pack(question)
+    result = chain.combine_documents_chain.invoke({"input_documents": documents, "question": question})
+    return result[chain.combine_documents_chain.output_key], documents, stats
@@ -0,0 +1,263 @@
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from langchain_core.documents import Document
+
+# Comments, string/char literals and preprocessor directives, which must not be
+# scanned for braces or semicolons
+_MASKED_RE = re.compile(r'''
+    //[^\n]*
+  | /\*.*?\*/
+  | (?:u8|[uUL])?R"(?P<delim>[^()\\\s]{0,16})\(.*?\)(?P=delim)"
+  | (?:u8|[uUL])?"(?:\\.|[^"\\\n])*"
+  | (?<![0-9A-Fa-f])'(?:\\.|[^'\\\n])*'
+  | ^[ \t]*\#(?:\\\n|[^\n])*
+''', re.S | re.M | re.X)
+
+_STRUCTURE_RE = re.compile(r"[{};]")
+_TRAILING_SEMICOLON_RE = re.compile(r"\s*;")
+_CLASS_KEYWORD_RE = re.compile(r"\b(?:class|struct|union|enum)\b")
+_NAMESPACE_RE = re.compile(r"\bnamespace\b\s*([\w:]*)")
+_FUNCTION_NAME_RE = re.compile(r"(~?[A-Za-z_]\w*(?:\s*::\s*~?[A-Za-z_]\w*)*)\s*$")
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_]\w*")
+_CLASS_SPECIFIERS = {"class", "struct", "union", "enum", "final", "alignas"}
+
+def _blank(match: re.Match) -> str:
+    """Replace masked text with spaces, keeping newlines and ending directives with ';'."""
+    text = match.group(0)
+    blanked = re.sub(r"[^\n]", " ", text)
+    if text.lstrip().startswith("#"):
+        blanked = blanked[:-1] + ";"
+    return blanked
+
+def _strip_template(header: str) -> str:
+    """Drop a leading template<...> parameter list, which may contain 'class'."""
+    match = re.match(r"\s*template\s*<", header)
+    if not match:
+        return header
+    depth = 1
+    for i in range(match.end(), len(header)):
+        if header[i] == "<":
+            depth += 1
+        elif header[i] == ">":
+            depth -= 1
+            if depth == 0:
+                return _strip_template(header[i + 1:])
+    return header
+
+def _describe(header: str) -> Tuple[str, Optional[str]]:
+    """Classify a declaration header and extract the symbol it declares.
+    
+    Args:
+        header: Code preceding an opening brace or semicolon, with comments masked
+    
+    Returns:
+        Tuple of (kind, name) where kind is namespace, class, function or other
+    """
+    header = _strip_template(header).strip()
+    
+    namespace = _NAMESPACE_RE.search(header)
+    if namespace:
+        return "namespace", namespace.group(1) or "(anonymous)"
+    if re.fullmatch(r"extern\s*", header):
+        return "namespace", None
+    
+    paren = header.find("(")
+    keyword = _CLASS_KEYWORD_RE.search(header)
+    if keyword and (paren < 0 or keyword.start() < paren):
+        # The name is the last identifier before any base-class list
+        declaration = re.split(r"(?<!:):(?!:)", header[keyword.end():])[0]
+        names = [n for n in _IDENTIFIER_RE.findall(declaration) if n not in _CLASS_SPECIFIERS]
+        return "class", names[-1] if names else None
+    
+    if paren >= 0:
+        name = _FUNCTION_NAME_RE.search(header[:paren])
+        if name:
+            return "function", re.sub(r"\s+", "", name.group(1))
+    return "other", None
+
+@dataclass
+class CodeChunk:
+    """A contiguous span of a source file produced by CppCodeSplitter."""
+    start: int
+    end: int
+    symbols: List[str] = field(default_factory=list)
+    kinds: List[str] = field(default_factory=list)
+    sealed: bool = False  # fragment of an oversized declaration, never merged
+
+@dataclass
+class _Source:
+    """A source file with its masked copy and the positions of braces and semicolons."""
+    text: str
+    masked: str
+    structure: List[Tuple[int, str]]
+    positions: List[int]
+
+@dataclass
+class _Item:
+    """A top-level declaration within a scope: a block or a ';'-terminated statement."""
+    start: int
+    end: int
+    block_open: Optional[int] = None
+
+class CppCodeSplitter:
+    """Splits C++ sources at namespace, class and function boundaries.
+    
+    A lightweight scanner masks comments, literals and preprocessor lines, then
+    tracks braces to find top-level declarations. Small declarations are packed
+    together up to chunk_size; oversized namespaces and classes are split at
+    their members, and oversized functions fall back to line-based splitting.
+    Chunks do not overlap and carry symbol and line-range metadata.
+    """
+    
+    def __init__(self, chunk_size: int = 1000):
+        """Initialize the splitter.
+        
+        Args:
+            chunk_size: Maximum chunk length in characters
+        """
+        self.chunk_size = chunk_size
+    
+    def split_code(self, text: str) -> List[CodeChunk]:
+        """Split source text into chunks covering it without overlap."""
+        masked = _MASKED_RE.sub(_blank, text)
+        structure = [(m.start(), m.group(0)) for m in _STRUCTURE_RE.finditer(masked)]
+        source = _Source(text, masked, structure, [pos for pos, _ in structure])
+        chunks = self._chunk_range(source, 0, len(text), [])
+        return [chunk for chunk in chunks if text[chunk.start:chunk.end].strip()]
+    
+    def split_text(self, text: str) -> List[str]:
+        """Split source text into chunk strings."""
+        return [text[c.start:c.end].strip() for c in self.split_code(text)]
+    
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """Split documents into chunk documents with symbol and line metadata.
+        
+        Each chunk keeps the metadata of its source document and adds
+        symbol (first declared symbol), symbols, kind, start_line and end_line.
+        """
+        chunks = []
+        for doc in documents:
+            text = doc.page_content
+            line_starts = [0] + [m.end() for m in re.finditer("\n", text)]
+            for chunk in self.split_code(text):
+                content = text[chunk.start:chunk.end]
+                start = chunk.start + len(content) - len(content.lstrip())
+                end = chunk.start + len(content.rstrip())
+                kinds = set(chunk.kinds)
+                chunks.append(Document(
+                    page_content=text[start:end],
+                    metadata={
+                        **doc.metadata,
+                        "symbol": chunk.symbols[0] if chunk.symbols else "",
+                        "symbols": ", ".join(chunk.symbols),
+                        "kind": kinds.pop() if len(kinds) == 1 else "mixed",
+                        "start_line": bisect_right(line_starts, start),
+                        "end_line": bisect_right(line_starts, end - 1)
+                    }
+                ))
+        return chunks
+    
+    def _items(self, source: _Source, lo: int, hi: int) -> Optional[List[_Item]]:
+        """Find the top-level declarations in [lo, hi), or None if braces are unbalanced."""
+        items = []
+        start = lo
+        depth = 0
+        block_open = None
+        skip_until = lo
+        
+        for i in range(bisect_left(source.positions, lo), bisect_left(source.positions, hi)):
+            pos, char = source.structure[i]
+            if pos < skip_until:
+                continue
+            if char == "{":
+                if depth == 0:
+                    block_open = pos
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth < 0:
+                    return None
+                if depth == 0:
+                    end = pos + 1
+                    semicolon = _TRAILING_SEMICOLON_RE.match(source.masked, end)
+                    if semicolon and semicolon.end() <= hi:
+                        end = skip_until = semicolon.end()
+                    items.append(_Item(start, end, block_open))
+                    start = end
+            elif depth == 0:
+                items.append(_Item(start, pos + 1))
+                start = pos + 1
+        
+        if depth != 0:
+            return None
+        if start < hi:
+            if source.masked[start:hi].strip() or not items:
+                items.append(_Item(start, hi))
+            else:
+                items[-1].end = hi
+        return items
+    
+    def _chunk_range(self, source: _Source, lo: int, hi: int, scope: List[str]) -> List[CodeChunk]:
+        """Chunk the declarations in [lo, hi) of a scope."""
+        items = self._items(source, lo, hi)
+        if items is None:
+            return self._split_lines(source.text, lo, hi, None, "other")
+        
+        pieces = []
+        for item in items:
+            header_end = item.block_open if item.block_open is not None else item.end
+            kind, name = _describe(source.masked[item.start:header_end])
+            symbol = "::".join(scope + [name]) if name else None
+            
+            if item.end - item.start <= self.chunk_size:
+                pieces.append(CodeChunk(item.start, item.end, [symbol] if symbol else [], [kind]))
+            elif item.block_open is not None and kind in ("namespace", "class"):
+                close = source.masked.rfind("}", item.start, item.end)
+                inner = self._chunk_range(
+                    source, item.block_open + 1, close, scope + [name] if name else scope
+                )
+                if not inner:
+                    inner = [CodeChunk(item.block_open + 1, close, [], [kind])]
+                inner[0].start = item.start
+                inner[-1].end = item.end
+                pieces.extend(inner)
+            else:
+                pieces.extend(self._split_lines(source.text, item.start, item.end, symbol, kind))
+        
+        return self._pack(pieces)
+    
+    def _split_lines(self, text: str, lo: int, hi: int, symbol: Optional[str], kind: str) -> List[CodeChunk]:
+        """Split an oversized span at line boundaries, hard-splitting overlong lines."""
+        tags = ([symbol] if symbol else [], [kind])
+        chunks = []
+        start = lo
+        pos = lo
+        while pos < hi:
+            newline = text.find("\n", pos, hi)
+            line_end = hi if newline < 0 else newline + 1
+            if line_end - start > self.chunk_size and pos > start:
+                chunks.append(CodeChunk(start, pos, list(tags[0]), list(tags[1]), sealed=True))
+                start = pos
+            while line_end - start > self.chunk_size:
+                chunks.append(CodeChunk(start, start + self.chunk_size, list(tags[0]), list(tags[1]), sealed=True))
+                start += self.chunk_size
+            pos = line_end
+        if start < hi:
+            chunks.append(CodeChunk(start, hi, list(tags[0]), list(tags[1]), sealed=True))
+        return chunks
+    
+    def _pack(self, pieces: List[CodeChunk]) -> List[CodeChunk]:
+        """Merge adjacent pieces while they fit within chunk_size."""
+        packed = []
+        for piece in pieces:
+            if (packed and not piece.sealed and not packed[-1].sealed
+                    and piece.end - packed[-1].start <= self.chunk_size):
+                last = packed[-1]
+                last.end = piece.end
+                last.symbols.extend(s for s in piece.symbols if s not in last.symbols)
+                last.kinds.extend(piece.kinds)
+            else:
+                packed.append(piece)
+        return packed
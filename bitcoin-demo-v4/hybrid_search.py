@@ -0,0 +1,178 @@
+import re
+import sys
+import math
+import heapq
+from collections import Counter, defaultdict
+from operator import itemgetter
+from typing import Dict, List, Any, Hashable, Iterable, Tuple
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from context_packer import faiss_scored_search
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_SUBWORD_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+# Question words that carry no signal when matching code
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "does", "do", "how", "in", "is", "it", "its", "of",
+    "on", "or", "the", "to", "what", "when", "where", "which", "why", "with"
+})
+
+def split_identifier(identifier: str) -> List[str]:
+    """Split a camelCase, PascalCase or snake_case identifier into lowercase parts.
+    
+    For example "CheckTransaction" gives ["check", "transaction"] and
+    "nMaxTxSize" gives ["n", "max", "tx", "size"].
+    """
+    parts = []
+    for piece in identifier.split("_"):
+        parts.extend(part.lower() for part in _SUBWORD_RE.findall(piece))
+    return parts
+
+def tokenize(text: str) -> List[str]:
+    """Tokenize code or a question into identifier terms.
+    
+    Each identifier is emitted whole (lowercased) so exact symbol names match,
+    followed by its camelCase/snake_case parts so partial names match too.
+    """
+    terms = []
+    for identifier in _IDENTIFIER_RE.findall(text):
+        whole = identifier.lower()
+        if len(whole) > 1 and whole not in _STOPWORDS:
+            terms.append(whole)
+        parts = split_identifier(identifier)
+        if len(parts) > 1:
+            terms.extend(p for p in parts if len(p) > 1 and p not in _STOPWORDS)
+    return terms
+
+class BM25Index:
+    """In-memory BM25 inverted index over chunk identifiers and tokens."""
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """Initialize an empty index.
+        
+        Args:
+            k1: Term frequency saturation
+            b: Document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.doc_lengths: List[int] = []
+        self.documents: List[Document] = []
+        self._total_length = 0
+    
+    def add_documents(self, documents: Iterable[Document]):
+        """Index documents by the identifiers in their content."""
+        for doc in documents:
+            doc_id = len(self.documents)
+            terms = tokenize(doc.page_content)
+            for term, tf in Counter(terms).items():
+                self.postings[term][doc_id] = tf
+            self.doc_lengths.append(len(terms))
+            self.documents.append(doc)
+            self._total_length += len(terms)
+    
+    def search(self, query: str, k: int = 20) -> List[Tuple[Document, float]]:
+        """Return the top-k documents for a query with their BM25 scores."""
+        num_docs = len(self.documents)
+        if not num_docs:
+            return []
+        
+        avg_length = self._total_length / num_docs or 1
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        
+        top = heapq.nlargest(k, scores.items(), key=itemgetter(1))
+        return [(self.documents[doc_id], score) for doc_id, score in top]
+    
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the postings and length table."""
+        total = sys.getsizeof(self.postings) + sys.getsizeof(self.doc_lengths)
+        for term, posting in self.postings.items():
+            total += sys.getsizeof(term) + sys.getsizeof(posting)
+        return total
+
+def reciprocal_rank_fusion(
+    rankings: List[List[Tuple[Hashable, Any]]],
+    k: int = 60
+) -> List[Tuple[Any, float]]:
+    """Fuse ranked lists with reciprocal rank fusion.
+    
+    Args:
+        rankings: Ranked lists of (key, item) pairs, best first
+        k: RRF damping constant
+    
+    Returns:
+        (item, score) pairs ordered by fused score
+    """
+    scores = defaultdict(float)
+    items = {}
+    for ranking in rankings:
+        for rank, (key, item) in enumerate(ranking):
+            scores[key] += 1.0 / (k + rank + 1)
+            items.setdefault(key, item)
+    fused = sorted(scores.items(), key=itemgetter(1), reverse=True)
+    return [(items[key], score) for key, score in fused]
+
+def _document_key(doc: Document) -> Tuple[str, str]:
+    """Identify a chunk independently of which store returned it."""
+    return doc.metadata.get("source", ""), doc.page_content
+
+class HybridRetriever(BaseRetriever):
+    """Retriever fusing dense vector results with BM25 identifier matches."""
+    
+    dense_retriever: BaseRetriever
+    lexical_index: Any
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        dense = self.dense_retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        lexical = self.lexical_index.search(query, self.fetch_k)
+        fused = reciprocal_rank_fusion([
+            [(_document_key(doc), doc) for doc in dense],
+            [(_document_key(doc), doc) for doc, _ in lexical]
+        ], k=self.rrf_k)
+        return [doc for doc, _ in fused[:self.k]]
+    
+    def scored_search(self, query: str) -> List[Tuple[Document, float]]:
+        """Return the fused top-k for context packing.
+        
+        Each hit is scored by the better of its dense relevance and its BM25
+        score relative to the top lexical hit, so a chunk found by only one of
+        the rankings is not penalized the way its fused score would be. BM25
+        scores have no fixed scale, hence the relative lexical score.
+        """
+        vectorstore = getattr(self.dense_retriever, "vectorstore", None)
+        if vectorstore is not None and getattr(self.dense_retriever, "search_type", None) == "similarity":
+            dense = faiss_scored_search(vectorstore, self.dense_retriever.search_kwargs.get("k", 4))(query)
+        else:
+            dense = [(doc, 1.0) for doc in self.dense_retriever.invoke(query)]
+        lexical = self.lexical_index.search(query, self.fetch_k)
+        if lexical:
+            lexical = [(doc, score / lexical[0][1]) for doc, score in lexical]
+        
+        relevance = defaultdict(float)
+        for doc, score in dense + lexical:
+            key = _document_key(doc)
+            relevance[key] = max(relevance[key], score)
+        fused = reciprocal_rank_fusion([
+            [(_document_key(doc), doc) for doc, _ in dense],
+            [(_document_key(doc), doc) for doc, _ in lexical]
+        ], k=self.rrf_k)
+        return [(doc, relevance[_document_key(doc)]) for doc, _ in fused[:self.k]]
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import hashlib
 import time
@@ -12,6 +13,11 @@ import torch
 from transformers import AutoTokenizer, AutoModel
 import numpy as np
 
+sys.path.append(str(Path(__file__).resolve().parent / "bitcoin-demo-v3"))
+from embedding_switcher.replicas import ReplicaRunner
+from embedding_switcher.service import ServiceEmbeddingAdapter, EmbeddingServiceUnavailable, SOCKET_ENV
+from path_matcher import PathMatcher
+
 @dataclass
 class KnoCacheEntry:
     """Represents a single .kno cache entry."""
@@ -26,11 +32,19 @@ class KnoCacheEntry:
 class KnoCacheManager:
     """Manages the .kno cache system for file-level embeddings."""
     
-    def __init__(self, cache_root: str = ".kno"):
+    def __init__(self, cache_root: str = ".kno", replicas: int = 0,
+                 threads_per_replica: Optional[int] = None,
+                 service_socket: Optional[str] = None):
         """Initialize the cache manager.
         
         Args:
             cache_root: Root directory for the cache
+            replicas: CPU only: run this many CodeBERT copies in worker
+                processes pinned to disjoint cores instead of sharing one
+                model between the processing threads; 0 disables
+            threads_per_replica: Cores per replica, defaults to an even split
+            service_socket: Shared embedding service to use instead of a local
+                model, defaults to $EMBEDDING_SERVICE_SOCKET
         """
         self.cache_root = Path(cache_root)
         self.metadata_dir = self.cache_root / "metadata"
@@ -39,10 +53,29 @@ class KnoCacheManager:
         
         # Initialize CodeBERT
         self.tokenizer = AutoTokenizer.from_pretrained("microsoft/codebert-base")
-        self.model = AutoModel.from_pretrained("microsoft/codebert-base")
-        self.model.eval()
-        if torch.cuda.is_available():
-            self.model = self.model.cuda()
+        if replicas and torch.cuda.is_available():
+            print(f"Ignoring replicas={replicas}: replicas run on CPU only")
+            replicas = 0
+        self.replicas = replicas
+        self.threads_per_replica = threads_per_replica
+        self.runner: Optional[ReplicaRunner] = None
+        self.runner_lock = threading.Lock()
+        self.model = None
+        self.model_lock = threading.Lock()
+        
+        # The service's mean-pooled CodeBERT matches the local model below
+        self.service: Optional[ServiceEmbeddingAdapter] = None
+        service_socket = service_socket or os.getenv(SOCKET_ENV)
+        if service_socket:
+            service = ServiceEmbeddingAdapter("codebert-mean", service_socket)
+            if service.client.available():
+                self.service = service
+            else:
+                print(f"Embedding service at {service_socket} unavailable; loading CodeBERT in-process")
+        
+        # Replicas hold their own copies and start on first use
+        if self.service is None and not replicas:
+            self._load_model()
         
         # Create directory structure
         self._create_directories()
@@ -56,6 +89,16 @@ class KnoCacheManager:
         self.file_hashes = self._load_file_hashes()
         self.embedding_types = self._load_embedding_types()
     
+    def _load_model(self):
+        """Load the in-process CodeBERT model, if not already loaded."""
+        with self.model_lock:
+            if self.model is None:
+                model = AutoModel.from_pretrained("microsoft/codebert-base")
+                model.eval()
+                if torch.cuda.is_available():
+                    model = model.cuda()
+                self.model = model
+    
     def _create_directories(self):
         """Create the cache directory structure."""
         self.cache_root.mkdir(exist_ok=True)
@@ -196,7 +239,8 @@ class KnoCacheManager:
     
     def _process_queue(self):
         """Process the queue of files needing embeddings."""
-        with ThreadPoolExecutor(max_workers=4) as executor:
+        # Keep two files in flight per replica so none of them idles
+        with ThreadPoolExecutor(max_workers=max(4, 2 * self.replicas)) as executor:
             while True:
                 try:
                     priority, (file_path, embedding_type, subsystem) = self.processing_queue.get(timeout=1)
@@ -214,20 +258,33 @@ class KnoCacheManager:
                             self.is_processing = False
                             break
     
-    def _get_file_embeddings(self, file_path: str) -> List[float]:
-        """Generate embeddings for a file using CodeBERT.
+    def _get_file_embeddings_np(self, file_path: str) -> np.ndarray:
+        """Generate a float32 embedding vector for a file using CodeBERT.
         
         Args:
             file_path: Path to the file
             
         Returns:
-            List of embeddings
+            Embedding as a contiguous float32 array
         """
         # Read file content
         with open(file_path, 'r') as f:
             code = f.read()
         
+        if self.service is not None:
+            try:
+                return self.service.embed_documents_np([code])[0]
+            except EmbeddingServiceUnavailable:
+                print("Embedding service unavailable; loading CodeBERT in-process")
+                self.service = None
+        
+        if self.replicas:
+            inputs = self.tokenizer(code, return_tensors="np", truncation=True, max_length=512, padding=True)
+            # Masked mean pooling, equal to the average below for one unpadded file
+            return self._get_runner().submit(inputs).result()[0]
+        
         # Tokenize and get embeddings
+        self._load_model()
         inputs = self.tokenizer(code, return_tensors="pt", truncation=True, max_length=512, padding=True)
         if torch.cuda.is_available():
             inputs = {k: v.cuda() for k, v in inputs.items()}
@@ -235,10 +292,38 @@ class KnoCacheManager:
         with torch.no_grad():
             outputs = self.model(**inputs)
             embeddings = outputs.last_hidden_state.mean(dim=1)  # Average pooling
+        
+        return np.ascontiguousarray(embeddings[0].float().cpu().numpy())
+    
+    def _get_runner(self) -> ReplicaRunner:
+        """Get the CodeBERT replicas, starting them on first use."""
+        with self.runner_lock:
+            if self.runner is None:
+                self.runner = ReplicaRunner(
+                    "microsoft/codebert-base", self.replicas, self.threads_per_replica,
+                    pooling="mean"
+                )
+            return self.runner
+    
+    def close(self):
+        """Stop the CodeBERT replicas, if running, and close the service connection."""
+        if self.service is not None:
+            self.service.close()
+        with self.runner_lock:
+            if self.runner is not None:
+                self.runner.close()
+                self.runner = None
+    
+    def _get_file_embeddings(self, file_path: str) -> List[float]:
+        """Generate embeddings for a file using CodeBERT.
+        
+        Args:
+            file_path: Path to the file
             
-        # Convert to numpy and then to list
-        embeddings_np = embeddings.cpu().numpy()
-        return embeddings_np[0].tolist()
+        Returns:
+            List of embeddings, as stored in JSON cache entries
+        """
+        return self._get_file_embeddings_np(file_path).tolist()
     
     def _process_file(self, file_path: str, embedding_type: str, subsystem: str):
         """Process a single file to generate embeddings.
@@ -280,20 +365,22 @@ class KnoCacheManager:
             print(f"Error processing file {file_path}: {str(e)}")
             raise  # Re-raise the exception for better error tracking
     
-    def scan_directory(self, directory: str, embedding_type: str, subsystem: str):
+    def scan_directory(self, directory: str, embedding_type: str, subsystem: str,
+                       include_patterns: Optional[List[str]] = None,
+                       exclude_patterns: Optional[List[str]] = None):
         """Scan a directory for files needing processing.
         
         Args:
             directory: Directory to scan
             embedding_type: Type of embedding
             subsystem: Subsystem the files belong to
+            include_patterns: Globs of files to scan, defaults to ["*.cpp", "*.h"]
+            exclude_patterns: Globs of files or directories to skip, relative to directory
         """
-        for root, _, files in os.walk(directory):
-            for file in files:
-                if file.endswith(('.cpp', '.h')):
-                    file_path = os.path.join(root, file)
-                    if not self.check_cache(file_path, embedding_type, subsystem):
-                        self.queue_processing(file_path, embedding_type, subsystem)
+        matcher = PathMatcher(include_patterns or ["*.cpp", "*.h"], exclude_patterns)
+        for file_path in matcher.walk(directory):
+            if not self.check_cache(file_path, embedding_type, subsystem):
+                self.queue_processing(file_path, embedding_type, subsystem)
     
     def get_embedding_types(self) -> List[str]:
         """Get list of available embedding types."""
@@ -0,0 +1,189 @@
+import os
+import re
+import fnmatch
+from functools import lru_cache
+from typing import Any, List, Iterable, Iterator, Optional, FrozenSet, Tuple
+
+# Matching state of each pattern after some path segments; an empty state
+# means the pattern can no longer match anything below
+States = Tuple[Any, ...]
+
+class _Glob:
+    """One glob containing `**`, compiled to a sequence of per-segment matchers.
+    
+    A pattern without a slash matches a file or directory name at any depth;
+    any other pattern is anchored at the root, like .gitignore. `*` and `?`
+    stay within a path segment and `**` matches any number of segments.
+    """
+    
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        stripped = pattern.strip("/")
+        segments = [segment for segment in stripped.split("/") if segment]
+        if "/" not in stripped and not pattern.startswith("/"):
+            segments.insert(0, "**")
+        
+        self.segments: List[Optional[re.Pattern]] = []
+        for segment in segments:
+            if segment == "**":
+                if not self.segments or self.segments[-1] is not None:
+                    self.segments.append(None)
+            else:
+                self.segments.append(re.compile(fnmatch.translate(segment)))
+        self.end = len(self.segments)
+    
+    def _closure(self, states: Iterable[int]) -> FrozenSet[int]:
+        """Add the positions reachable by letting `**` match nothing."""
+        closed = set()
+        for state in states:
+            closed.add(state)
+            while state < self.end and self.segments[state] is None:
+                state += 1
+                closed.add(state)
+        return frozenset(closed)
+    
+    def start(self) -> FrozenSet[int]:
+        return self._closure([0])
+    
+    def advance(self, states: FrozenSet[int], name: str) -> FrozenSet[int]:
+        """Consume one path segment."""
+        following = []
+        for state in states:
+            if state == self.end:
+                continue
+            segment = self.segments[state]
+            if segment is None:
+                following.append(state)
+            elif segment.match(name):
+                following.append(state + 1)
+        return self._closure(following)
+    
+    def accepts(self, states: FrozenSet[int]) -> bool:
+        return self.end in states
+
+class _FnmatchGlob:
+    """One glob without `**`, matched with fnmatch against the whole path.
+    
+    As with fnmatch.fnmatch, `*` also matches slashes, so `src/*.cpp` matches
+    src/wallet/wallet.cpp and `*/test/*` matches every file below any test
+    directory. The state is the path so far; it is dropped once the path no
+    longer agrees with the pattern's literal prefix, which lets walks prune
+    directories such as src/qt for `src/wallet/*`.
+    """
+    
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.regex = re.compile(fnmatch.translate(pattern))
+        self.prefix = re.split(r"[*?\[]", pattern, maxsplit=1)[0]
+    
+    def start(self) -> Tuple[str, ...]:
+        return ("",)
+    
+    def advance(self, state: Tuple[str, ...], name: str) -> Tuple[str, ...]:
+        """Consume one path segment."""
+        if not state:
+            return ()
+        path = f"{state[0]}/{name}" if state[0] else name
+        size = min(len(self.prefix), len(path) + 1)
+        if self.prefix[:size] != (path + "/")[:size]:
+            return ()
+        return (path,)
+    
+    def accepts(self, state: Tuple[str, ...]) -> bool:
+        return bool(state) and self.regex.match(state[0]) is not None
+
+def _compile(pattern: str):
+    """Compile a pattern: segment rules with `**`, fnmatch rules without."""
+    if "**" in pattern:
+        return _Glob(pattern)
+    return _FnmatchGlob(pattern)
+
+class PathMatcher:
+    """Include and exclude globs compiled once, deciding files and whole directories.
+    
+    Patterns without `**` match the whole relative path with fnmatch, as the
+    loaders always did; patterns with `**` follow .gitignore rules (see
+    _Glob). A path is selected if it matches an include pattern and neither
+    it nor any directory above it matches an exclude pattern. Walks skip a directory
+    when an exclude pattern matches it or no include pattern can match
+    anything below it, so excluded subtrees such as src/qt are never listed.
+    """
+    
+    def __init__(self, include: Optional[List[str]] = None,
+                 exclude: Optional[List[str]] = None):
+        """Compile the patterns.
+        
+        Args:
+            include: Globs of files to select, e.g. ["*.cpp", "src/wallet/**"];
+                None selects every file
+            exclude: Globs of files or directories to skip, e.g. ["src/qt"]
+        """
+        self.include = list(include) if include is not None else ["**"]
+        self.exclude = list(exclude or [])
+        self._include = [_compile(pattern) for pattern in self.include]
+        self._exclude = [_compile(pattern) for pattern in self.exclude]
+    
+    def _start(self) -> Tuple[States, States]:
+        return (tuple(glob.start() for glob in self._include),
+                tuple(glob.start() for glob in self._exclude))
+    
+    @staticmethod
+    def _advance(globs: List[Any], states: States, name: str) -> States:
+        return tuple(glob.advance(state, name) for glob, state in zip(globs, states))
+    
+    def _enter(self, states: Tuple[States, States], name: str) -> Optional[Tuple[States, States]]:
+        """States after entering a directory, or None if it can be skipped."""
+        include = self._advance(self._include, states[0], name)
+        if not any(include):
+            return None
+        exclude = self._advance(self._exclude, states[1], name)
+        if any(glob.accepts(state) for glob, state in zip(self._exclude, exclude)):
+            return None
+        return include, exclude
+    
+    def _selects(self, states: Tuple[States, States], name: str) -> bool:
+        """Whether a file in a directory with these states is selected."""
+        include = self._advance(self._include, states[0], name)
+        if not any(glob.accepts(state) for glob, state in zip(self._include, include)):
+            return False
+        exclude = self._advance(self._exclude, states[1], name)
+        return not any(glob.accepts(state) for glob, state in zip(self._exclude, exclude))
+    
+    def _states(self, directory: str) -> Optional[Tuple[States, States]]:
+        states = self._start()
+        for name in directory.replace(os.sep, "/").split("/"):
+            if name and name != "." and states is not None:
+                states = self._enter(states, name)
+        return states
+    
+    def matches(self, path: str) -> bool:
+        """Check whether a file path relative to the root is selected."""
+        directory, _, name = path.replace(os.sep, "/").rpartition("/")
+        states = self._states(directory)
+        return states is not None and self._selects(states, name)
+    
+    def prunes(self, directory: str) -> bool:
+        """Check whether nothing below a directory relative to the root can be selected."""
+        return self._states(directory) is None
+    
+    def walk(self, root: str) -> Iterator[str]:
+        """Yield the paths of selected files below root, skipping pruned directories."""
+        pending = {root: self._start()}
+        for dirpath, dirnames, filenames in os.walk(root):
+            states = pending.pop(dirpath)
+            kept = []
+            for dirname in dirnames:
+                child = self._enter(states, dirname)
+                if child is not None:
+                    kept.append(dirname)
+                    pending[os.path.join(dirpath, dirname)] = child
+            dirnames[:] = kept
+            for filename in filenames:
+                if self._selects(states, filename):
+                    yield os.path.join(dirpath, filename)
+
+@lru_cache(maxsize=128)
+def cached_matcher(include: Optional[Tuple[str, ...]] = None,
+                   exclude: Tuple[str, ...] = ()) -> PathMatcher:
+    """Get a PathMatcher for pattern tuples, compiled once per distinct tuple."""
+    return PathMatcher(include, exclude)
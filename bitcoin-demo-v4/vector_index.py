@@ -0,0 +1,389 @@
+import json
+import time
+import logging
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+import numpy as np
+import faiss
+
+logger = logging.getLogger(__name__)
+
+# Supported FAISS index types for subsystem vector stores; "auto" picks one by corpus size
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "sq8", "hnsw")
+AUTO_INDEX = "auto"
+
+# Name of the tuned configuration saved next to a FAISS index
+INDEX_CONFIG_FILE = "index_config.json"
+
+@dataclass
+class IndexConfig:
+    """Configuration of the FAISS index backing a subsystem vector store."""
+    index_type: str = "flat"
+    nlist: Optional[int] = None  # IVF cells, defaults to ~4 * sqrt(n)
+    nprobe: int = 8  # IVF cells visited per query
+    pq_m: int = 96  # PQ sub-quantizers (bytes per vector at 8 bits)
+    pq_nbits: int = 8
+    train_sample_size: int = 50000
+    hnsw_m: int = 32  # HNSW graph neighbours per node
+    ef_construction: int = 40
+    ef_search: int = 16
+    # Automatic selection: exact search below exact_threshold vectors, HNSW up to
+    # hnsw_max_vectors, IVF above; parameters are tuned to reach target_recall
+    target_recall: float = 0.95
+    exact_threshold: int = 20000
+    hnsw_max_vectors: int = 1000000
+    tuning_queries: int = 200
+
+def faiss_index_bytes(index: faiss.Index) -> int:
+    """Estimate the number of bytes held by a FAISS index (vectors plus structure).
+    
+    Counts ntotal codes of d * 4 bytes for flat storage or code_size for SQ and
+    PQ, plus HNSW links and IVF ids and centroids, without serializing the index.
+    """
+    if isinstance(index, faiss.IndexHNSW):
+        hnsw = index.hnsw
+        links = hnsw.neighbors.size() * 4 + hnsw.offsets.size() * 8 + hnsw.levels.size() * 4
+        return faiss_index_bytes(index.storage) + links
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # Codes plus an int64 id per vector, and the coarse centroids
+        size = ivf.ntotal * (ivf.code_size + 8) + faiss_index_bytes(ivf.quantizer)
+        if isinstance(index, faiss.IndexIVFPQ):
+            size += index.pq.centroids.size() * 4
+        return int(size)
+    return int(index.ntotal * getattr(index, "code_size", index.d * 4))
+
+def default_nlist(n: int) -> int:
+    """Pick an IVF cell count for n vectors, keeping ~39 training points per cell."""
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+def _pq_subquantizers(d: int, m: int) -> int:
+    """Largest sub-quantizer count <= m that divides the dimension."""
+    for candidate in range(min(m, d), 0, -1):
+        if d % candidate == 0:
+            return candidate
+    return 1
+
+def _min_training_points(config: IndexConfig, nlist: int) -> int:
+    """Minimum number of vectors needed to train an index type."""
+    if config.index_type == "ivf_flat":
+        return nlist
+    if config.index_type == "ivf_pq":
+        return max(nlist, 2 ** config.pq_nbits)
+    return 1
+
+def training_sample(vectors: np.ndarray, sample_size: int, seed: int = 0) -> np.ndarray:
+    """Draw a random training sample of at most sample_size vectors."""
+    if len(vectors) <= sample_size:
+        return vectors
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), size=sample_size, replace=False)
+    return vectors[np.sort(rows)]
+
+def build_index(vectors: np.ndarray, config: IndexConfig, seed: int = 0) -> faiss.Index:
+    """Build and fill a FAISS index of the configured type.
+    
+    Trainable index types are trained on a random sample of the vectors. Corpora
+    too small to train the requested type fall back to an exact flat index.
+    
+    Args:
+        vectors: Matrix of shape (n, d) with the vectors to index
+        config: Index configuration
+        seed: Seed for the training sample
+    
+    Returns:
+        A trained FAISS index containing all vectors, using L2 distance
+    """
+    if config.index_type == AUTO_INDEX:
+        return auto_tune_index(vectors, config, seed=seed)[0]
+    if config.index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{config.index_type}'. Available types: {list(INDEX_TYPES)}")
+    
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+    nlist = config.nlist or default_nlist(n)
+    index_type = config.index_type
+    
+    if n < _min_training_points(config, nlist):
+        logger.warning(
+            f"{n} vectors are too few to train a {index_type} index; using flat index"
+        )
+        index_type = "flat"
+    
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(d)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, config.hnsw_m, faiss.METRIC_L2)
+        index.hnsw.efConstruction = config.ef_construction
+        index.hnsw.efSearch = config.ef_search
+    elif index_type == "sq8":
+        index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    else:
+        quantizer = faiss.IndexFlatL2(d)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexIVFPQ(
+                quantizer, d, nlist, _pq_subquantizers(d, config.pq_m), config.pq_nbits
+            )
+        index.nprobe = config.nprobe
+    
+    if not index.is_trained:
+        start_time = time.time()
+        index.train(training_sample(vectors, config.train_sample_size, seed))
+        logger.info(f"Trained {index_type} index on {min(n, config.train_sample_size)} vectors in {time.time() - start_time:.2f}s")
+    
+    index.add(vectors)
+    return index
+
+def set_nprobe(index: faiss.Index, nprobe: int) -> bool:
+    """Set the number of IVF cells probed per query.
+    
+    Returns:
+        True if the index is an IVF index, False if nprobe does not apply
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        return False
+    ivf.nprobe = nprobe
+    return True
+
+def set_ef_search(index: faiss.Index, ef_search: int) -> bool:
+    """Set the HNSW search beam width.
+    
+    Returns:
+        True if the index is an HNSW index, False if efSearch does not apply
+    """
+    index = faiss.downcast_index(index)
+    if not hasattr(index, "hnsw"):
+        return False
+    index.hnsw.efSearch = ef_search
+    return True
+
+def apply_search_params(index: faiss.Index, config: IndexConfig):
+    """Apply the query-time parameters of a configuration to an index."""
+    set_nprobe(index, config.nprobe)
+    set_ef_search(index, config.ef_search)
+
+def recall_at_k(reference_ids: np.ndarray, candidate_ids: np.ndarray, k: int) -> float:
+    """Fraction of the reference top-k neighbours found in the candidate top-k."""
+    hits = 0
+    total = 0
+    for reference, candidate in zip(reference_ids, candidate_ids):
+        expected = set(reference[:k].tolist()) - {-1}
+        hits += len(expected & set(candidate[:k].tolist()))
+        total += len(expected)
+    return hits / total if total else 1.0
+
+def _timed_search(index: faiss.Index, queries: np.ndarray, k: int):
+    """Search all queries, returning ids and mean latency in milliseconds."""
+    start_time = time.perf_counter()
+    _, ids = index.search(queries, k)
+    latency_ms = (time.perf_counter() - start_time) * 1000 / len(queries)
+    return ids, latency_ms
+
+def compare_index_types(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 4,
+    configs: Optional[Sequence[IndexConfig]] = None,
+    nprobe_values: Sequence[int] = (1, 4, 8, 16, 32)
+) -> List[Dict[str, Any]]:
+    """Measure recall@k, latency and memory of index types against exact search.
+    
+    Args:
+        vectors: Matrix of corpus vectors
+        queries: Matrix of query vectors
+        k: Number of neighbours to compare
+        configs: Index configurations to evaluate, defaults to every index type
+        nprobe_values: nprobe settings to sweep for IVF indexes
+    
+    Returns:
+        One row per index type and nprobe setting, starting with the flat baseline
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    if configs is None:
+        configs = [IndexConfig(index_type=t) for t in INDEX_TYPES if t != "flat"]
+    
+    baseline = build_index(vectors, IndexConfig(index_type="flat"))
+    baseline_ids, baseline_latency = _timed_search(baseline, queries, k)
+    baseline_bytes = faiss_index_bytes(baseline)
+    
+    rows = [{
+        "index_type": "flat",
+        "nprobe": None,
+        f"recall@{k}": 1.0,
+        "latency_ms": baseline_latency,
+        "memory_bytes": baseline_bytes,
+        "compression": 1.0
+    }]
+    
+    for config in configs:
+        start_time = time.time()
+        index = build_index(vectors, config)
+        build_time = time.time() - start_time
+        memory_bytes = faiss_index_bytes(index)
+        is_ivf = faiss.try_extract_index_ivf(index) is not None
+        
+        for nprobe in (nprobe_values if is_ivf else [None]):
+            if nprobe is not None:
+                set_nprobe(index, nprobe)
+            ids, latency_ms = _timed_search(index, queries, k)
+            rows.append({
+                "index_type": config.index_type,
+                "nprobe": nprobe,
+                f"recall@{k}": recall_at_k(baseline_ids, ids, k),
+                "latency_ms": latency_ms,
+                "memory_bytes": memory_bytes,
+                "compression": baseline_bytes / memory_bytes,
+                "build_time": build_time
+            })
+    
+    return rows
+
+def format_index_report(rows: List[Dict[str, Any]]) -> str:
+    """Render compare_index_types rows as a markdown table."""
+    recall_key = next(key for key in rows[0] if key.startswith("recall@"))
+    lines = [
+        f"| Index | nprobe | {recall_key} | Latency (ms/query) | Memory (MB) | Compression |",
+        "|---|---|---|---|---|---|"
+    ]
+    for row in rows:
+        lines.append(
+            f"| {row['index_type']} | {row['nprobe'] if row['nprobe'] is not None else '-'} "
+            f"| {row[recall_key]:.3f} | {row['latency_ms']:.3f} "
+            f"| {row['memory_bytes'] / 2**20:.2f} | {row['compression']:.1f}x |"
+        )
+    return "\n".join(lines)
+
+
+def _tune_candidates(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    reference_ids: np.ndarray,
+    config: IndexConfig,
+    k: int,
+    seed: int
+) -> List[Dict[str, Any]]:
+    """Build candidate indexes for the chosen family and sweep their search parameters."""
+    n = len(vectors)
+    results = []
+    
+    if config.index_type == "hnsw":
+        # Larger M costs memory, so stop at the first one that reaches the target
+        for hnsw_m in sorted({16, 32, 48, config.hnsw_m}):
+            candidate = IndexConfig(**{**asdict(config), "hnsw_m": hnsw_m})
+            index = build_index(vectors, candidate, seed=seed)
+            reached = False
+            for ef_search in (16, 32, 64, 128, 256, 512):
+                set_ef_search(index, max(ef_search, k))
+                ids, latency_ms = _timed_search(index, queries, k)
+                recall = recall_at_k(reference_ids, ids, k)
+                tuned = IndexConfig(**{**asdict(candidate), "ef_search": max(ef_search, k)})
+                results.append({"config": tuned, "index": index, "recall": recall, "latency_ms": latency_ms})
+                if recall >= config.target_recall:
+                    reached = True
+                    break
+            if reached:
+                break
+    else:
+        base_nlist = default_nlist(n)
+        for nlist in sorted({base_nlist, max(1, min(base_nlist * 4, n // 39))}):
+            candidate = IndexConfig(**{**asdict(config), "nlist": nlist})
+            index = build_index(vectors, candidate, seed=seed)
+            nprobe = 1
+            while nprobe <= nlist:
+                set_nprobe(index, nprobe)
+                ids, latency_ms = _timed_search(index, queries, k)
+                recall = recall_at_k(reference_ids, ids, k)
+                tuned = IndexConfig(**{**asdict(candidate), "nprobe": nprobe})
+                results.append({"config": tuned, "index": index, "recall": recall, "latency_ms": latency_ms})
+                if recall >= config.target_recall:
+                    break
+                nprobe *= 2
+    
+    return results
+
+def auto_tune_index(
+    vectors: np.ndarray,
+    config: Optional[IndexConfig] = None,
+    k: int = 4,
+    seed: int = 0
+) -> Tuple[faiss.Index, IndexConfig, Dict[str, Any]]:
+    """Choose an index type by corpus size and tune it to a target recall.
+    
+    Corpora below config.exact_threshold get an exact flat index. Larger ones get
+    HNSW (up to config.hnsw_max_vectors) or IVF-Flat, whose parameters (M and
+    efSearch, or nlist and nprobe) are tuned against a held-out sample of the
+    vectors. The returned index is then built from all vectors in their original
+    order, so row i of the index is vectors[i].
+    
+    Args:
+        vectors: Matrix of shape (n, d) with the vectors to index
+        config: Selection thresholds and target recall; index_type is ignored
+        k: Number of neighbours used to measure recall
+        seed: Seed for the held-out sample
+    
+    Returns:
+        Tuple of (index, tuned configuration, tuning report)
+    """
+    config = config or IndexConfig(index_type=AUTO_INDEX)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n = len(vectors)
+    
+    if n < config.exact_threshold:
+        tuned = IndexConfig(**{**asdict(config), "index_type": "flat"})
+        return build_index(vectors, tuned), tuned, {"num_vectors": n, "recall": 1.0}
+    
+    family = "hnsw" if n <= config.hnsw_max_vectors else "ivf_flat"
+    config = IndexConfig(**{**asdict(config), "index_type": family})
+    
+    # Hold out queries so they are not trivially their own nearest neighbour
+    rng = np.random.default_rng(seed)
+    held_out = np.zeros(n, dtype=bool)
+    held_out[rng.choice(n, size=min(config.tuning_queries, n // 10), replace=False)] = True
+    queries, corpus = vectors[held_out], vectors[~held_out]
+    
+    reference = faiss.IndexFlatL2(vectors.shape[1])
+    reference.add(corpus)
+    reference_ids, _ = _timed_search(reference, queries, k)
+    
+    start_time = time.time()
+    results = _tune_candidates(corpus, queries, reference_ids, config, k, seed)
+    reaching = [r for r in results if r["recall"] >= config.target_recall]
+    if reaching:
+        best = min(reaching, key=lambda r: r["latency_ms"])
+    else:
+        logger.warning(f"No {family} setting reached recall {config.target_recall}; using the most accurate one")
+        best = max(results, key=lambda r: r["recall"])
+    
+    # Rebuild in corpus order; row ids must stay aligned with the documents
+    index = build_index(vectors, best["config"], seed=seed)
+    apply_search_params(index, best["config"])
+    
+    report = {
+        "num_vectors": n,
+        "recall": best["recall"],
+        "latency_ms": best["latency_ms"],
+        "candidates_evaluated": len(results),
+        "tuning_time": time.time() - start_time
+    }
+    logger.info(f"Auto-selected {family} index for {n} vectors: {report}")
+    return index, best["config"], report
+
+def save_index_config(directory: str, config: IndexConfig, report: Optional[Dict[str, Any]] = None):
+    """Persist an index configuration next to a saved FAISS index."""
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / INDEX_CONFIG_FILE, 'w') as f:
+        json.dump({"config": asdict(config), "report": report or {}}, f, indent=2)
+
+def load_index_config(directory: str) -> Optional[IndexConfig]:
+    """Load the index configuration saved next to a FAISS index, if any."""
+    path = Path(directory) / INDEX_CONFIG_FILE
+    if not path.exists():
+        return None
+    with open(path, 'r') as f:
+        return IndexConfig(**json.load(f)["config"])
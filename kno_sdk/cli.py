@@ -26,6 +26,12 @@ def main():
         help="Cache directory path",
         default=str(Path.home() / ".kno_cache")
     )
+    parser.add_argument(
+        "--backend",
+        help="Read repositories through the GitHub API or a local bare mirror",
+        choices=["api", "mirror"],
+        default="api"
+    )
     
     subparsers = parser.add_subparsers(dest="command", help="Commands")
     
@@ -59,7 +65,7 @@ def main():
         parser.error("GitHub token is required. Set GITHUB_TOKEN environment variable or use --token")
     
     # Initialize SDK
-    kno = KNO(api_token=args.token, cache_dir=args.cache_dir)
+    kno = KNO(api_token=args.token, cache_dir=args.cache_dir, backend=args.backend)
     repo = kno.connect_repository(args.repo)
     
     if args.command == "embed":
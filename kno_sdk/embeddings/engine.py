@@ -7,18 +7,40 @@ import numpy as np
 from sentence_transformers import SentenceTransformer
 from pathlib import Path
 import json
+import time
+from .service import EmbeddingServiceClient, EmbeddingServiceUnavailable, client_from_env
 
 class EmbeddingEngine:
     """Handles embedding generation and management."""
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        service: Optional[EmbeddingServiceClient] = None,
+        service_retry_seconds: float = 30.0
+    ):
         """
         Initialize embedding engine.
         
+        The model is loaded in-process only if no shared embedding service
+        serves it, or once the service becomes unreachable. After a failure
+        the service is tried again every service_retry_seconds, so a restart
+        does not leave the engine on the in-process model.
+        
         Args:
             model_name: Name of the sentence transformer model to use
+            service: Shared embedding service client. If None, one is created
+                from EMBEDDING_SERVICE_SOCKET when that is set.
+            service_retry_seconds: How long to use the in-process model after
+                the service fails before trying the service again
         """
-        self.model = SentenceTransformer(model_name)
+        self.model_name = model_name
+        self.service_retry_seconds = service_retry_seconds
+        self._service_retry_at = 0.0
+        self.service = service if service is not None else client_from_env()
+        if self.service is not None and not self.service.serves(model_name):
+            self.service = None
+        self.model = SentenceTransformer(model_name) if self.service is None else None
         self.cache_dir = Path.home() / ".kno_embeddings"
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         
@@ -34,7 +56,7 @@ class EmbeddingEngine:
             Dictionary containing embedding and metadata
         """
         # Generate embedding
-        embedding = self.model.encode(content, convert_to_tensor=False)
+        embedding = self._encode([content])[0]
         
         # Create result dictionary
         result = {
@@ -61,7 +83,7 @@ class EmbeddingEngine:
             List of embedding results
         """
         # Generate embeddings in batch
-        embeddings = self.model.encode(contents, convert_to_tensor=False)
+        embeddings = self._encode(contents)
         
         # Create results
         results = []
@@ -76,6 +98,25 @@ class EmbeddingEngine:
             
         return results
     
+    def _encode(self, contents: List[str]) -> np.ndarray:
+        """
+        Encode contents with the shared service, or the in-process model.
+        
+        Args:
+            contents: Text contents to embed
+        
+        Returns:
+            Array of shape (len(contents), dimension)
+        """
+        if self.service is not None and time.monotonic() >= self._service_retry_at:
+            try:
+                return self.service.embed(self.model_name, contents)
+            except EmbeddingServiceUnavailable:
+                self._service_retry_at = time.monotonic() + self.service_retry_seconds
+        if self.model is None:
+            self.model = SentenceTransformer(self.model_name)
+        return self.model.encode(contents, convert_to_tensor=False)
+    
     def save_embedding(self, embedding: Dict[str, Any], file_path: str) -> None:
         """
         Save embedding to cache.
@@ -0,0 +1,125 @@
+"""
+Client for a shared local embedding service.
+
+Speaks the frame protocol of the bitcoin-demo embedding_switcher service: a
+4-byte header length, a JSON header, then payload_bytes raw bytes.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+import json
+import os
+import socket
+import struct
+import threading
+import numpy as np
+
+SOCKET_ENV = "EMBEDDING_SERVICE_SOCKET"
+_LENGTH = struct.Struct("!I")
+
+class EmbeddingServiceUnavailable(ConnectionError):
+    """Raised when the embedding service cannot be reached."""
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if not count:
+            raise ConnectionError("Connection closed mid-frame")
+        received += count
+    return buffer
+
+class EmbeddingServiceClient:
+    """Embeds text through a service that keeps models resident for the whole host."""
+    
+    def __init__(self, socket_path: str, timeout: float = 300.0):
+        """
+        Initialize the client. Each thread opens its own connection on first use.
+        
+        Args:
+            socket_path: Path of the service's Unix socket
+            timeout: Seconds to wait for a response
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+    
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise EmbeddingServiceUnavailable(f"No embedding service at {self.socket_path}: {e}") from e
+        return sock
+    
+    def _request(self, header: Dict[str, Any]) -> Tuple[Dict[str, Any], bytearray]:
+        # A kept connection may belong to a service that has since restarted,
+        # so a failure on it is retried once on a fresh connection
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None)
+            reused = sock is not None
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            try:
+                data = json.dumps(dict(header, payload_bytes=0)).encode("utf-8")
+                sock.sendall(_LENGTH.pack(len(data)) + data)
+                (length,) = _LENGTH.unpack(_recv_exactly(sock, _LENGTH.size))
+                response = json.loads(_recv_exactly(sock, length).decode("utf-8"))
+                payload = _recv_exactly(sock, response.get("payload_bytes", 0))
+            except OSError as e:
+                self.close()
+                if reused and attempt == 0:
+                    continue
+                raise EmbeddingServiceUnavailable(f"Embedding service at {self.socket_path} failed: {e}") from e
+            if not response.get("ok"):
+                raise RuntimeError(f"Embedding service error: {response.get('error')}")
+            return response, payload
+    
+    def embed(self, model: str, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts with a model served by the service.
+        
+        Args:
+            model: Served model name, e.g. "all-MiniLM-L6-v2"
+            texts: Texts to embed
+        
+        Returns:
+            float32 array of shape (len(texts), dimension)
+        """
+        response, payload = self._request({"op": "embed", "model": model, "texts": list(texts)})
+        return np.frombuffer(payload, dtype=response["dtype"]).reshape(response["shape"])
+    
+    def serves(self, model: str) -> bool:
+        """
+        Check that the service is reachable and serves a model.
+        
+        Args:
+            model: Served model name
+        
+        Returns:
+            True if embed calls for the model can go to the service
+        """
+        try:
+            return model in self._request({"op": "ping"})[0].get("models", [])
+        except EmbeddingServiceUnavailable:
+            return False
+    
+    def close(self) -> None:
+        """Close this thread's connection."""
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+def client_from_env(timeout: float = 300.0) -> Optional[EmbeddingServiceClient]:
+    """
+    Get a client for the service named by EMBEDDING_SERVICE_SOCKET.
+    
+    Returns:
+        A client, or None if the variable is not set
+    """
+    socket_path = os.getenv(SOCKET_ENV)
+    return EmbeddingServiceClient(socket_path, timeout) if socket_path else None
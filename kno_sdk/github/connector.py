@@ -3,21 +3,58 @@ GitHub connector for repository access and management.
 """
 
 from typing import List, Optional, Any, Dict
+from pathlib import Path
+import requests
 from github import Github
 from github.Repository import Repository as GitHubRepo
 
+from .trees import TreeCache, GitTreesClient
+from .fetcher import ContentFetcher
+from .mirror import LocalMirror, MirrorStore
+
+DEFAULT_API_URL = "https://api.github.com"
+BACKENDS = ("api", "mirror")
+
 class GitHubConnector:
     """Handles GitHub API interactions and repository access."""
     
-    def __init__(self, api_token: str):
+    def __init__(
+        self,
+        api_token: str,
+        cache_dir: Optional[str] = None,
+        api_url: str = DEFAULT_API_URL,
+        backend: str = "api"
+    ):
         """
         Initialize GitHub connector.
         
         Args:
             api_token: GitHub API token
+            cache_dir: Directory for cached tree listings and mirrors, or None to
+                cache listings in memory only
+            api_url: Base URL of the GitHub REST API
+            backend: "api" to read files through the GitHub API, or "mirror" to
+                read them from a bare mirror under cache_dir, fetched incrementally
         """
-        self.github = Github(api_token)
-        
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        if backend == "mirror" and not cache_dir:
+            raise ValueError("The mirror backend requires a cache_dir")
+        self.backend = backend
+        self.mirrors = MirrorStore(Path(cache_dir) / "mirrors", api_token) if backend == "mirror" else None
+        self.github = Github(api_token, base_url=api_url)
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_token}",
+            "Accept": "application/vnd.github+json"
+        })
+        self.trees = GitTreesClient(
+            self.session,
+            api_url,
+            TreeCache(Path(cache_dir) / "trees" if cache_dir else None)
+        )
+        self.contents = ContentFetcher(self.session, api_url)
+    
     def connect(self, repo_name: str) -> GitHubRepo:
         """
         Connect to a GitHub repository.
@@ -30,11 +67,53 @@ class GitHubConnector:
         """
         return self.github.get_repo(repo_name)
     
+    def mirror(self, repo: GitHubRepo) -> LocalMirror:
+        """
+        Get the local mirror of a repository, cloning or fetching it on first use.
+        
+        Args:
+            repo: GitHub repository object
+            
+        Returns:
+            Local bare mirror of the repository
+        """
+        return self.mirrors.get(repo.full_name, repo.clone_url)
+    
+    def refresh(self, repo: GitHubRepo) -> None:
+        """
+        Fetch new commits into a repository's mirror; a no-op for the API backend.
+        
+        Args:
+            repo: GitHub repository object
+        """
+        if self.backend == "mirror":
+            self.mirror(repo).update()
+    
+    def list_tree(self, repo: GitHubRepo, ref: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        List every file of a repository with one recursive Git Trees request.
+        
+        Listings are cached by tree SHA and revalidated with an ETag, so an
+        unchanged branch costs one 304 response. The mirror backend lists the
+        local mirror instead.
+        
+        Args:
+            repo: GitHub repository object
+            ref: Branch, tag or SHA to list, defaults to the default branch
+            
+        Returns:
+            List of dicts with the path, size and blob sha of each file
+        """
+        if self.backend == "mirror":
+            return self.mirror(repo).list_tree(ref or repo.default_branch)
+        return self.trees.list_tree(repo.full_name, ref or repo.default_branch)
+    
     def list_files(
         self,
         repo: GitHubRepo,
         path: str = "",
-        recursive: bool = True
+        recursive: bool = True,
+        ref: Optional[str] = None
     ) -> List[str]:
         """
         List files in a repository.
@@ -43,18 +122,22 @@ class GitHubConnector:
             repo: GitHub repository object
             path: Starting path in repository
             recursive: Whether to list files recursively
+            ref: Branch, tag or SHA to list, defaults to the default branch
             
         Returns:
             List of file paths
         """
+        prefix = path.strip("/")
         files = []
         try:
-            contents = repo.get_contents(path)
-            for content in contents:
-                if content.type == "dir" and recursive:
-                    files.extend(self.list_files(repo, content.path))
-                elif content.type == "file":
-                    files.append(content.path)
+            for entry in self.list_tree(repo, ref):
+                relative = entry["path"]
+                if prefix:
+                    if not relative.startswith(prefix + "/"):
+                        continue
+                    relative = relative[len(prefix) + 1:]
+                if recursive or "/" not in relative:
+                    files.append(entry["path"])
         except Exception as e:
             print(f"Error listing files: {e}")
         return files
@@ -71,12 +154,52 @@ class GitHubConnector:
             File content as string, or None if not found
         """
         try:
+            if self.backend == "mirror":
+                name = f"{repo.default_branch}:{path}"
+                data = self.mirror(repo).read_blobs([name])[name]
+                if data is None:
+                    raise FileNotFoundError(path)
+                return data.decode('utf-8')
             content = repo.get_contents(path)
             return content.decoded_content.decode('utf-8')
         except Exception as e:
             print(f"Error getting file content: {e}")
             return None
     
+    def get_file_contents(
+        self,
+        repo: GitHubRepo,
+        paths: Optional[List[str]] = None,
+        ref: Optional[str] = None,
+        mode: str = "auto"
+    ) -> Dict[str, Optional[str]]:
+        """
+        Get the contents of many files with few requests.
+        
+        Args:
+            repo: GitHub repository object
+            paths: Paths of the files to get, None for every file
+            ref: Branch, tag or SHA to read, defaults to the default branch
+            mode: "blobs" to fetch distinct blobs concurrently, "archive" to
+                stream the repository tarball once, or "auto" to pick by file
+                count; ignored by the mirror backend
+            
+        Returns:
+            Mapping of path to content, None for files that are not UTF-8 text
+        """
+        ref = ref or repo.default_branch
+        try:
+            entries = self.list_tree(repo, ref)
+            if paths is not None:
+                wanted = set(paths)
+                entries = [entry for entry in entries if entry["path"] in wanted]
+            if self.backend == "mirror":
+                return self.mirror(repo).read_files(entries)
+            return self.contents.fetch(repo.full_name, ref, entries, mode)
+        except Exception as e:
+            print(f"Error getting file contents: {e}")
+            return {}
+    
     def get_file_metadata(self, repo: GitHubRepo, path: str) -> Optional[Dict[str, Any]]:
         """
         Get metadata about a file.
@@ -89,6 +212,15 @@ class GitHubConnector:
             Dictionary containing file metadata
         """
         try:
+            if self.backend == "mirror":
+                metadata = self.mirror(repo).metadata(repo.default_branch, path)
+                if metadata is None:
+                    raise FileNotFoundError(path)
+                return {
+                    "path": path,
+                    "url": f"{self.trees.api_url}/repos/{repo.full_name}/contents/{path}",
+                    **metadata
+                }
             content = repo.get_contents(path)
             return {
                 "path": content.path,
@@ -0,0 +1,150 @@
+"""
+Bulk file content fetching for GitHub repositories.
+
+Files are fetched either as raw git blobs, concurrently over a pooled HTTP
+session and once per distinct blob SHA, or all at once by streaming the
+repository tarball and keeping the wanted members in memory.
+"""
+
+from typing import Dict, Any, List, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+import tarfile
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Above this many distinct blobs, "auto" mode downloads the tarball instead
+ARCHIVE_THRESHOLD = 200
+
+def _decode(data: bytes) -> Optional[str]:
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+class ContentFetcher:
+    """Fetches the contents of many repository files with few round trips."""
+    
+    def __init__(
+        self,
+        session: requests.Session,
+        api_url: str,
+        max_workers: int = 8,
+        archive_threshold: int = ARCHIVE_THRESHOLD,
+        timeout: float = 60.0
+    ):
+        """
+        Initialize the fetcher.
+        
+        Args:
+            session: HTTP session carrying the API credentials; its connection
+                pool is sized for max_workers
+            api_url: Base URL of the GitHub REST API
+            max_workers: Maximum concurrent blob requests
+            archive_threshold: Distinct blobs above which "auto" mode uses the tarball
+            timeout: Seconds to wait for a response
+        """
+        self.session = session
+        self.api_url = api_url.rstrip("/")
+        self.max_workers = max_workers
+        self.archive_threshold = archive_threshold
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.requests = 0
+        self._lock = threading.Lock()
+    
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        response = self.session.get(url, timeout=self.timeout, **kwargs)
+        with self._lock:
+            self.requests += 1
+        response.raise_for_status()
+        return response
+    
+    def _fetch_blob(self, repo_name: str, sha: str) -> bytes:
+        response = self._get(
+            f"{self.api_url}/repos/{repo_name}/git/blobs/{sha}",
+            headers={"Accept": "application/vnd.github.raw"}
+        )
+        return response.content
+    
+    def fetch_blobs(self, repo_name: str, entries: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """
+        Fetch files as raw blobs, each distinct blob SHA once.
+        
+        Args:
+            repo_name: Repository name in format 'owner/repo'
+            entries: Files to fetch, dicts with path and sha as from list_tree
+        
+        Returns:
+            Mapping of path to content, None for files that are not UTF-8 text
+        """
+        shas = list(dict.fromkeys(entry["sha"] for entry in entries))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            blobs = dict(zip(shas, executor.map(lambda sha: self._fetch_blob(repo_name, sha), shas)))
+        return {entry["path"]: _decode(blobs[entry["sha"]]) for entry in entries}
+    
+    def fetch_archive(self, repo_name: str, ref: str, paths: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Fetch files by streaming the repository tarball once.
+        
+        Members are read from the stream as it arrives and only the wanted
+        ones are kept, so nothing is written to disk.
+        
+        Args:
+            repo_name: Repository name in format 'owner/repo'
+            ref: Branch, tag or SHA of the archive
+            paths: Paths of the files to keep
+        
+        Returns:
+            Mapping of path to content, None for files that are not UTF-8 text
+            or missing from the archive
+        """
+        wanted: Set[str] = set(paths)
+        contents: Dict[str, Optional[str]] = dict.fromkeys(paths)
+        response = self._get(
+            f"{self.api_url}/repos/{repo_name}/tarball/{quote(ref, safe='')}",
+            stream=True
+        )
+        try:
+            with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+                    # Members are prefixed with an "owner-repo-sha/" directory
+                    path = member.name.split("/", 1)[-1]
+                    if path in wanted:
+                        contents[path] = _decode(archive.extractfile(member).read())
+        finally:
+            response.close()
+        return contents
+    
+    def fetch(
+        self,
+        repo_name: str,
+        ref: str,
+        entries: List[Dict[str, Any]],
+        mode: str = "auto"
+    ) -> Dict[str, Optional[str]]:
+        """
+        Fetch the contents of files.
+        
+        Args:
+            repo_name: Repository name in format 'owner/repo'
+            ref: Branch, tag or SHA the entries were listed at
+            entries: Files to fetch, dicts with path and sha as from list_tree
+            mode: "blobs", "archive", or "auto" to use the archive for many files
+        
+        Returns:
+            Mapping of path to content, None for files that are not UTF-8 text
+        """
+        if mode not in ("auto", "blobs", "archive"):
+            raise ValueError(f"Unknown fetch mode: {mode}")
+        if mode == "auto":
+            distinct = len({entry["sha"] for entry in entries})
+            mode = "archive" if distinct > self.archive_threshold else "blobs"
+        if mode == "archive":
+            return self.fetch_archive(repo_name, ref, [entry["path"] for entry in entries])
+        return self.fetch_blobs(repo_name, entries)
@@ -0,0 +1,176 @@
+"""
+Local bare mirrors of GitHub repositories.
+
+A repository is cloned once into a bare mirror and brought up to date with
+incremental fetches; listings and file contents are then read from the local
+object store instead of through the GitHub API.
+"""
+
+from typing import Dict, Any, List, Optional
+from pathlib import Path
+import base64
+import subprocess
+import threading
+
+class GitError(RuntimeError):
+    """Raised when a git command fails."""
+
+class LocalMirror:
+    """A bare mirror of one repository's branches and tags."""
+    
+    def __init__(self, path: Path, url: str, token: Optional[str] = None):
+        """
+        Initialize the mirror without touching the disk.
+        
+        Args:
+            path: Directory of the bare repository
+            url: URL or local path to fetch from
+            token: GitHub token sent to HTTPS remotes; it is never stored in the mirror
+        """
+        self.path = Path(path)
+        self.url = url
+        self.token = token
+        self.fetches = 0
+        self._lock = threading.Lock()
+        self._batch: Optional[subprocess.Popen] = None
+    
+    def _git(self, *args: str, remote: bool = False) -> bytes:
+        command = ["git"]
+        if remote and self.token and self.url.startswith("https://"):
+            credentials = base64.b64encode(f"x-access-token:{self.token}".encode()).decode()
+            command += ["-c", f"http.extraHeader=Authorization: Basic {credentials}"]
+        command += ["--git-dir", str(self.path), *args]
+        result = subprocess.run(command, capture_output=True)
+        if result.returncode != 0:
+            raise GitError(f"git {args[0]} failed: {result.stderr.decode(errors='replace').strip()}")
+        return result.stdout
+    
+    def update(self) -> None:
+        """Create the mirror if it does not exist, then fetch what changed since the last fetch."""
+        with self._lock:
+            if not (self.path / "HEAD").exists():
+                self.path.mkdir(parents=True, exist_ok=True)
+                self._git("init", "--bare", "--quiet")
+                self._git("remote", "add", "origin", self.url)
+                # Branches and tags only; GitHub's pull request refs are not needed
+                self._git("config", "remote.origin.fetch", "+refs/heads/*:refs/heads/*")
+                self._git("config", "--add", "remote.origin.fetch", "+refs/tags/*:refs/tags/*")
+            self._git("fetch", "--prune", "--quiet", "origin", remote=True)
+            self.fetches += 1
+    
+    def list_tree(self, ref: str) -> List[Dict[str, Any]]:
+        """
+        List every file at a ref.
+        
+        Args:
+            ref: Branch, tag or SHA
+        
+        Returns:
+            List of dicts with the path, size and blob sha of each file
+        """
+        files = []
+        for record in self._git("ls-tree", "-r", "-l", "-z", ref).split(b"\0"):
+            if not record:
+                continue
+            info, path = record.split(b"\t", 1)
+            _, kind, sha, size = info.split()
+            if kind == b"blob":
+                files.append({"path": path.decode(), "size": int(size), "sha": sha.decode()})
+        return files
+    
+    def read_blobs(self, objects: List[str]) -> Dict[str, Optional[bytes]]:
+        """
+        Read objects through one long-running git cat-file process.
+        
+        Args:
+            objects: Blob SHAs or ref:path names
+        
+        Returns:
+            Mapping of each name to its content, None if it does not exist
+        """
+        contents: Dict[str, Optional[bytes]] = {}
+        with self._lock:
+            if self._batch is None or self._batch.poll() is not None:
+                self._batch = subprocess.Popen(
+                    ["git", "--git-dir", str(self.path), "cat-file", "--batch"],
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE
+                )
+            for name in dict.fromkeys(objects):
+                self._batch.stdin.write(name.encode() + b"\n")
+                self._batch.stdin.flush()
+                header = self._batch.stdout.readline().split()
+                if len(header) != 3 or header[1] != b"blob":
+                    if len(header) == 3:
+                        self._batch.stdout.read(int(header[2]) + 1)
+                    contents[name] = None
+                    continue
+                contents[name] = self._batch.stdout.read(int(header[2]))
+                self._batch.stdout.read(1)
+        return contents
+    
+    def read_files(self, entries: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """
+        Read files listed by list_tree, each distinct blob once.
+        
+        Returns:
+            Mapping of path to content, None for files that are not UTF-8 text
+        """
+        blobs = self.read_blobs([entry["sha"] for entry in entries])
+        contents = {}
+        for entry in entries:
+            try:
+                contents[entry["path"]] = blobs[entry["sha"]].decode("utf-8")
+            except (AttributeError, UnicodeDecodeError):
+                contents[entry["path"]] = None
+        return contents
+    
+    def metadata(self, ref: str, path: str) -> Optional[Dict[str, Any]]:
+        """Get the sha, size and last commit date of a file, or None if it does not exist."""
+        listing = self._git("ls-tree", "-l", "-z", ref, path).split(b"\0")[0]
+        if not listing:
+            return None
+        _, kind, sha, size = listing.split(b"\t", 1)[0].split()
+        if kind != b"blob":
+            return None
+        last_modified = self._git("log", "-1", "--format=%cD", ref, "--", path).decode().strip()
+        return {"sha": sha.decode(), "size": int(size), "last_modified": last_modified}
+    
+    def close(self) -> None:
+        """Stop the cat-file process."""
+        with self._lock:
+            if self._batch is not None:
+                self._batch.stdin.close()
+                self._batch.wait()
+                self._batch = None
+
+class MirrorStore:
+    """Bare mirrors under a cache directory, fetched once per store and on refresh."""
+    
+    def __init__(self, cache_dir: Path, token: Optional[str] = None):
+        """
+        Initialize the store.
+        
+        Args:
+            cache_dir: Directory holding one owner/repo.git mirror per repository
+            token: GitHub token for fetching private repositories
+        """
+        self.cache_dir = Path(cache_dir)
+        self.token = token
+        self._mirrors: Dict[str, LocalMirror] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, repo_name: str, url: str) -> LocalMirror:
+        """
+        Get the mirror of a repository, cloning or fetching it on first use.
+        
+        Args:
+            repo_name: Repository name in format 'owner/repo'
+            url: Clone URL of the repository
+        """
+        with self._lock:
+            mirror = self._mirrors.get(repo_name)
+            if mirror is None:
+                mirror = LocalMirror(self.cache_dir / f"{repo_name}.git", url, self.token)
+                mirror.update()
+                self._mirrors[repo_name] = mirror
+            return mirror
@@ -0,0 +1,171 @@
+"""
+Repository listing through the Git Trees API, cached by tree SHA.
+
+A whole repository is listed with one recursive trees request. Trees are
+immutable, so a listing is stored under its tree SHA and a branch only needs
+a conditional request (If-None-Match) to find out it still points at it;
+GitHub does not count 304 responses against the rate limit.
+"""
+
+from typing import Dict, Any, List, Optional
+from pathlib import Path
+from urllib.parse import quote
+import json
+import os
+import re
+import threading
+import requests
+
+_FULL_SHA = re.compile(r"^[0-9a-f]{40}$")
+
+class TreeCache:
+    """Tree listings by tree SHA, plus the ETag and tree SHA of each trees URL."""
+    
+    def __init__(self, cache_dir: Optional[Path] = None):
+        """
+        Initialize the cache.
+        
+        Args:
+            cache_dir: Directory to persist listings in, or None to keep them in memory only
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._trees: Dict[str, List[Dict[str, Any]]] = {}
+        self._refs: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            refs_path = self.cache_dir / "refs.json"
+            if refs_path.exists():
+                self._refs = json.loads(refs_path.read_text())
+    
+    def _write(self, path: Path, data: Any) -> None:
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data))
+        os.replace(tmp_path, path)
+    
+    def get_tree(self, sha: str) -> Optional[List[Dict[str, Any]]]:
+        """Get the recursive entries of a tree, or None if it is not cached."""
+        with self._lock:
+            if sha not in self._trees and self.cache_dir:
+                path = self.cache_dir / f"{sha}.json"
+                if path.exists():
+                    self._trees[sha] = json.loads(path.read_text())
+            return self._trees.get(sha)
+    
+    def put_tree(self, sha: str, entries: List[Dict[str, Any]]) -> None:
+        """Store the recursive entries of a tree."""
+        with self._lock:
+            self._trees[sha] = entries
+            if self.cache_dir:
+                self._write(self.cache_dir / f"{sha}.json", entries)
+    
+    def get_ref(self, url: str) -> Optional[Dict[str, str]]:
+        """Get the etag and tree sha last returned by a trees URL."""
+        with self._lock:
+            return self._refs.get(url)
+    
+    def put_ref(self, url: str, etag: Optional[str], sha: str) -> None:
+        """Record the etag and tree sha returned by a trees URL."""
+        with self._lock:
+            self._refs[url] = {"etag": etag, "sha": sha}
+            if self.cache_dir:
+                self._write(self.cache_dir / "refs.json", self._refs)
+
+class GitTreesClient:
+    """Lists repository files with recursive Git Trees requests."""
+    
+    def __init__(self, session: requests.Session, api_url: str, cache: TreeCache, timeout: float = 30.0):
+        """
+        Initialize the client.
+        
+        Args:
+            session: HTTP session carrying the API credentials
+            api_url: Base URL of the GitHub REST API
+            cache: Cache of tree listings
+            timeout: Seconds to wait for a response
+        """
+        self.session = session
+        self.api_url = api_url.rstrip("/")
+        self.cache = cache
+        self.timeout = timeout
+        self.requests = 0
+        self.not_modified = 0
+    
+    def _tree_url(self, repo_name: str, ref: str) -> str:
+        return f"{self.api_url}/repos/{repo_name}/git/trees/{quote(ref, safe='')}"
+    
+    def _get(self, url: str, recursive: bool, etag: Optional[str] = None) -> requests.Response:
+        headers = {"If-None-Match": etag} if etag else {}
+        params = {"recursive": "1"} if recursive else {}
+        response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        self.requests += 1
+        if response.status_code == 304:
+            self.not_modified += 1
+            return response
+        response.raise_for_status()
+        return response
+    
+    def _walk(self, repo_name: str, sha: str, data: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Get the recursive entries of a tree, fetching it only if it is not cached.
+        
+        A recursive listing that GitHub truncated is completed by listing the
+        tree non-recursively and walking its subtrees, which are cached too.
+        """
+        entries = self.cache.get_tree(sha)
+        if entries is not None:
+            return entries
+        
+        if data is None:
+            data = self._get(self._tree_url(repo_name, sha), recursive=True).json()
+        if not data.get("truncated"):
+            entries = data["tree"]
+        else:
+            data = self._get(self._tree_url(repo_name, sha), recursive=False).json()
+            entries = []
+            for entry in data["tree"]:
+                entries.append(entry)
+                if entry["type"] == "tree":
+                    entries.extend(
+                        dict(child, path=f"{entry['path']}/{child['path']}")
+                        for child in self._walk(repo_name, entry["sha"])
+                    )
+        
+        self.cache.put_tree(sha, entries)
+        return entries
+    
+    def list_tree(self, repo_name: str, ref: str) -> List[Dict[str, Any]]:
+        """
+        List every file of a repository at a ref.
+        
+        Args:
+            repo_name: Repository name in format 'owner/repo'
+            ref: Branch, tag, commit SHA or tree SHA
+        
+        Returns:
+            List of dicts with the path, size and blob sha of each file
+        """
+        url = self._tree_url(repo_name, ref)
+        known = self.cache.get_ref(url)
+        entries = None
+        
+        if known and _FULL_SHA.match(ref):
+            # What a SHA points at never changes
+            entries = self.cache.get_tree(known["sha"])
+        if entries is None:
+            response = self._get(url, recursive=True, etag=known["etag"] if known else None)
+            if response.status_code == 304:
+                entries = self.cache.get_tree(known["sha"])
+                if entries is None:
+                    # The listing was removed from the cache directory
+                    response = self._get(url, recursive=True)
+        if entries is None:
+            data = response.json()
+            entries = self._walk(repo_name, data["sha"], data)
+            self.cache.put_ref(url, response.headers.get("ETag"), data["sha"])
+        
+        return [
+            {"path": entry["path"], "size": entry.get("size", 0), "sha": entry["sha"]}
+            for entry in entries
+            if entry["type"] == "blob"
+        ]
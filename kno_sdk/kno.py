@@ -15,13 +15,15 @@ from .version.control import VersionControl
 class KNO:
     """Main KNO SDK class providing access to all functionality."""
     
-    def __init__(self, api_token: Optional[str] = None, cache_dir: Optional[str] = None):
+    def __init__(self, api_token: Optional[str] = None, cache_dir: Optional[str] = None, backend: str = "api"):
         """
         Initialize the KNO SDK.
         
         Args:
             api_token: GitHub API token. If None, will try to load from environment.
             cache_dir: Directory for local cache storage. If None, will use default.
+            backend: "api" to read repositories through the GitHub API, or "mirror"
+                to read them from local bare mirrors kept under cache_dir.
         """
         # Load environment variables
         load_dotenv()
@@ -34,7 +36,11 @@ class KNO:
         self.cache_dir = Path(cache_dir) if cache_dir else Path.home() / ".kno_cache"
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         
-        self.github = GitHubConnector(self.api_token)
+        self.github = GitHubConnector(
+            self.api_token,
+            cache_dir=str(self.cache_dir / "github"),
+            backend=backend
+        )
         self.embeddings = EmbeddingEngine()
         self.cache = CacheManager(str(self.cache_dir))
         self.version = VersionControl()
@@ -88,17 +94,14 @@ class Repository:
             Dictionary containing embedding results
         """
         if file_path:
-            files = [file_path]
+            contents = {file_path: self.github.get_file_content(self.repo, file_path)}
         else:
-            files = self.github.list_files(self.repo)
-            
-        results = {}
-        for file in files:
-            content = self.github.get_file_content(self.repo, file)
-            embedding = self.embeddings.generate(content)
-            results[file] = embedding
+            # One tree listing, then blobs in parallel or a single tarball
+            contents = self.github.get_file_contents(self.repo)
             
-        return results
+        files = [file for file, content in contents.items() if content is not None]
+        embeddings = self.embeddings.batch_generate([contents[file] for file in files])
+        return dict(zip(files, embeddings))
     
     def get_cache(self) -> CacheManager:
         """Get the cache manager for this repository."""
@@ -0,0 +1,102 @@
+"""
+Tests for the memory-budgeted LRU chunk cache of the v4 BitcoinRAG.
+"""
+
+import sys
+import tempfile
+import importlib.util
+import subprocess
+import unittest
+from pathlib import Path
+from unittest import mock
+from langchain_core.documents import Document
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+
+# Add the v4 demo to path
+V4_DIR = Path(__file__).parent.parent / "bitcoin-demo-v4"
+sys.path.append(str(V4_DIR))
+
+# Loaded by path, as v3 has a bitcoin_rag module too
+spec = importlib.util.spec_from_file_location("v4_bitcoin_rag", V4_DIR / "bitcoin_rag.py")
+bitcoin_rag = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bitcoin_rag)
+
+def documents(source, count, size=200):
+    return [Document(page_content=f"{source} {i} " + "x" * size, metadata={"source": source}) for i in range(count)]
+
+class TestChunkCache(unittest.TestCase):
+    """Test LRU eviction under a memory budget and reloading evicted indexes."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        repo = Path(self.tmp.name) / "repo"
+        repo.mkdir()
+        subprocess.run(["git", "init", "--quiet"], cwd=repo, check=True)
+        self.embeddings = FakeEmbeddings(size=8)
+        # Neither the embedding model nor the .kno cache's tokenizer is needed here
+        with mock.patch.object(bitcoin_rag, "get_embedding_model", return_value=self.embeddings), \
+                mock.patch.object(bitcoin_rag, "KnoCacheManager"):
+            self.rag = bitcoin_rag.BitcoinRAG(str(repo), cache_dir=str(Path(self.tmp.name) / "cache"),
+                                              hybrid_search=False)
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_least_recently_used_entry_is_evicted(self):
+        """Reading an entry protects it; the coldest one is evicted first."""
+        first, second, third = documents("a", 10), documents("b", 10), documents("c", 10)
+        self.rag.memory_budget_bytes = self.rag._entry_size(first) * 2 + 100
+        self.rag._cache_put("chunks_a", first)
+        self.rag._cache_put("chunks_b", second)
+        self.rag._cache_get("chunks_a")
+        self.rag._cache_put("chunks_c", third)
+        self.assertEqual(list(self.rag._chunk_cache), ["chunks_a", "chunks_c"])
+        self.assertLessEqual(self.rag._cache_bytes(), self.rag.memory_budget_bytes)
+    
+    def test_new_entry_is_kept_over_budget(self):
+        """An entry larger than the whole budget still stays resident."""
+        self.rag.memory_budget_bytes = 10
+        self.rag._cache_put("chunks_a", documents("a", 10))
+        self.rag._cache_put("chunks_b", documents("b", 10))
+        self.assertEqual(list(self.rag._chunk_cache), ["chunks_b"])
+    
+    def test_no_budget_keeps_everything(self):
+        """Nothing is evicted without a memory budget."""
+        for name in "abc":
+            self.rag._cache_put(f"chunks_{name}", documents(name, 10))
+        self.assertEqual(len(self.rag._chunk_cache), 3)
+    
+    def test_vectorstore_size_counts_documents_by_vector_id(self):
+        """A store is sized from its index and the documents its vectors map to."""
+        docs = documents("src/net.cpp", 5)
+        vectorstore = FAISS.from_documents(docs, self.embeddings)
+        expected = (bitcoin_rag.faiss_index_bytes(vectorstore.index) + bitcoin_rag._documents_bytes(docs)
+                    + sys.getsizeof(vectorstore.index_to_docstore_id))
+        self.assertEqual(bitcoin_rag._vectorstore_bytes(vectorstore), expected)
+        larger = FAISS.from_documents(documents("src/net.cpp", 5, size=2000), self.embeddings)
+        self.assertGreater(bitcoin_rag._vectorstore_bytes(larger), expected)
+    
+    def test_evicted_index_is_reloaded_from_disk(self):
+        """An evicted subsystem index reloads with its retriever settings."""
+        vectorstore = FAISS.from_documents(documents("src/net.cpp", 5), self.embeddings)
+        vectorstore.save_local(str(self.rag._index_dir("p2p")))
+        retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+        self.rag.retrievers["p2p"] = retriever
+        self.rag._cache_put("embeddings_p2p", {"vectorstore": vectorstore, "retriever": retriever})
+        
+        self.rag.memory_budget_bytes = 10
+        self.rag._cache_put("chunks_all", documents("a", 10))
+        self.assertNotIn("embeddings_p2p", self.rag._chunk_cache)
+        self.assertNotIn("p2p", self.rag.retrievers)
+        self.assertIn("p2p", self.rag._evicted_subsystems)
+        
+        self.rag.memory_budget_bytes = None
+        self.rag._reload_subsystem("p2p")
+        self.assertIn("embeddings_p2p", self.rag._chunk_cache)
+        self.assertEqual(self.rag.retrievers["p2p"].search_kwargs, {"k": 3})
+        self.assertEqual(self.rag.retrievers["p2p"].vectorstore.index.ntotal, 5)
+        self.assertNotIn("p2p", self.rag._evicted_subsystems)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+"""
+Tests for scoring retrieved chunks and packing them into a token budget.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+
+# Add the v4 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4"))
+
+from context_packer import ContextPacker, PackedRetriever, answer_packed, faiss_scored_search
+
+class FakeVectorStore:
+    """Returns fixed (document, distance) pairs for any query."""
+    
+    def __init__(self, results):
+        self.results = results
+    
+    def similarity_search_with_score(self, query, k=4):
+        return self.results[:k]
+
+class UnnormalizedEmbeddings(Embeddings):
+    """Random vectors of norm about 10, like CLS-pooled CodeBERT outputs."""
+    
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+    
+    def embed_query(self, text):
+        seed = sum(ord(c) for c in text)
+        return (np.random.default_rng(seed).normal(size=32) * 10 / np.sqrt(32)).tolist()
+
+def chunk(source, start, end, text=None):
+    return Document(page_content=text or f"{source}:{start}-{end}",
+                    metadata={"source": source, "start_line": start, "end_line": end})
+
+class TestFaissScoredSearch(unittest.TestCase):
+    """Test relevance scores of dense hits."""
+    
+    def test_exact_match_does_not_zero_other_hits(self):
+        """A hit at distance 0 scores 1.0 and leaves the others their relevance."""
+        docs = [chunk("a.cpp", 1, 2), chunk("b.cpp", 1, 2), chunk("c.cpp", 1, 2)]
+        scored = faiss_scored_search(FakeVectorStore(list(zip(docs, [0.0, 0.25, 1.0]))))("query")
+        self.assertEqual([score for _, score in scored], [1.0, 0.8, 0.5])
+    
+    def test_scores_do_not_depend_on_the_best_hit(self):
+        """The same distance gets the same relevance in every query."""
+        doc = chunk("a.cpp", 1, 2)
+        alone = faiss_scored_search(FakeVectorStore([(doc, 1.0)]))("query")
+        behind = faiss_scored_search(FakeVectorStore([(chunk("b.cpp", 1, 2), 0.1), (doc, 1.0)]))("query")
+        self.assertEqual(alone[0][1], behind[1][1])
+    
+    def test_store_relevance_function_is_used(self):
+        """A store's override_relevance_score_fn replaces the default."""
+        store = FakeVectorStore([(chunk("a.cpp", 1, 2), 3.0)])
+        store.override_relevance_score_fn = lambda distance: 1.0 - distance / 10
+        self.assertAlmostEqual(faiss_scored_search(store)("query")[0][1], 0.7)
+    
+    def test_unnormalized_hits_still_give_context(self):
+        """Large squared-L2 distances score low, yet the best hit is packed."""
+        store = FAISS.from_documents([chunk(f"{i}.cpp", 1, 2) for i in range(10)], UnnormalizedEmbeddings())
+        scored = faiss_scored_search(store, k=5)("How is a block validated?")
+        self.assertTrue(all(score < 0.7 for _, score in scored))
+        packed, _ = ContextPacker(score_threshold=0.7).pack(scored)
+        self.assertEqual(packed, [max(scored, key=lambda item: item[1])[0]])
+    
+    def test_respects_k(self):
+        """At most k hits are returned."""
+        docs = [(chunk(f"{i}.cpp", 1, 2), float(i)) for i in range(5)]
+        self.assertEqual(len(faiss_scored_search(FakeVectorStore(docs), k=3)("query")), 3)
+
+class TestContextPacker(unittest.TestCase):
+    """Test thresholding, deduplication, merging and the token budget."""
+    
+    def test_threshold_is_absolute(self):
+        """Candidates below the threshold are dropped while another one passes."""
+        packer = ContextPacker(score_threshold=0.5)
+        packed, stats = packer.pack([(chunk("a.cpp", 1, 2), 0.6), (chunk("b.cpp", 1, 2), 0.4),
+                                     (chunk("c.cpp", 1, 2), 0.3)])
+        self.assertEqual([d.metadata["source"] for d in packed], ["a.cpp"])
+        self.assertEqual(stats["below_threshold"], 2)
+    
+    def test_best_candidate_is_kept_when_none_passes(self):
+        """If every candidate is below the threshold, the top-ranked one is kept."""
+        packer = ContextPacker(score_threshold=0.5)
+        packed, stats = packer.pack([(chunk("a.cpp", 1, 2), 0.3), (chunk("b.cpp", 1, 2), 0.4)])
+        self.assertEqual([d.metadata["source"] for d in packed], ["b.cpp"])
+        self.assertEqual(stats["below_threshold"], 1)
+    
+    def test_duplicates_are_kept_once(self):
+        """The same chunk from two indexes is sent once, with its best score."""
+        packer = ContextPacker()
+        doc = chunk("a.cpp", 1, 5)
+        packed, stats = packer.pack([(doc, 0.6), (chunk("b.cpp", 1, 5), 0.7), (doc, 0.9)])
+        self.assertEqual([d.metadata["source"] for d in packed], ["a.cpp", "b.cpp"])
+        self.assertEqual(stats["duplicates"], 1)
+    
+    def test_touching_chunks_are_merged(self):
+        """Chunks of a file separated by a blank line become one passage."""
+        packer = ContextPacker(merge_gap_lines=2)
+        packed, stats = packer.pack([
+            (chunk("a.cpp", 14, 16, "b\nc\nd"), 0.8),
+            (chunk("a.cpp", 1, 3, "x\ny\nz"), 0.9),
+            (chunk("a.cpp", 5, 8, "p\nq\nr\ns"), 0.5)
+        ])
+        self.assertEqual(stats["merged"], 1)
+        self.assertEqual([(d.metadata["start_line"], d.metadata["end_line"]) for d in packed], [(1, 8), (14, 16)])
+    
+    def test_overlapping_chunks_are_merged(self):
+        """Overlapping line ranges are joined without repeating lines."""
+        packer = ContextPacker()
+        first = Document(page_content="1\n2\n3\n4", metadata={"source": "a.cpp", "start_line": 1, "end_line": 4})
+        second = Document(page_content="3\n4\n5\n6", metadata={"source": "a.cpp", "start_line": 3, "end_line": 6})
+        packed, _ = packer.pack([(first, 0.9), (second, 0.8)])
+        self.assertEqual([d.page_content for d in packed], ["1\n2\n3\n4\n5\n6"])
+    
+    def test_budget_keeps_best_passages(self):
+        """Passages are taken by score until the budget is full; the best is always kept."""
+        packer = ContextPacker(token_budget=10, count_tokens=len)
+        packed, stats = packer.pack([
+            (chunk("a.cpp", 1, 1, "x" * 6), 0.5),
+            (chunk("b.cpp", 1, 1, "y" * 20), 0.9),
+            (chunk("c.cpp", 1, 1, "z" * 4), 0.7)
+        ])
+        self.assertEqual([d.metadata["source"] for d in packed], ["b.cpp"])
+        self.assertEqual(stats["over_budget"], 2)
+        
+        packer = ContextPacker(token_budget=10, count_tokens=len, max_documents=1)
+        packed, _ = packer.pack([(chunk("a.cpp", 1, 1, "x" * 6), 0.5), (chunk("c.cpp", 1, 1, "z" * 4), 0.7)])
+        self.assertEqual([d.metadata["source"] for d in packed], ["c.cpp"])
+
+class TestAnswerPacked(unittest.TestCase):
+    """Test answering over a PackedRetriever."""
+    
+    def test_returns_context_of_each_question(self):
+        """Each answer comes with the passages and packing counts of its own question."""
+        from langchain.chains import RetrievalQA
+        from langchain_core.language_models.fake import FakeListLLM
+        
+        hits = {
+            "one": [(chunk("a.cpp", 1, 2), 0.9)],
+            "two": [(chunk("a.cpp", 1, 2), 0.9), (chunk("b.cpp", 1, 2), 0.8), (chunk("c.cpp", 1, 2), 0.1)]
+        }
+        retriever = PackedRetriever(searches=[hits.get], packer=ContextPacker(score_threshold=0.5))
+        chain = RetrievalQA.from_chain_type(llm=FakeListLLM(responses=["first", "second"]),
+                                            chain_type="stuff", retriever=retriever)
+        
+        answer, documents, stats = answer_packed(chain, "two")
+        self.assertEqual(answer, "first")
+        self.assertEqual([d.metadata["source"] for d in documents], ["a.cpp", "b.cpp"])
+        self.assertEqual((stats["candidates"], stats["below_threshold"]), (3, 1))
+        
+        answer, documents, stats = answer_packed(chain, "one")
+        self.assertEqual(answer, "second")
+        self.assertEqual(stats["candidates"], 1)
+        self.assertFalse(hasattr(retriever, "last_stats"))
+
+if __name__ == "__main__":
+    unittest.main()
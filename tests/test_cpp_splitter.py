@@ -0,0 +1,117 @@
+"""
+Tests for splitting C++ sources at declaration boundaries.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from langchain_core.documents import Document
+
+# Add the v4 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4"))
+
+from cpp_splitter import CppCodeSplitter
+
+SOURCE = """#include <vector>
+
+namespace node {
+// A comment with a brace {
+class Mempool : public Base {
+public:
+    void Add(int tx);
+    int Size() const { return m_size; }
+private:
+    int m_size{0};
+};
+
+bool Mempool::Check(const std::string& s)
+{
+    if (s == "}") {
+        return false;
+    }
+    return true;
+}
+} // namespace node
+
+template <class T>
+T Max(T a, T b) { return a > b ? a : b; }
+"""
+
+class TestCppCodeSplitter(unittest.TestCase):
+    """Test chunk boundaries, coverage and metadata."""
+    
+    def assert_covers(self, splitter, text, max_size=None):
+        """Chunks are in order, do not overlap and only skip whitespace."""
+        chunks = splitter.split_code(text)
+        position = 0
+        for chunk in chunks:
+            self.assertGreaterEqual(chunk.start, position)
+            self.assertFalse(text[position:chunk.start].strip())
+            if max_size is not None:
+                self.assertLessEqual(chunk.end - chunk.start, max_size)
+            position = chunk.end
+        self.assertFalse(text[position:].strip())
+        return chunks
+    
+    def test_small_file_is_one_chunk(self):
+        """Declarations are packed together while they fit."""
+        splitter = CppCodeSplitter(chunk_size=1000)
+        self.assertEqual(splitter.split_text(SOURCE), [SOURCE.strip()])
+    
+    def test_splits_at_declarations(self):
+        """An oversized namespace is split at its members, never inside one.
+        
+        The namespace's opening line goes with its first member and its
+        closing brace with its last.
+        """
+        splitter = CppCodeSplitter(chunk_size=160)
+        chunks = self.assert_covers(splitter, SOURCE)
+        texts = [SOURCE[c.start:c.end].strip() for c in chunks]
+        self.assertEqual(texts[0], "#include <vector>")
+        self.assertTrue(texts[1].startswith("namespace node {") and texts[1].endswith("};"), texts)
+        self.assertTrue(texts[2].startswith("bool Mempool::Check") and texts[2].endswith("}\n}"), texts)
+        self.assertTrue(texts[3].endswith("T Max(T a, T b) { return a > b ? a : b; }"), texts)
+        symbols = [s for c in chunks for s in c.symbols]
+        self.assertIn("node::Mempool", symbols)
+        self.assertIn("node::Mempool::Check", symbols)
+        self.assertIn("Max", symbols)
+    
+    def test_braces_in_comments_and_strings_are_ignored(self):
+        """A '{' in a comment and '}' in a string literal do not end a function."""
+        splitter = CppCodeSplitter(chunk_size=160)
+        check = [c for c in splitter.split_code(SOURCE) if "node::Mempool::Check" in c.symbols]
+        self.assertEqual(len(check), 1)
+        self.assertIn("    return true;\n}", SOURCE[check[0].start:check[0].end])
+    
+    def test_oversized_function_is_split_by_lines(self):
+        """A function longer than chunk_size is split at line boundaries."""
+        body = "".join(f"    x += {i};\n" for i in range(40))
+        text = "void Long()\n{\n" + body + "}\n"
+        splitter = CppCodeSplitter(chunk_size=100)
+        chunks = self.assert_covers(splitter, text, max_size=100)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertEqual(chunk.symbols, ["Long"])
+            self.assertTrue(chunk.start == 0 or text[chunk.start - 1] == "\n")
+    
+    def test_unbalanced_braces_fall_back_to_lines(self):
+        """Unbalanced input is still covered by line-based chunks."""
+        text = "void f() {\n" + "    int x;\n" * 30
+        self.assert_covers(CppCodeSplitter(chunk_size=50), text, max_size=50)
+    
+    def test_document_metadata(self):
+        """Chunks keep the source metadata and add symbols and 1-based line ranges."""
+        splitter = CppCodeSplitter(chunk_size=160)
+        docs = splitter.split_documents([Document(page_content=SOURCE, metadata={"source": "src/txmempool.cpp"})])
+        lines = SOURCE.split("\n")
+        for doc in docs:
+            self.assertEqual(doc.metadata["source"], "src/txmempool.cpp")
+            start, end = doc.metadata["start_line"], doc.metadata["end_line"]
+            self.assertIn(doc.page_content, "\n".join(lines[start - 1:end]))
+            self.assertIn(doc.page_content.split("\n")[0], lines[start - 1])
+        check = [d for d in docs if d.metadata["symbol"] == "node::Mempool::Check"]
+        self.assertEqual(check[0].metadata["kind"], "function")
+        self.assertEqual(check[0].metadata["start_line"], 13)
+
+if __name__ == "__main__":
+    unittest.main()
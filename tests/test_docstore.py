@@ -0,0 +1,96 @@
+"""
+Tests for saving FAISS stores with a SQLite docstore and loading them lazily.
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from langchain_core.documents import Document
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+
+# Add the v3 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"))
+
+from embedding_switcher.docstore import SQLiteDocstore, VectorIdMap, save_index, load_index
+
+class TestVectorIdMap(unittest.TestCase):
+    """Test the arithmetic index_to_docstore_id mapping."""
+    
+    def test_maps_rows_to_string_ids(self):
+        """Row i maps to the id "i" and rows past the end are missing."""
+        ids = VectorIdMap(3)
+        self.assertEqual(dict(ids), {0: "0", 1: "1", 2: "2"})
+        self.assertEqual(len(ids), 3)
+        with self.assertRaises(KeyError):
+            ids[3]
+
+class TestSaveAndLoadIndex(unittest.TestCase):
+    """Test the save_index and load_index round trip."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name) / "index"
+        self.embeddings = FakeEmbeddings(size=16)
+        self.documents = [
+            Document(page_content=f"chunk {i}", metadata={"source": f"src/{i}.cpp", "start_line": i + 1})
+            for i in range(20)
+        ]
+        self.store = FAISS.from_documents(self.documents, self.embeddings)
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_round_trip_keeps_documents_by_vector_id(self):
+        """Every vector resolves to the document it was built from."""
+        save_index(self.store, self.folder)
+        self.assertFalse((self.folder / "index.pkl").exists())
+        loaded = load_index(self.folder, self.embeddings)
+        self.assertEqual(loaded.index.ntotal, 20)
+        for i in range(20):
+            original = self.store.docstore.search(self.store.index_to_docstore_id[i])
+            document = loaded.docstore.search(loaded.index_to_docstore_id[i])
+            self.assertEqual((document.page_content, document.metadata), (original.page_content, original.metadata))
+        self.assertEqual(len(loaded.docstore), 20)
+    
+    def test_docstore_is_opened_lazily(self):
+        """Loading reads no documents; a search reads only the hits."""
+        save_index(self.store, self.folder)
+        loaded = load_index(self.folder, self.embeddings)
+        self.assertIsNone(loaded.docstore._connection)
+        self.assertEqual(loaded.docstore.lookups, 0)
+        vector = self.store.index.reconstruct(7).tolist()
+        results = loaded.similarity_search_by_vector(vector, k=3)
+        self.assertEqual(results[0].page_content, "chunk 7")
+        self.assertEqual(loaded.docstore.lookups, 3)
+    
+    def test_search_matches_original_store(self):
+        """The loaded store answers queries like the one it was saved from."""
+        save_index(self.store, self.folder)
+        for mmap in (True, False):
+            loaded = load_index(self.folder, self.embeddings, mmap=mmap)
+            vector = self.embeddings.embed_query("chunk")
+            self.assertEqual(
+                [d.page_content for d in loaded.similarity_search_by_vector(vector, k=5)],
+                [d.page_content for d in self.store.similarity_search_by_vector(vector, k=5)]
+            )
+    
+    def test_missing_docstore(self):
+        """A folder without a docstore, e.g. an older pickled build, fails to load."""
+        self.store.save_local(str(self.folder))
+        with self.assertRaises(FileNotFoundError):
+            load_index(self.folder, self.embeddings)
+        with self.assertRaises(FileNotFoundError):
+            SQLiteDocstore(self.folder / "missing.sqlite").search("0")
+    
+    def test_unknown_id(self):
+        """An id without a row gives FAISS's not-found message."""
+        save_index(self.store, self.folder)
+        docstore = SQLiteDocstore(self.folder / "docstore.sqlite")
+        self.assertEqual(docstore.search("99"), "ID 99 not found.")
+        docstore.close()
+        self.assertIsInstance(docstore.search("0"), Document)
+
+if __name__ == "__main__":
+    unittest.main()
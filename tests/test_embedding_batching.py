@@ -0,0 +1,106 @@
+"""
+Tests for grouping adapter inputs into length-bucketed batches.
+"""
+
+import sys
+import time
+import threading
+import unittest
+from pathlib import Path
+
+# Add the v3 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"))
+
+from embedding_switcher.batching import MAX_LENGTH_SPREAD, plan_batches, prefetch
+
+class TestPlanBatches(unittest.TestCase):
+    """Test length ordering, the token budget and the batch size limit."""
+    
+    def assert_partition(self, batches, count):
+        """Every input is in exactly one batch."""
+        self.assertEqual(sorted(i for batch in batches for i in batch), list(range(count)))
+    
+    def test_inputs_are_sorted_longest_first(self):
+        """Batches hold inputs of similar length, longest batch first."""
+        lengths = [10, 100, 12, 90, 11, 95]
+        batches = plan_batches(lengths, max_batch_tokens=10000, max_batch_size=3)
+        self.assertEqual(batches, [[1, 5, 3], [2, 4, 0]])
+    
+    def test_padded_size_stays_within_token_budget(self):
+        """Batch count times longest member never exceeds max_batch_tokens."""
+        lengths = [64, 60, 58, 50, 40, 33, 20, 17, 9, 8, 5]
+        batches = plan_batches(lengths, max_batch_tokens=128, max_batch_size=32)
+        self.assert_partition(batches, len(lengths))
+        for batch in batches:
+            self.assertLessEqual(len(batch) * max(lengths[i] for i in batch), 128)
+        self.assertEqual(batches[0], [0, 1])
+    
+    def test_length_spread_closes_batch(self):
+        """An input more than MAX_LENGTH_SPREAD times shorter starts a new batch."""
+        lengths = [100, 100 // MAX_LENGTH_SPREAD, 100 // MAX_LENGTH_SPREAD - 1]
+        batches = plan_batches(lengths, max_batch_tokens=10000, max_batch_size=32)
+        self.assertEqual(batches, [[0, 1], [2]])
+    
+    def test_oversized_input_gets_its_own_batch(self):
+        """An input longer than the budget is still embedded, alone."""
+        batches = plan_batches([500, 10, 10], max_batch_tokens=100, max_batch_size=32)
+        self.assertEqual(batches, [[0], [1, 2]])
+    
+    def test_empty_input(self):
+        """No inputs give no batches."""
+        self.assertEqual(plan_batches([], max_batch_tokens=100, max_batch_size=8), [])
+
+class TestPrefetch(unittest.TestCase):
+    """Test producing items ahead of the consumer in a background thread."""
+    
+    def test_items_keep_their_order(self):
+        """Items arrive in the order produced, with and without the thread."""
+        for depth in (0, 1, 4):
+            self.assertEqual(list(prefetch(iter(range(50)), depth)), list(range(50)))
+    
+    def test_depth_zero_runs_inline(self):
+        """With depth 0 items are produced in the consumer's thread."""
+        def produce():
+            yield threading.current_thread()
+        self.assertIs(next(prefetch(produce(), 0)), threading.current_thread())
+    
+    def test_producer_runs_at_most_depth_ahead(self):
+        """The producer blocks once depth items are waiting."""
+        produced = []
+        def produce():
+            for i in range(20):
+                produced.append(i)
+                yield i
+        items = prefetch(produce(), 2)
+        self.assertEqual(next(items), 0)
+        time.sleep(0.3)
+        # One item consumed, two buffered and one waiting to be put
+        self.assertLessEqual(len(produced), 4)
+        items.close()
+    
+    def test_producer_exception_is_raised_in_consumer(self):
+        """An error while producing reaches the consumer after earlier items."""
+        def produce():
+            yield 1
+            raise ValueError("tokenizer failed")
+        items = prefetch(produce(), 2)
+        self.assertEqual(next(items), 1)
+        with self.assertRaisesRegex(ValueError, "tokenizer failed"):
+            next(items)
+    
+    def test_producer_stops_when_consumer_does(self):
+        """Closing the consumer early stops the producer thread."""
+        produced = []
+        def produce():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+        items = prefetch(produce(), 2)
+        next(items)
+        items.close()
+        time.sleep(0.3)
+        self.assertLess(len(produced), 10)
+        self.assertFalse(any(t.name == "embedding-prefetch" and t.is_alive() for t in threading.enumerate()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+Tests for serving embedders to local processes over a Unix socket.
+"""
+
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from contextlib import redirect_stdout
+from io import StringIO
+import numpy as np
+
+# Add the v3 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"))
+
+from embedding_switcher import EmbeddingSwitcher
+from embedding_switcher.base import BaseEmbeddingAdapter
+from embedding_switcher.query_cache import QueryEmbeddingCache
+from embedding_switcher.service import (
+    EmbeddingService, EmbeddingServiceClient, EmbeddingServiceUnavailable, ServiceEmbeddingAdapter
+)
+
+class LengthAdapter(BaseEmbeddingAdapter):
+    """Embeds a text as its length, and 0 or 1 for the pooling mode."""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def embed_documents_np(self, texts, dtype=np.float32, pooling="cls"):
+        self.calls.append(list(texts))
+        return np.array([[len(text), pooling == "mean"] for text in texts], dtype=dtype)
+    
+    def embed_documents(self, texts):
+        return self.embed_documents_np(texts).tolist()
+    
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+    
+    def get_model_info(self):
+        return {"name": "length"}
+
+class TestEmbeddingService(unittest.TestCase):
+    """Test requests over the socket, micro-batching and the client fallback."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.socket_path = str(Path(self.tmp.name) / "embeddings.sock")
+        self.adapter = LengthAdapter()
+        switcher = EmbeddingSwitcher()
+        switcher.register_adapter("codebert", self.adapter)
+        self.service = EmbeddingService(switcher, max_wait_ms=300)
+    
+    def tearDown(self):
+        self.service.shutdown()
+        self.tmp.cleanup()
+    
+    def start(self):
+        """Serve in a background thread and wait until the socket answers."""
+        def serve():
+            with redirect_stdout(StringIO()):
+                self.service.serve_forever(self.socket_path)
+        threading.Thread(target=serve, daemon=True).start()
+        client = EmbeddingServiceClient(self.socket_path, timeout=10)
+        for _ in range(100):
+            if client.available():
+                return client
+            time.sleep(0.05)
+        self.fail("Embedding service did not start")
+    
+    def test_default_served_models_follow_embedders(self):
+        """Only served names whose embedder is registered are served."""
+        self.assertEqual(self.service.served_models, {"codebert": ("codebert", "cls"),
+                                                      "codebert-mean": ("codebert", "mean")})
+    
+    def test_embed_over_socket(self):
+        """The client gets the matrix in input order with the served pooling."""
+        client = self.start()
+        self.assertEqual(client.ping()["models"], ["codebert", "codebert-mean"])
+        embeddings = client.embed("codebert", ["a", "abc", "ab"])
+        self.assertEqual(embeddings.dtype, np.float32)
+        np.testing.assert_array_equal(embeddings, [[1, 0], [3, 0], [2, 0]])
+        np.testing.assert_array_equal(client.embed("codebert-mean", ["abcd"]), [[4, 1]])
+        client.close()
+    
+    def test_errors_are_returned_to_the_client(self):
+        """An unknown model fails the request without closing the connection."""
+        client = self.start()
+        with self.assertRaisesRegex(RuntimeError, "not served"):
+            client.embed("unixcoder", ["a"])
+        self.assertEqual(client.embed("codebert", ["a"]).shape, (1, 2))
+        client.close()
+    
+    def test_concurrent_requests_share_a_forward_pass(self):
+        """Requests arriving within max_wait_ms are embedded in one call."""
+        barrier = threading.Barrier(4)
+        results = {}
+        def request(i):
+            barrier.wait()
+            results[i] = self.service.embed("codebert", ["x" * i] * 2)
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(1, 5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.adapter.calls), 1)
+        self.assertEqual(len(self.adapter.calls[0]), 8)
+        for i in range(1, 5):
+            np.testing.assert_array_equal(results[i][:, 0], [i, i])
+        self.assertEqual(self.service.stats()["micro_batches"]["codebert"]["batches"], 1)
+
+class TestServiceEmbeddingAdapter(unittest.TestCase):
+    """Test falling back to in-process embeddings."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.socket_path = str(Path(self.tmp.name) / "missing.sock")
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_fallback_is_built_once_when_service_is_missing(self):
+        """Without a service the fallback is built on first use and kept."""
+        built = []
+        def fallback():
+            built.append(LengthAdapter())
+            return built[-1]
+        adapter = ServiceEmbeddingAdapter("codebert", self.socket_path, fallback=fallback)
+        adapter.query_cache = QueryEmbeddingCache()
+        with redirect_stdout(StringIO()):
+            np.testing.assert_array_equal(adapter.embed_documents_np(["ab"]), [[2, 0]])
+            self.assertEqual(adapter.embed_query("abc"), [3.0, 0.0])
+            self.assertEqual(adapter.embed_query(" abc "), [3.0, 0.0])
+        self.assertEqual(len(built), 1)
+        self.assertEqual(built[0].calls, [["ab"], ["abc"]])
+        self.assertTrue(adapter.get_model_info()["in_process"])
+    
+    def test_missing_service_without_fallback_raises(self):
+        """Without a fallback the adapter reports the missing service."""
+        adapter = ServiceEmbeddingAdapter("codebert", self.socket_path)
+        with self.assertRaises(EmbeddingServiceUnavailable):
+            adapter.embed_documents(["a"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Tests for the token, truncation and latency statistics of embedding adapters.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+import numpy as np
+
+# Add the v3 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"))
+
+from embedding_switcher.stats import EmbeddingStats, LATENCY_BUCKETS_MS
+
+class TestEmbeddingStats(unittest.TestCase):
+    """Test counters, derived rates and the latency histogram."""
+    
+    def setUp(self):
+        self.stats = EmbeddingStats()
+    
+    def test_tokens_are_counted_from_attention_mask(self):
+        """Real tokens are mask ones; padded tokens are every computed position."""
+        mask = np.array([[1, 1, 1, 1], [1, 1, 0, 0]])
+        self.stats.record_batch(mask, 0.004)
+        self.stats.record_call(0.5)
+        self.assertEqual((self.stats.real_tokens, self.stats.padded_tokens), (6, 8))
+        self.assertAlmostEqual(self.stats.padding_ratio, 0.25)
+        self.assertAlmostEqual(self.stats.tokens_per_second, 12)
+    
+    def test_truncation_rate(self):
+        """Truncated documents are a fraction of all tokenized documents."""
+        self.stats.record_tokenization(8, 2, 0.1)
+        self.stats.record_tokenization(2, 0, 0.1)
+        self.assertAlmostEqual(self.stats.truncation_rate, 0.2)
+        self.assertAlmostEqual(self.stats.tokenize_seconds, 0.2)
+    
+    def test_latency_histogram_and_percentiles(self):
+        """Batches fall into latency buckets; percentiles give bucket upper bounds."""
+        mask = np.ones((1, 4))
+        for seconds in [0.003] * 9 + [0.150]:
+            self.stats.record_batch(mask, seconds)
+        latency = self.stats.as_dict()["batch_latency_ms"]
+        self.assertEqual(latency["histogram"]["<=5"], 9)
+        self.assertEqual(latency["histogram"]["<=200"], 1)
+        self.assertEqual(sum(latency["histogram"].values()), 10)
+        self.assertEqual(latency["p50"], 5.0)
+        self.assertAlmostEqual(latency["p95"], 150.0)
+        self.assertAlmostEqual(latency["max"], 150.0)
+    
+    def test_slow_batch_goes_to_overflow_bucket(self):
+        """A batch slower than the last bound is counted past it."""
+        self.stats.record_batch(np.ones((1, 1)), LATENCY_BUCKETS_MS[-1] / 1000 + 1)
+        self.assertEqual(self.stats.as_dict()["batch_latency_ms"]["histogram"][f">{LATENCY_BUCKETS_MS[-1]}"], 1)
+    
+    def test_reset_and_empty_stats(self):
+        """Reset zeroes everything and empty stats have no percentiles."""
+        self.stats.record_batch(np.ones((2, 2)), 0.01)
+        self.stats.record_tokenization(2, 1, 0.01)
+        self.stats.reset()
+        summary = self.stats.as_dict()
+        self.assertEqual((summary["real_tokens"], summary["batches"], summary["documents"]), (0, 0, 0))
+        self.assertEqual((summary["padding_ratio"], summary["truncation_rate"]), (0.0, 0.0))
+        self.assertIsNone(summary["batch_latency_ms"]["p50"])
+        self.assertIsNone(summary["batch_latency_ms"]["mean"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+Tests for loading embedders lazily and keeping only recently used ones resident.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from contextlib import redirect_stdout
+from io import StringIO
+
+# Add the v3 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"))
+
+from embedding_switcher import EmbeddingSwitcher
+from embedding_switcher.base import BaseEmbeddingAdapter
+
+class FakeAdapter(BaseEmbeddingAdapter):
+    """An adapter of a given size that records being closed."""
+    
+    def __init__(self, size=100):
+        self.size = size
+        self.closed = False
+    
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+    
+    def embed_query(self, text):
+        return [float(len(text))]
+    
+    def get_model_info(self):
+        return {"name": "fake"}
+    
+    def memory_bytes(self):
+        return self.size
+    
+    def close(self):
+        self.closed = True
+
+class TestEmbeddingSwitcher(unittest.TestCase):
+    """Test lazy loading and LRU unloading of factory embedders."""
+    
+    def setUp(self):
+        self.built = []
+        self.output = StringIO()
+    
+    def factory(self, name, size=100):
+        def build():
+            adapter = FakeAdapter(size)
+            self.built.append((name, adapter))
+            return adapter
+        return build
+    
+    def switcher(self, names, **kwargs):
+        switcher = EmbeddingSwitcher(**kwargs)
+        for name in names:
+            switcher.register_factory(name, self.factory(name))
+        return switcher
+    
+    def get(self, switcher, name):
+        with redirect_stdout(self.output):
+            return switcher.get_embeddings(name)
+    
+    def test_factories_load_on_first_use(self):
+        """Nothing is built until asked for, and then only once."""
+        switcher = self.switcher(["a", "b"])
+        self.assertEqual(switcher.list_embedders(), ["a", "b"])
+        self.assertEqual(switcher.resident_embedders(), [])
+        adapter = self.get(switcher, "a")
+        self.assertIs(self.get(switcher, "a"), adapter)
+        self.assertEqual([name for name, _ in self.built], ["a"])
+        with self.assertRaises(ValueError):
+            switcher.get_embeddings("missing")
+    
+    def test_max_resident_unloads_least_recently_used(self):
+        """Using an embedder protects it; the coldest one is unloaded and closed."""
+        switcher = self.switcher(["a", "b", "c"], max_resident=2)
+        first = self.get(switcher, "a")
+        self.get(switcher, "b")
+        self.get(switcher, "a")
+        self.get(switcher, "c")
+        self.assertEqual(switcher.resident_embedders(), ["a", "c"])
+        self.assertFalse(first.closed)
+        self.assertTrue(self.built[1][1].closed)
+    
+    def test_unloaded_embedder_is_rebuilt(self):
+        """An unloaded embedder is constructed again on its next use."""
+        switcher = self.switcher(["a", "b"], max_resident=1)
+        self.get(switcher, "a")
+        self.get(switcher, "b")
+        self.get(switcher, "a")
+        self.assertEqual([name for name, _ in self.built], ["a", "b", "a"])
+        stats = switcher.get_stats()["embedders"]
+        self.assertEqual((stats["a"]["loads"], stats["a"]["evictions"]), (2, 1))
+        self.assertEqual((stats["b"]["loads"], stats["b"]["evictions"]), (1, 1))
+    
+    def test_memory_budget_unloads_before_loading(self):
+        """Room is made for a reloaded model before it is built."""
+        switcher = EmbeddingSwitcher(memory_budget_bytes=250)
+        for name in "abc":
+            switcher.register_factory(name, self.factory(name, size=100))
+        self.get(switcher, "a")
+        self.get(switcher, "b")
+        self.assertEqual(switcher.resident_bytes(), 200)
+        self.get(switcher, "c")
+        self.assertEqual(switcher.resident_embedders(), ["b", "c"])
+        # a's size is known now, so b is unloaded before a is built again
+        self.get(switcher, "a")
+        self.assertTrue(self.built[1][1].closed)
+        self.assertLessEqual(switcher.resident_bytes(), 250)
+    
+    def test_registered_instances_are_never_unloaded(self):
+        """Adapters registered ready-made stay resident even over the limit."""
+        switcher = self.switcher(["b"], max_resident=1)
+        pinned = FakeAdapter()
+        switcher.register_adapter("a", pinned)
+        self.get(switcher, "b")
+        self.assertEqual(switcher.resident_embedders(), ["a", "b"])
+        self.assertFalse(pinned.closed)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Tests for building FAISS stores straight from adapter embedding matrices.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# Add the v3 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"))
+
+from embedding_switcher.base import BaseEmbeddingAdapter
+from embedding_switcher.vectorstore import add_documents_np, faiss_from_documents
+
+class OneHotAdapter(BaseEmbeddingAdapter, Embeddings):
+    """Embeds a text as a one-hot vector of its length, counting matrix calls."""
+    
+    def __init__(self):
+        self.matrix_calls = 0
+    
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+    
+    def embed_query(self, text):
+        vector = [0.0] * 16
+        vector[len(text) % 16] = 1.0
+        return vector
+    
+    def embed_documents_np(self, texts, dtype=np.float32):
+        self.matrix_calls += 1
+        return super().embed_documents_np(texts, dtype=dtype)
+    
+    def get_model_info(self):
+        return {"name": "one-hot"}
+
+def documents(lengths):
+    return [Document(page_content="x" * n, metadata={"length": n}) for n in lengths]
+
+class TestEmbeddingMatrix(unittest.TestCase):
+    """Test the default matrix conversion of adapters."""
+    
+    def test_matrix_is_contiguous_in_requested_dtype(self):
+        """embed_documents_np gives a C-contiguous matrix of the requested dtype."""
+        adapter = OneHotAdapter()
+        for dtype in (np.float32, np.float16):
+            matrix = adapter.embed_documents_np(["a", "bb", "ccc"], dtype=dtype)
+            self.assertEqual((matrix.shape, matrix.dtype), ((3, 16), dtype))
+            self.assertTrue(matrix.flags["C_CONTIGUOUS"])
+        self.assertEqual(adapter.memory_bytes(), 0)
+
+class TestFaissFromDocuments(unittest.TestCase):
+    """Test building and extending stores without float lists."""
+    
+    def setUp(self):
+        self.adapter = OneHotAdapter()
+    
+    def test_rows_map_to_their_documents(self):
+        """Each row resolves to its document and queries find it."""
+        store = faiss_from_documents(documents([1, 2, 3]), self.adapter)
+        self.assertEqual(self.adapter.matrix_calls, 1)
+        self.assertEqual(store.index.ntotal, 3)
+        for row, length in enumerate([1, 2, 3]):
+            self.assertEqual(store.docstore.search(store.index_to_docstore_id[row]).metadata["length"], length)
+        self.assertEqual(store.similarity_search("yy", k=1)[0].metadata["length"], 2)
+    
+    def test_precomputed_vectors_are_not_embedded_again(self):
+        """Given vectors, e.g. from a cache, the adapter is not called."""
+        vectors = self.adapter.embed_documents_np(["a", "bb"])
+        self.adapter.matrix_calls = 0
+        store = faiss_from_documents(documents([1, 2]), self.adapter, vectors=vectors)
+        add_documents_np(store, documents([3]), self.adapter, vectors=self.adapter.embed_documents_np(["ccc"]))
+        self.assertEqual(self.adapter.matrix_calls, 1)
+        self.assertEqual(store.index.ntotal, 3)
+    
+    def test_added_documents_continue_row_ids(self):
+        """Added rows are numbered after the existing ones; an empty add is a no-op."""
+        store = faiss_from_documents(documents([1, 2]), self.adapter)
+        add_documents_np(store, [], self.adapter)
+        add_documents_np(store, documents([4, 5]), self.adapter)
+        self.assertEqual(sorted(store.index_to_docstore_id), [0, 1, 2, 3])
+        self.assertEqual(store.docstore.search(store.index_to_docstore_id[3]).metadata["length"], 5)
+        self.assertEqual(store.similarity_search("zzzz", k=1)[0].metadata["length"], 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Tests for the v3 git blob loader and its chunk and embedding cache.
+"""
+
+import sys
+import importlib.util
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+from langchain_core.documents import Document
+
+# Add the v3 demo to path
+V3_DIR = Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"
+sys.path.append(str(V3_DIR))
+
+from git_blobs import BlobCache, GitBlobLoader
+
+class LineSplitter:
+    """Splits a document into one chunk per non-empty line."""
+    
+    def split_documents(self, documents):
+        return [
+            Document(page_content=line, metadata={"line": i})
+            for document in documents
+            for i, line in enumerate(document.page_content.splitlines())
+            if line
+        ]
+
+class CountingEmbedder:
+    """Deterministic embedder that records what it was asked to embed."""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(text), sum(map(ord, text)) % 97, 1.0] for text in texts], dtype=np.float32)
+
+def chunk(blob_sha, number):
+    return Document(page_content=f"{blob_sha} chunk {number}", metadata={"blob_sha": blob_sha, "blob_chunk": number})
+
+class TestBlobCache(unittest.TestCase):
+    """Test that cached embeddings are served per chunk."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = BlobCache(Path(self.tmp.name) / "blobs.sqlite")
+        self.embed = CountingEmbedder()
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_later_chunks_of_a_cached_blob_are_embedded(self):
+        """Chunks 2-3 of a blob are not served the vectors of chunks 0-1."""
+        first = [chunk("a", 0), chunk("a", 1)]
+        second = [chunk("a", 2), chunk("a", 3)]
+        self.cache.embed(first, "split", "model", self.embed)
+        vectors, cached = self.cache.embed(second, "split", "model", self.embed)
+        self.assertEqual(cached, 0)
+        np.testing.assert_array_equal(vectors, CountingEmbedder()([c.page_content for c in second]))
+    
+    def test_partial_entries_do_not_overwrite_others(self):
+        """A whole blob is served from chunks cached by several partial requests."""
+        everything = [chunk("a", i) for i in range(4)] + [chunk("b", 0)]
+        self.cache.embed(everything[2:4], "split", "model", self.embed)
+        self.cache.embed(everything[:2], "split", "model", self.embed)
+        self.cache.embed(everything[4:], "split", "model", self.embed)
+        vectors, cached = self.cache.embed(everything, "split", "model", self.embed)
+        self.assertEqual(cached, len(everything))
+        np.testing.assert_array_equal(vectors, CountingEmbedder()([c.page_content for c in everything]))
+    
+    def test_keys_separate_splitters_and_models(self):
+        """Embeddings are reused only for the same splitter and model."""
+        chunks = [chunk("a", 0)]
+        self.cache.embed(chunks, "split", "model", self.embed)
+        self.assertEqual(self.cache.embed(chunks, "split", "other", self.embed)[1], 0)
+        self.assertEqual(self.cache.embed(chunks, "other", "model", self.embed)[1], 0)
+        self.assertEqual(self.cache.embed(chunks, "split", "model", self.embed)[1], 1)
+
+class TestGitBlobLoader(unittest.TestCase):
+    """Test loading chunks straight from git objects."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = Path(self.tmp.name) / "repo"
+        (self.repo / "src").mkdir(parents=True)
+        (self.repo / "src" / "a.cpp").write_text("one\ntwo\nthree\n")
+        (self.repo / "src" / "b.h").write_text("four\n")
+        (self.repo / "notes.txt").write_text("skip\n")
+        self.git("init", "--quiet")
+        self.git("add", "-A")
+        self.git("commit", "--quiet", "-m", "Initial commit")
+        self.cache = BlobCache(Path(self.tmp.name) / "blobs.sqlite")
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def git(self, *args):
+        subprocess.run(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+                       cwd=self.repo, check=True, capture_output=True)
+    
+    def test_chunks_are_numbered_within_their_blob(self):
+        """Chunks carry blob_sha and their number within the blob."""
+        loader = GitBlobLoader(self.repo, LineSplitter(), "lines", self.cache)
+        chunks = loader.load("HEAD")
+        self.assertEqual([(c.metadata["source"], c.metadata["blob_chunk"]) for c in chunks],
+                         [("src/a.cpp", 0), ("src/a.cpp", 1), ("src/a.cpp", 2), ("src/b.h", 0)])
+        self.assertEqual(loader.blobs_read, 2)
+    
+    def test_cached_blobs_are_not_read_again(self):
+        """A second load reuses the cached chunks of unchanged blobs."""
+        GitBlobLoader(self.repo, LineSplitter(), "lines", self.cache).load("HEAD")
+        loader = GitBlobLoader(self.repo, LineSplitter(), "lines", self.cache)
+        self.assertEqual(len(loader.load("HEAD")), 4)
+        self.assertEqual((loader.blobs_read, loader.blobs_cached), (0, 2))
+
+class TestProgressiveStages(unittest.TestCase):
+    """Test that progressive build stages end on file boundaries."""
+    
+    def test_stage_ends_move_to_the_next_file(self):
+        """A stage never ends between two chunks of the same file."""
+        # Loaded by path, as v4 has a bitcoin_rag module too, and only here
+        # since it imports torch and LangChain
+        spec = importlib.util.spec_from_file_location("v3_bitcoin_rag", V3_DIR / "bitcoin_rag.py")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        file_boundary = module.file_boundary
+        chunks = [Document(page_content="", metadata={"source": source}) for source in "aaabbc"]
+        self.assertEqual([file_boundary(chunks, end) for end in range(8)], [0, 3, 3, 3, 5, 5, 6, 6])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Tests for the GitHubConnector mirror backend against a local bare repository.
+"""
+
+import sys
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from kno_sdk.github.connector import GitHubConnector
+
+def git(*args, cwd=None):
+    """Run git with a fixed identity and return its output."""
+    return subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+class TestGitHubMirror(unittest.TestCase):
+    """Test serving a repository from a local bare mirror."""
+    
+    def setUp(self):
+        """Create a bare "remote" repository with one commit."""
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.remote = root / "remote.git"
+        self.work = root / "work"
+        git("init", "--bare", "--quiet", "--initial-branch=master", str(self.remote))
+        git("clone", "--quiet", str(self.remote), str(self.work))
+        git("checkout", "--quiet", "-b", "master", cwd=self.work)
+        (self.work / "src").mkdir()
+        (self.work / "README.md").write_text("# readme\n")
+        (self.work / "src" / "main.cpp").write_text("int main() {}\n")
+        (self.work / "src" / "copy.cpp").write_text("int main() {}\n")
+        (self.work / "logo.png").write_bytes(b"\x89PNG\xff\xfe")
+        self.commit("Initial commit")
+        
+        self.repo = SimpleNamespace(full_name="owner/repo", default_branch="master", clone_url=str(self.remote))
+        self.cache_dir = root / "cache"
+    
+    def tearDown(self):
+        """Remove the repositories and the cache."""
+        self.tmp.cleanup()
+    
+    def commit(self, message):
+        git("add", "-A", cwd=self.work)
+        git("commit", "--quiet", "-m", message, cwd=self.work)
+        git("push", "--quiet", "origin", "master", cwd=self.work)
+    
+    def connector(self):
+        # No network: the API is never called by the mirror backend
+        return GitHubConnector("token", cache_dir=str(self.cache_dir), api_url="http://127.0.0.1:9", backend="mirror")
+    
+    def test_requires_cache_dir(self):
+        """The mirror backend needs somewhere to keep mirrors."""
+        with self.assertRaises(ValueError):
+            GitHubConnector("token", backend="mirror")
+    
+    def test_lists_files_from_mirror(self):
+        """Listings come from the mirror with sizes and blob SHAs."""
+        connector = self.connector()
+        files = {entry["path"]: entry for entry in connector.list_tree(self.repo)}
+        self.assertEqual(sorted(files), ["README.md", "logo.png", "src/copy.cpp", "src/main.cpp"])
+        self.assertEqual(files["src/main.cpp"]["size"], 14)
+        self.assertEqual(files["src/main.cpp"]["sha"], git("rev-parse", "HEAD:src/main.cpp", cwd=self.work))
+        self.assertEqual(connector.list_files(self.repo, "src", recursive=False), ["src/copy.cpp", "src/main.cpp"])
+        self.assertTrue((self.cache_dir / "mirrors" / "owner" / "repo.git" / "HEAD").exists())
+    
+    def test_reads_contents_and_metadata(self):
+        """Contents and metadata are read from the local object store."""
+        connector = self.connector()
+        self.assertEqual(connector.get_file_content(self.repo, "README.md"), "# readme\n")
+        self.assertIsNone(connector.get_file_content(self.repo, "missing.txt"))
+        self.assertEqual(connector.get_file_contents(self.repo), {
+            "README.md": "# readme\n",
+            "logo.png": None,
+            "src/copy.cpp": "int main() {}\n",
+            "src/main.cpp": "int main() {}\n"
+        })
+        metadata = connector.get_file_metadata(self.repo, "src/main.cpp")
+        self.assertEqual(metadata["sha"], git("rev-parse", "HEAD:src/main.cpp", cwd=self.work))
+        self.assertEqual(metadata["size"], 14)
+        self.assertTrue(metadata["last_modified"])
+        self.assertIsNone(connector.get_file_metadata(self.repo, "src"))
+    
+    def test_fetches_incrementally(self):
+        """New commits appear after a refresh, and a new connector reuses the mirror."""
+        connector = self.connector()
+        connector.list_tree(self.repo)
+        (self.work / "src" / "net.cpp").write_text("// net\n")
+        self.commit("Add net")
+        self.assertNotIn("src/net.cpp", connector.list_files(self.repo))
+        
+        connector.refresh(self.repo)
+        self.assertIn("src/net.cpp", connector.list_files(self.repo))
+        self.assertEqual(connector.mirror(self.repo).fetches, 2)
+        
+        (self.work / "src" / "net.cpp").write_text("// net v2\n")
+        self.commit("Change net")
+        other = self.connector()
+        self.assertEqual(other.get_file_content(self.repo, "src/net.cpp"), "// net v2\n")
+        self.assertEqual(other.mirror(self.repo).fetches, 1)
+    
+    def test_reads_other_refs(self):
+        """Tags are mirrored and can be listed."""
+        git("tag", "v1", cwd=self.work)
+        git("push", "--quiet", "origin", "v1", cwd=self.work)
+        (self.work / "README.md").unlink()
+        self.commit("Remove readme")
+        connector = self.connector()
+        self.assertIn("README.md", connector.list_files(self.repo, ref="v1"))
+        self.assertNotIn("README.md", connector.list_files(self.repo))
+
+if __name__ == "__main__":
+    unittest.main()
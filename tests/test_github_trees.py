@@ -0,0 +1,254 @@
+"""
+Tests for GitHubConnector listing and fetching against a local stand-in for the GitHub API.
+"""
+
+import io
+import sys
+import json
+import tarfile
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from kno_sdk.github.connector import GitHubConnector
+
+TREES = {
+    "root1": [
+        {"path": "README.md", "type": "blob", "sha": "b1", "size": 10},
+        {"path": "src", "type": "tree", "sha": "src1"},
+        {"path": "src/main.cpp", "type": "blob", "sha": "b2", "size": 200},
+        {"path": "src/wallet", "type": "tree", "sha": "wallet1"},
+        {"path": "src/wallet/wallet.cpp", "type": "blob", "sha": "b3", "size": 300},
+        {"path": "vendor", "type": "commit", "sha": "c9"}
+    ],
+    "root2": [
+        {"path": "README.md", "type": "blob", "sha": "b1", "size": 10},
+        {"path": "src", "type": "tree", "sha": "src2"},
+        {"path": "src/main.cpp", "type": "blob", "sha": "b4", "size": 250}
+    ]
+}
+
+BLOBS = {"b1": b"# readme\n", "b2": b"int main() {}\n", "b3": b"// wallet\n", "b4": b"\xff\xfe"}
+
+def direct_children(entries, prefix=""):
+    """Non-recursive listing of a tree from its recursive entries."""
+    children = []
+    for entry in entries:
+        if entry["path"].startswith(prefix) and "/" not in entry["path"][len(prefix):]:
+            children.append(dict(entry, path=entry["path"][len(prefix):]))
+    return children
+
+class FakeGitHub:
+    """State of the stand-in API: branches, and whether recursive listings are truncated."""
+    
+    def __init__(self):
+        self.branches = {"master": "root1"}
+        self.truncate = False
+        self.log = []
+    
+    def tarball(self, ref):
+        """Gzipped tarball of a tree, members under an owner-repo-sha/ directory."""
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for entry in self.tree(ref, True)[1]:
+                if entry["type"] == "blob":
+                    info = tarfile.TarInfo(f"owner-repo-abc123/{entry['path']}")
+                    info.size = len(BLOBS[entry["sha"]])
+                    archive.addfile(info, io.BytesIO(BLOBS[entry["sha"]]))
+        return buffer.getvalue()
+    
+    def tree(self, ref, recursive):
+        root = self.branches.get(ref, ref)
+        for sha, entries in TREES.items():
+            if sha == root:
+                return sha, entries if recursive else direct_children(entries)
+            for entry in entries:
+                if entry["sha"] == root:
+                    prefix = entry["path"] + "/"
+                    nested = [dict(e, path=e["path"][len(prefix):]) for e in entries if e["path"].startswith(prefix)]
+                    return root, nested if recursive else direct_children(nested)
+        return None, None
+
+def make_handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+        
+        def do_GET(self):
+            url = urlparse(self.path)
+            recursive = parse_qs(url.query).get("recursive") == ["1"]
+            parts = url.path.strip("/").split("/")
+            api.log.append((url.path, recursive, self.headers.get("If-None-Match")))
+            if parts[3:5] == ["git", "blobs"] and parts[5] in BLOBS:
+                self.send_body(BLOBS[parts[5]], "application/vnd.github.raw")
+                return
+            if parts[3:4] == ["tarball"]:
+                self.send_body(api.tarball(parts[4]), "application/x-gzip")
+                return
+            if parts[:1] != ["repos"] or parts[3:5] != ["git", "trees"]:
+                self.send_error(404)
+                return
+            sha, entries = api.tree(parts[5], recursive)
+            if sha is None:
+                self.send_error(404)
+                return
+            etag = f'"{sha}-{recursive}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            truncated = recursive and api.truncate and sha.startswith("root")
+            body = json.dumps({
+                "sha": sha,
+                "tree": entries[:2] if truncated else entries,
+                "truncated": truncated
+            }).encode()
+            self.send_body(body, "application/json", etag)
+        
+        def send_body(self, body, content_type, etag=None):
+            self.send_response(200)
+            if etag:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    return Handler
+
+class StandInAPITestCase(unittest.TestCase):
+    """Runs a stand-in API for each test."""
+    
+    def setUp(self):
+        """Start the stand-in API."""
+        self.api = FakeGitHub()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(self.api))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.repo = SimpleNamespace(full_name="owner/repo", default_branch="master")
+    
+    def tearDown(self):
+        """Stop the stand-in API."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.cache_dir.cleanup()
+    
+    def connector(self):
+        return GitHubConnector("token", cache_dir=self.cache_dir.name, api_url=self.api_url)
+
+class TestGitHubTrees(StandInAPITestCase):
+    """Test recursive tree listing with conditional caching."""
+    
+    def test_lists_repository_in_one_request(self):
+        """A whole repository is listed with one recursive request."""
+        files = self.connector().list_tree(self.repo)
+        self.assertEqual(files, [
+            {"path": "README.md", "size": 10, "sha": "b1"},
+            {"path": "src/main.cpp", "size": 200, "sha": "b2"},
+            {"path": "src/wallet/wallet.cpp", "size": 300, "sha": "b3"}
+        ])
+        self.assertEqual(self.api.log, [("/repos/owner/repo/git/trees/master", True, None)])
+    
+    def test_revalidates_with_etag(self):
+        """An unchanged branch is served from the cache after a 304, also by a new connector."""
+        connector = self.connector()
+        first = connector.list_tree(self.repo)
+        self.assertEqual(connector.list_tree(self.repo), first)
+        self.assertEqual(self.connector().list_tree(self.repo), first)
+        self.assertEqual([etag for _, _, etag in self.api.log], [None, '"root1-True"', '"root1-True"'])
+        self.assertEqual(connector.trees.not_modified, 1)
+    
+    def test_refetches_moved_branch(self):
+        """A branch pointing at a new tree is listed again."""
+        connector = self.connector()
+        connector.list_tree(self.repo)
+        self.api.branches["master"] = "root2"
+        paths = [entry["path"] for entry in connector.list_tree(self.repo)]
+        self.assertEqual(paths, ["README.md", "src/main.cpp"])
+    
+    def test_sha_ref_needs_no_request(self):
+        """A listing by full SHA is never revalidated."""
+        sha = "a" * 40
+        TREES[sha] = TREES["root1"]
+        try:
+            connector = self.connector()
+            first = connector.list_tree(self.repo, ref=sha)
+            self.assertEqual(connector.list_tree(self.repo, ref=sha), first)
+            self.assertEqual(len(self.api.log), 1)
+        finally:
+            del TREES[sha]
+    
+    def test_truncated_tree_falls_back_to_walking_subtrees(self):
+        """A truncated recursive listing is completed tree by tree."""
+        self.api.truncate = True
+        paths = [entry["path"] for entry in self.connector().list_tree(self.repo)]
+        self.assertEqual(sorted(paths), ["README.md", "src/main.cpp", "src/wallet/wallet.cpp"])
+    
+    def test_list_files_filters_by_path(self):
+        """list_files keeps its path and recursive semantics."""
+        connector = self.connector()
+        self.assertEqual(connector.list_files(self.repo, "src"), ["src/main.cpp", "src/wallet/wallet.cpp"])
+        self.assertEqual(connector.list_files(self.repo, "src", recursive=False), ["src/main.cpp"])
+        self.assertEqual(len(self.api.log), 2)
+
+class TestContentFetcher(StandInAPITestCase):
+    """Test bulk content fetching."""
+    
+    def setUp(self):
+        """Start the stand-in API with a tree that has a duplicate and a binary file."""
+        super().setUp()
+        TREES["root3"] = [
+            {"path": "a.cpp", "type": "blob", "sha": "b2", "size": 14},
+            {"path": "copy/a.cpp", "type": "blob", "sha": "b2", "size": 14},
+            {"path": "logo.png", "type": "blob", "sha": "b4", "size": 2},
+            {"path": "wallet.cpp", "type": "blob", "sha": "b3", "size": 10}
+        ]
+        self.api.branches["master"] = "root3"
+        self.expected = {
+            "a.cpp": "int main() {}\n",
+            "copy/a.cpp": "int main() {}\n",
+            "logo.png": None,
+            "wallet.cpp": "// wallet\n"
+        }
+    
+    def tearDown(self):
+        """Remove the extra tree."""
+        super().tearDown()
+        del TREES["root3"]
+    
+    def test_blobs_fetched_once_per_sha(self):
+        """Files sharing a blob cost one request between them."""
+        connector = self.connector()
+        self.assertEqual(connector.get_file_contents(self.repo, mode="blobs"), self.expected)
+        blob_requests = [path for path, _, _ in self.api.log if "/git/blobs/" in path]
+        self.assertEqual(sorted(blob_requests), [
+            "/repos/owner/repo/git/blobs/b2",
+            "/repos/owner/repo/git/blobs/b3",
+            "/repos/owner/repo/git/blobs/b4"
+        ])
+    
+    def test_archive_mode_streams_one_tarball(self):
+        """Archive mode gets every file from one tarball request."""
+        connector = self.connector()
+        contents = connector.get_file_contents(self.repo, paths=["a.cpp", "wallet.cpp"], mode="archive")
+        self.assertEqual(contents, {"a.cpp": "int main() {}\n", "wallet.cpp": "// wallet\n"})
+        self.assertEqual([path for path, _, _ in self.api.log if "/git/trees/" not in path],
+                         ["/repos/owner/repo/tarball/master"])
+    
+    def test_auto_mode_picks_archive_for_many_files(self):
+        """Auto mode switches to the tarball above the threshold."""
+        connector = self.connector()
+        connector.contents.archive_threshold = 2
+        self.assertEqual(connector.get_file_contents(self.repo), self.expected)
+        self.assertFalse(any("/git/blobs/" in path for path, _, _ in self.api.log))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Tests for BM25 identifier search and reciprocal rank fusion.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from typing import List
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Add the v4 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4"))
+
+from hybrid_search import BM25Index, HybridRetriever, reciprocal_rank_fusion, split_identifier, tokenize
+
+def doc(source, content):
+    return Document(page_content=content, metadata={"source": source})
+
+class ListRetriever(BaseRetriever):
+    """Returns a fixed ranking for any query."""
+    
+    documents: List[Document]
+    
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.documents
+
+class TestTokenize(unittest.TestCase):
+    """Test splitting code and questions into identifier terms."""
+    
+    def test_split_identifier(self):
+        """camelCase, PascalCase, snake_case and acronyms are split into parts."""
+        self.assertEqual(split_identifier("CheckTransaction"), ["check", "transaction"])
+        self.assertEqual(split_identifier("nMaxTxSize"), ["n", "max", "tx", "size"])
+        self.assertEqual(split_identifier("MAX_BLOCK_WEIGHT"), ["max", "block", "weight"])
+        self.assertEqual(split_identifier("HTTPRequest"), ["http", "request"])
+    
+    def test_tokenize_keeps_whole_identifiers_and_parts(self):
+        """Whole identifiers come first, then their parts; stopwords are dropped."""
+        self.assertEqual(tokenize("How does CheckBlock work?"), ["checkblock", "check", "block", "work"])
+        self.assertEqual(tokenize("if (x) return"), ["if", "return"])
+
+class TestBM25Index(unittest.TestCase):
+    """Test ranking chunks by identifier matches."""
+    
+    def setUp(self):
+        self.index = BM25Index()
+        self.index.add_documents([
+            doc("validation.cpp", "bool CheckBlock(const CBlock& block) { return CheckTransaction(block.vtx[0]); }"),
+            doc("tx_verify.cpp", "bool CheckTransaction(const CTransaction& tx) { return tx.vin.size() > 0; }"),
+            doc("net.cpp", "void CConnman::ThreadSocketHandler() { }")
+        ])
+    
+    def test_exact_symbol_ranks_first(self):
+        """The chunk defining a symbol outranks chunks that only call it."""
+        results = self.index.search("Where is CheckTransaction defined?")
+        self.assertEqual([d.metadata["source"] for d, _ in results], ["tx_verify.cpp", "validation.cpp"])
+        self.assertGreater(results[0][1], results[1][1])
+    
+    def test_partial_names_match(self):
+        """A question naming part of an identifier finds it."""
+        results = self.index.search("socket handler thread")
+        self.assertEqual(results[0][0].metadata["source"], "net.cpp")
+    
+    def test_no_match_and_empty_index(self):
+        """Nothing is returned when no term matches."""
+        self.assertEqual(self.index.search("mempool"), [])
+        self.assertEqual(BM25Index().search("CheckBlock"), [])
+    
+    def test_k_limits_results(self):
+        """At most k documents are returned."""
+        self.assertEqual(len(self.index.search("CheckTransaction block", k=1)), 1)
+
+class TestReciprocalRankFusion(unittest.TestCase):
+    """Test the order of fused rankings."""
+    
+    def test_items_found_by_both_rankings_come_first(self):
+        """An item ranked second by both lists beats items ranked first by one."""
+        fused = reciprocal_rank_fusion([
+            [("a", "A"), ("b", "B"), ("c", "C")],
+            [("d", "D"), ("b", "B"), ("e", "E")]
+        ], k=60)
+        self.assertEqual([item for item, _ in fused], ["B", "A", "D", "C", "E"])
+        self.assertAlmostEqual(fused[0][1], 2 / 62)
+    
+    def test_ties_keep_first_ranking_order(self):
+        """Items with equal scores stay in the order they were first seen."""
+        fused = reciprocal_rank_fusion([[("a", "A")], [("b", "B")]])
+        self.assertEqual([item for item, _ in fused], ["A", "B"])
+    
+    def test_damping_constant(self):
+        """A smaller k weights top ranks more strongly."""
+        fused = reciprocal_rank_fusion([[("a", "A"), ("b", "B")], [("b", "B")]], k=0)
+        self.assertEqual(dict(fused), {"B": 1.5, "A": 1.0})
+
+class TestHybridRetriever(unittest.TestCase):
+    """Test fusing dense results with the BM25 index."""
+    
+    def setUp(self):
+        self.docs = [
+            doc("a.cpp", "void ProcessMessage() {}"),
+            doc("b.cpp", "void SendMessages() {}"),
+            doc("c.cpp", "bool CheckBlock() {}")
+        ]
+        self.index = BM25Index()
+        self.index.add_documents(self.docs)
+        # Dense ranking misses the symbol the question names
+        self.retriever = HybridRetriever(
+            dense_retriever=ListRetriever(documents=[self.docs[0], self.docs[1]]),
+            lexical_index=self.index,
+            k=2
+        )
+    
+    def test_lexical_hit_is_fused_in(self):
+        """A chunk only BM25 finds can enter the top-k."""
+        results = self.retriever.invoke("CheckBlock")
+        self.assertEqual([d.metadata["source"] for d in results], ["a.cpp", "c.cpp"])
+    
+    def test_scored_search_scores_by_best_ranking(self):
+        """Each hit keeps its better score from the dense or lexical ranking."""
+        scored = self.retriever.scored_search("CheckBlock")
+        self.assertEqual([(d.metadata["source"], score) for d, score in scored], [("a.cpp", 1.0), ("c.cpp", 1.0)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Tests for publishing and looking up v3 index builds through the manifest.
+"""
+
+import sys
+import json
+import tempfile
+import unittest
+import multiprocessing
+from pathlib import Path
+
+# Add the v3 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"))
+
+from index_manifest import IndexKey, IndexManifest
+
+def key(subsystem="wallet", model="codebert", commit="a" * 40, **kwargs):
+    return IndexKey(subsystem, model, 1000, 0, commit, **kwargs)
+
+def write_marker(text):
+    """A save function writing one file into the build directory."""
+    def save(folder):
+        Path(folder).mkdir(parents=True)
+        (Path(folder) / "marker").write_text(text)
+    return save
+
+def publish_in_process(root, subsystem):
+    IndexManifest(Path(root)).publish(key(subsystem), write_marker(subsystem))
+
+class TestIndexKey(unittest.TestCase):
+    """Test key digests."""
+    
+    def test_digest_is_stable_and_covers_every_field(self):
+        """Equal keys share a digest; changing any field changes it."""
+        self.assertEqual(key().digest(), key().digest())
+        variants = [key(subsystem=None), key(model="unixcoder"), key(commit="b" * 40), key(files="abc"),
+                    IndexKey("wallet", "codebert", 500, 0, "a" * 40)]
+        digests = {variant.digest() for variant in variants}
+        self.assertEqual(len(digests | {key().digest()}), len(variants) + 1)
+        self.assertTrue(key(subsystem=None).slug().startswith("all-codebert-aaaaaaaaaa-"))
+
+class TestIndexManifest(unittest.TestCase):
+    """Test publishing builds atomically and keeping the previous build."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name) / "indexes"
+        self.manifest = IndexManifest(self.root)
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_lookup_returns_published_build(self):
+        """A key is unknown until published, then resolves to its build."""
+        self.assertIsNone(self.manifest.lookup(key()))
+        build = self.manifest.publish(key(), write_marker("v1"), {"documents": 3})
+        self.assertEqual(self.manifest.lookup(key()), build)
+        self.assertEqual((build / "marker").read_text(), "v1")
+        self.assertEqual(self.manifest.entry(key())["metadata"], {"documents": 3})
+        self.assertEqual(IndexManifest(self.root).lookup(key()), build)
+        self.assertIsNone(self.manifest.lookup(key(subsystem="p2p")))
+    
+    def test_rebuild_keeps_previous_build_once(self):
+        """A rebuild keeps the build it replaces and removes the one before that."""
+        first = self.manifest.publish(key(), write_marker("v1"))
+        second = self.manifest.publish(key(), write_marker("v2"))
+        self.assertTrue(first.exists())
+        third = self.manifest.publish(key(), write_marker("v3"))
+        self.assertFalse(first.exists())
+        self.assertTrue(second.exists())
+        self.assertEqual(self.manifest.lookup(key()), third)
+    
+    def test_failed_save_publishes_nothing(self):
+        """A save that raises leaves no staging directory and no entry."""
+        def fail(folder):
+            Path(folder).mkdir(parents=True)
+            raise RuntimeError("disk full")
+        with self.assertRaises(RuntimeError):
+            self.manifest.publish(key(), fail)
+        self.assertIsNone(self.manifest.entry(key()))
+        self.assertEqual(list((self.root / "builds").iterdir()), [])
+    
+    def test_older_manifest_versions_are_ignored(self):
+        """Builds recorded by an older manifest format are treated as missing."""
+        self.manifest.publish(key(), write_marker("v1"))
+        manifest = json.loads((self.root / "manifest.json").read_text())
+        manifest["version"] = 1
+        (self.root / "manifest.json").write_text(json.dumps(manifest))
+        self.assertIsNone(IndexManifest(self.root).lookup(key()))
+    
+    def test_concurrent_publishers_keep_every_entry(self):
+        """Processes publishing different keys at once all end up in the manifest."""
+        subsystems = ["wallet", "p2p", "mining", "validation"]
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=publish_in_process, args=(str(self.root), s)) for s in subsystems]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(sorted(e["key"]["subsystem"] for e in self.manifest.entries()), sorted(subsystems))
+        for subsystem in subsystems:
+            self.assertEqual((self.manifest.lookup(key(subsystem)) / "marker").read_text(), subsystem)
+
+if __name__ == "__main__":
+    unittest.main()
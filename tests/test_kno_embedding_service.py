@@ -0,0 +1,129 @@
+"""
+Tests for the kno_sdk embedding service client and the engine's fallback.
+"""
+
+import sys
+import time
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+import numpy as np
+
+# Add parent directory and the v3 demo, which has the service, to path
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"))
+
+from kno_sdk.embeddings import engine
+from kno_sdk.embeddings.service import EmbeddingServiceClient, EmbeddingServiceUnavailable
+from embedding_switcher import EmbeddingSwitcher
+from embedding_switcher.base import BaseEmbeddingAdapter
+from embedding_switcher.service import EmbeddingService
+
+MODEL = "all-MiniLM-L6-v2"
+
+class LengthAdapter(BaseEmbeddingAdapter):
+    """Embeds a text as its length."""
+    
+    def embed_documents_np(self, texts, dtype=np.float32):
+        return np.array([[len(text)] for text in texts], dtype=dtype)
+    
+    def embed_documents(self, texts):
+        return self.embed_documents_np(texts).tolist()
+    
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+    
+    def get_model_info(self):
+        return {"name": "length"}
+
+class LocalModel:
+    """Stands in for SentenceTransformer, embedding a text as minus its length."""
+    
+    def __init__(self, model_name):
+        self.calls = 0
+    
+    def encode(self, contents, convert_to_tensor=False):
+        self.calls += 1
+        return np.array([[-len(content)] for content in contents], dtype=np.float32)
+
+class TestKnoEmbeddingService(unittest.TestCase):
+    """Test reconnecting after a service restart and retrying after a failure."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.socket_path = str(Path(self.tmp.name) / "embeddings.sock")
+        self.service = None
+    
+    def tearDown(self):
+        self.stop()
+        self.tmp.cleanup()
+    
+    def start(self):
+        """Serve the length adapter in a background thread until the socket answers."""
+        switcher = EmbeddingSwitcher()
+        switcher.register_adapter(MODEL, LengthAdapter())
+        self.service = EmbeddingService(switcher, max_wait_ms=1)
+        service = self.service
+        def serve():
+            with redirect_stdout(StringIO()):
+                service.serve_forever(self.socket_path)
+        self.thread = threading.Thread(target=serve, daemon=True)
+        self.thread.start()
+        client = EmbeddingServiceClient(self.socket_path, timeout=10)
+        for _ in range(100):
+            if client.serves(MODEL):
+                client.close()
+                return
+            time.sleep(0.05)
+        self.fail("Embedding service did not start")
+    
+    def stop(self):
+        """Shut the service down and wait until its socket is removed."""
+        if self.service is not None:
+            self.service.shutdown()
+            self.thread.join(timeout=10)
+            self.service = None
+    
+    def test_client_reconnects_after_restart(self):
+        """A connection kept from before a restart is replaced transparently."""
+        self.start()
+        client = EmbeddingServiceClient(self.socket_path, timeout=10)
+        np.testing.assert_array_equal(client.embed(MODEL, ["ab"]), [[2]])
+        self.stop()
+        self.start()
+        np.testing.assert_array_equal(client.embed(MODEL, ["abc"]), [[3]])
+        client.close()
+    
+    def test_client_without_service(self):
+        """A missing service is reported as unavailable, not as another error."""
+        client = EmbeddingServiceClient(self.socket_path, timeout=1)
+        with self.assertRaises(EmbeddingServiceUnavailable):
+            client.embed(MODEL, ["a"])
+        self.assertFalse(client.serves(MODEL))
+    
+    def test_engine_returns_to_service_after_retry_window(self):
+        """The engine falls back while the service is down, then uses it again."""
+        self.start()
+        with mock.patch.object(engine, "SentenceTransformer", LocalModel):
+            embedder = engine.EmbeddingEngine(MODEL, EmbeddingServiceClient(self.socket_path, timeout=10),
+                                              service_retry_seconds=60)
+            self.assertIsNone(embedder.model)
+            np.testing.assert_array_equal(embedder._encode(["ab"]), [[2]])
+            
+            self.stop()
+            np.testing.assert_array_equal(embedder._encode(["ab"]), [[-2]])
+            self.start()
+            # Still inside the retry window
+            np.testing.assert_array_equal(embedder._encode(["ab"]), [[-2]])
+            self.assertEqual(embedder.model.calls, 2)
+            
+            embedder._service_retry_at = time.monotonic()
+            np.testing.assert_array_equal(embedder._encode(["abc"]), [[3]])
+            self.assertEqual(embedder.model.calls, 2)
+
+if __name__ == "__main__":
+    unittest.main()
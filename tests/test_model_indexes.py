@@ -0,0 +1,142 @@
+"""
+Tests for building one v3 index per embedding model in worker processes.
+"""
+
+import os
+import sys
+import hashlib
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+import yaml
+from langchain_core.embeddings import Embeddings
+
+# Imported by name rather than by path like the other v3 tests, so spawned
+# workers can unpickle bitcoin_rag._build_model_index; put first so the
+# name does not resolve to the v4 module
+V3_DIR = Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"
+sys.path.insert(0, str(V3_DIR))
+
+import bitcoin_rag
+from embedding_switcher import load_index
+from embedding_switcher.base import BaseEmbeddingAdapter
+from git_blobs import BlobCache
+from index_manifest import IndexManifest
+
+CONFIG = {
+    "embedding": {"chunk_size": 60, "chunk_overlap": 0, "cache_dir": "embedding_cache"},
+    "file_patterns": {"include": ["*.cpp"], "exclude": []}
+}
+
+# Adapters are module level so the factories pickle into spawned workers
+
+class HashAdapter(BaseEmbeddingAdapter, Embeddings):
+    """Deterministic embedder deriving each vector from a hash of the text."""
+    
+    salt = b"codebert"
+    
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+    
+    def embed_query(self, text):
+        return [float(b) for b in hashlib.sha256(self.salt + text.encode()).digest()[:8]]
+    
+    def get_model_info(self):
+        return {"name": "hash", "metrics": {"batching": {"effective_tokens_per_second": 0.0, "padding_ratio": 0.0}}}
+
+class OtherHashAdapter(HashAdapter):
+    """A second model, embedding the same text differently."""
+    
+    salt = b"unixcoder"
+
+class FailingAdapter(HashAdapter):
+    """A model that cannot be loaded in the worker."""
+    
+    def __init__(self):
+        raise OSError("model files missing")
+
+class CrashingAdapter(HashAdapter):
+    """A model whose worker process dies while loading it."""
+    
+    def __init__(self):
+        os._exit(1)
+
+class TestBuildModelIndexes(unittest.TestCase):
+    """Test parallel builds against serial ones over a small repository."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        # BitcoinRAG reads the repository and writes its cache relative to the working directory
+        os.chdir(self.tmp.name)
+        repo = Path("bitcoin")
+        (repo / "src").mkdir(parents=True)
+        for name, functions in (("validation", 3), ("net", 2)):
+            (repo / "src" / f"{name}.cpp").write_text(
+                "".join(f"int {name}_{i}(int x)\n{{\n    return x + {i};\n}}\n\n" for i in range(functions))
+            )
+        for args in (["init", "--quiet", "-b", "master"], ["add", "-A"], ["commit", "--quiet", "-m", "Initial commit"]):
+            subprocess.run(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+                           cwd=repo, check=True, capture_output=True)
+        Path("embedding_config.yaml").write_text(yaml.safe_dump(CONFIG))
+        
+        self.rag = bitcoin_rag.BitcoinRAG("embedding_config.yaml")
+        self.rag.embedding_switcher.register_factory("codebert", HashAdapter)
+        self.rag.embedding_switcher.register_factory("unixcoder", OtherHashAdapter)
+    
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+    
+    def test_workers_match_a_serial_build(self):
+        """Each worker publishes the index a serial build of its model would."""
+        models = ["codebert", "unixcoder"]
+        reports = self.rag.build_model_indexes(models, max_workers=2)
+        self.assertEqual([report["model"] for report in reports], models)
+        self.assertTrue(all((report["chunks"], report["cached_chunks"]) == (5, 0) for report in reports))
+        keys = {name: self.rag.index_key(model_name=name) for name in models}
+        parallel = {name: self.rag.indexes.entry(key) for name, key in keys.items()}
+        parallel_dirs = {name: self.rag.indexes.lookup(key) for name, key in keys.items()}
+        
+        # Build serially into a separate blob cache and manifest so nothing is reused
+        self.rag.blob_cache = BlobCache(Path("serial.sqlite"))
+        self.rag.indexes = IndexManifest(Path("serial"))
+        chunks = self.rag.load_repository()
+        for name in models:
+            self.rag.create_embeddings(chunks, name)
+            self.assertEqual(self.rag.indexes.entry(keys[name])["metadata"], parallel[name]["metadata"])
+            
+            built = load_index(parallel_dirs[name], None)
+            serial = load_index(self.rag.indexes.lookup(keys[name]), None)
+            self.assertEqual(built.index.reconstruct_n(0, built.index.ntotal).tolist(),
+                             serial.index.reconstruct_n(0, serial.index.ntotal).tolist())
+            self.assertEqual([built.docstore.search(str(i)) for i in range(built.index.ntotal)],
+                             [serial.docstore.search(str(i)) for i in range(serial.index.ntotal)])
+        
+        # Each worker embedded with its own model's factory
+        first_vectors = [load_index(parallel_dirs[name], None).index.reconstruct(0).tolist() for name in models]
+        self.assertNotEqual(first_vectors[0], first_vectors[1])
+    
+    def test_failing_worker_raises(self):
+        """An adapter that fails in its worker raises, naming the model."""
+        self.rag.embedding_switcher.register_factory("unixcoder", FailingAdapter)
+        with self.assertRaisesRegex(RuntimeError, "unixcoder index failed: model files missing"):
+            self.rag.build_model_indexes(["unixcoder"], max_workers=1)
+        self.assertIsNone(self.rag.indexes.lookup(self.rag.index_key(model_name="unixcoder")))
+    
+    def test_crashed_worker_raises(self):
+        """A worker process that dies raises rather than leaving its index silently missing."""
+        self.rag.embedding_switcher.register_factory("unixcoder", CrashingAdapter)
+        with self.assertRaisesRegex(RuntimeError, "unixcoder index failed"):
+            self.rag.build_model_indexes(["unixcoder"], max_workers=1)
+        self.assertIsNone(self.rag.indexes.lookup(self.rag.index_key(model_name="unixcoder")))
+    
+    def test_unregistered_models_are_rejected(self):
+        """Only embedders registered as factories can be built in workers."""
+        self.rag.embedding_switcher.register_adapter("local", HashAdapter())
+        with self.assertRaises(ValueError):
+            self.rag.build_model_indexes(["codebert", "local"])
+
+if __name__ == "__main__":
+    unittest.main()
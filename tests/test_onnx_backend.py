@@ -0,0 +1,149 @@
+"""
+Tests for exporting encoders to ONNX and running them with ONNX Runtime.
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+import numpy as np
+import torch
+from tokenizers import ByteLevelBPETokenizer
+from transformers import RobertaConfig, RobertaModel, RobertaTokenizerFast
+
+# Add the v3 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"))
+
+from embedding_switcher import CodeBERTAdapter
+from embedding_switcher.onnx_backend import OnnxEncoder, _cosine_drift, check_parity, export_onnx, onnx_model_path
+
+SAMPLES = ["int main() { return 0; }", "bool CheckBlock(const CBlock& block);",
+           "static const unsigned int MAX_BLOCK_WEIGHT = 4000000;"]
+
+class FakeTokenizer:
+    """Gives the export a fixed dummy batch of token ids."""
+    
+    def __call__(self, texts, return_tensors="pt"):
+        input_ids = torch.tensor([[0, 5, 6, 7, 2]] * len(texts))
+        return {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+
+def tiny_encoder():
+    """A randomly initialized one-layer RoBERTa, so no weights are downloaded."""
+    torch.manual_seed(0)
+    config = RobertaConfig(vocab_size=100, hidden_size=32, num_hidden_layers=1, num_attention_heads=2,
+                           intermediate_size=64, max_position_embeddings=64)
+    return RobertaModel(config).eval()
+
+def save_tiny_model(folder):
+    """Save a tiny tokenizer and encoder that load like a HuggingFace model name."""
+    Path(folder).mkdir(parents=True)
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(SAMPLES * 10, vocab_size=300,
+                            special_tokens=["<s>", "<pad>", "</s>", "<unk>", "<mask>"])
+    bpe.save(str(Path(folder) / "tokenizer.json"))
+    tokenizer = RobertaTokenizerFast(tokenizer_file=str(Path(folder) / "tokenizer.json"), model_max_length=64)
+    tokenizer.save_pretrained(folder)
+    torch.manual_seed(0)
+    config = RobertaConfig(vocab_size=len(tokenizer), hidden_size=32, num_hidden_layers=1, num_attention_heads=2,
+                           intermediate_size=64, max_position_embeddings=80, pad_token_id=tokenizer.pad_token_id)
+    RobertaModel(config).save_pretrained(folder)
+
+def padded_batch():
+    """Two inputs of different lengths, the shorter one padded."""
+    input_ids = np.array([[0, 11, 12, 13, 14, 15, 16, 2], [0, 21, 22, 2, 1, 1, 1, 1]], dtype=np.int64)
+    attention_mask = (input_ids != 1).astype(np.int64)
+    attention_mask[:, 0] = 1
+    return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+class TestOnnxBackend(unittest.TestCase):
+    """Test the export cache and parity with the torch model."""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.model = tiny_encoder()
+        cls.path = export_onnx(cls.model, FakeTokenizer(), "test/tiny-roberta", cls.tmp.name)
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+    
+    def torch_hidden(self, inputs):
+        """Hidden states of the torch model for numpy inputs."""
+        with torch.no_grad():
+            return self.model(**{k: torch.from_numpy(v) for k, v in inputs.items()}).last_hidden_state.numpy()
+    
+    def test_export_is_cached_by_model_name(self):
+        """The graph is written once under the model's cache path and reused."""
+        self.assertEqual(self.path, onnx_model_path(self.tmp.name, "test/tiny-roberta"))
+        self.assertEqual(self.path.parent.name, "test--tiny-roberta")
+        mtime = self.path.stat().st_mtime_ns
+        self.assertEqual(export_onnx(self.model, FakeTokenizer(), "test/tiny-roberta", self.tmp.name), self.path)
+        self.assertEqual(self.path.stat().st_mtime_ns, mtime)
+        self.assertEqual(list(self.path.parent.glob("*.tmp")), [])
+    
+    def test_onnx_matches_torch_on_other_shapes(self):
+        """Batch and sequence axes are dynamic and outputs match torch."""
+        encoder = OnnxEncoder(self.path, num_threads=1)
+        inputs = padded_batch()
+        hidden = encoder.last_hidden_state(inputs)
+        self.assertEqual(hidden.shape, (2, 8, 32))
+        np.testing.assert_allclose(hidden, self.torch_hidden(inputs), atol=1e-4)
+        np.testing.assert_allclose(encoder.cls_embeddings(inputs), hidden[:, 0, :])
+    
+    def test_int8_graph_stays_close_to_torch(self):
+        """The quantized graph is cached separately and drifts little."""
+        path = export_onnx(self.model, FakeTokenizer(), "test/tiny-roberta", self.tmp.name, quantize=True)
+        self.assertEqual(path, onnx_model_path(self.tmp.name, "test/tiny-roberta", quantize=True))
+        self.assertNotEqual(path, self.path)
+        inputs = padded_batch()
+        quantized = OnnxEncoder(path).cls_embeddings(inputs)
+        drift = _cosine_drift(self.torch_hidden(inputs)[:, 0, :], quantized)
+        self.assertLess(drift.max(), 0.05)
+
+class TestOnnxAdapter(unittest.TestCase):
+    """Test that ONNX-backed adapters do not keep the torch model loaded."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.model_dir = str(Path(self.tmp.name) / "tiny-roberta")
+        self.cache_dir = str(Path(self.tmp.name) / "onnx")
+        save_tiny_model(self.model_dir)
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def adapter(self, backend):
+        """A CPU adapter over the tiny model, with inline tokenization."""
+        return CodeBERTAdapter(self.model_dir, max_length=64, device="cpu", backend=backend,
+                               onnx_cache_dir=self.cache_dir, prefetch_batches=0)
+    
+    def test_torch_model_is_released_after_export(self):
+        """Only the ONNX session stays resident and its size is reported."""
+        adapter = self.adapter("onnx")
+        self.assertIsNone(adapter._model)
+        path = onnx_model_path(self.cache_dir, self.model_dir)
+        self.assertEqual(adapter.memory_bytes(), path.stat().st_size)
+        self.assertEqual(adapter.embed_documents_np(SAMPLES).shape, (3, 32))
+        self.assertIsNone(adapter._model)
+        torch_adapter = self.adapter("torch")
+        self.assertEqual(adapter.get_model_info()["parameters"], torch_adapter.get_model_info()["parameters"])
+        self.assertGreater(torch_adapter.memory_bytes(), 0)
+    
+    def test_cached_graph_is_used_without_loading_torch(self):
+        """With the graph cached, the torch weights are never read."""
+        self.adapter("onnx")
+        with mock.patch("embedding_switcher.base.AutoModel.from_pretrained", side_effect=AssertionError):
+            adapter = self.adapter("onnx")
+        self.assertEqual(adapter.embed_documents_np(SAMPLES[:1]).shape, (1, 32))
+    
+    def test_parity_check_loads_and_releases_torch(self):
+        """A parity check compares against torch, then frees it again."""
+        adapter = self.adapter("onnx")
+        report = check_parity(adapter, SAMPLES)
+        self.assertTrue(report["passed"], report)
+        self.assertIsNone(adapter._model)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Tests for include/exclude glob matching and pruned directory walks.
+"""
+
+import os
+import sys
+import fnmatch
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add the v4 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4"))
+
+from path_matcher import PathMatcher, cached_matcher
+
+# Exclude patterns written for fnmatch, as in test_rag_variations.py
+FNMATCH_EXCLUDES = [
+    "*/test/*", "*/bench/*", "*/fuzzing/*", "*/qt/*", "*/leveldb/*",
+    "*_test.cpp", "*_tests.cpp", "*_bench.cpp", "*_fuzzer.cpp", "*_mock.cpp", "*_mock.h"
+]
+
+PATHS = [
+    "src/validation.cpp",
+    "src/wallet/wallet.cpp",
+    "src/wallet/test/util.cpp",
+    "src/wallet/test/fuzz/coins.cpp",
+    "src/test/util/setup_common.h",
+    "src/bench/bench.cpp",
+    "src/qt/forms/main.h",
+    "src/leveldb/db/db_impl.cc",
+    "src/net_test.cpp",
+    "src/addrman_tests.cpp",
+    "src/wallet/wallet_mock.h",
+    "src/testing.cpp",
+    "src/contest/test.cpp"
+]
+
+class TestPatterns(unittest.TestCase):
+    """Test which paths single patterns select."""
+    
+    def test_fnmatch_excludes_keep_their_meaning(self):
+        """Patterns written for fnmatch exclude the same files they used to."""
+        matcher = PathMatcher(exclude=FNMATCH_EXCLUDES)
+        for path in PATHS:
+            excluded = any(fnmatch.fnmatch(path, pattern) for pattern in FNMATCH_EXCLUDES)
+            self.assertEqual(matcher.matches(path), not excluded, path)
+    
+    def test_patterns_match_like_fnmatch(self):
+        """Patterns without ** select the files fnmatch selected before."""
+        patterns = ["*.cpp", "src/*.cpp", "src/wallet/*", "*test*", "src/validation.cpp", "*/test/*"]
+        for pattern in patterns:
+            matcher = PathMatcher([pattern])
+            for path in PATHS:
+                self.assertEqual(matcher.matches(path), fnmatch.fnmatch(path, pattern), (pattern, path))
+    
+    def test_star_crosses_directories_in_includes(self):
+        """src/*.cpp and src/wallet/* reach nested files; *test* selects src/test."""
+        self.assertTrue(PathMatcher(["src/*.cpp"]).matches("src/wallet/wallet.cpp"))
+        self.assertTrue(PathMatcher(["src/wallet/*"]).matches("src/wallet/rpc/x.cpp"))
+        self.assertTrue(PathMatcher(["*test*"]).matches("src/test/util/setup_common.h"))
+        matcher = PathMatcher(["src/wallet/*"])
+        self.assertTrue(matcher.prunes("src/qt"))
+        self.assertFalse(matcher.prunes("src"))
+        self.assertFalse(matcher.prunes("src/wallet/rpc"))
+    
+    def test_leading_star_spans_directories(self):
+        """A nested test directory is excluded by */test/*."""
+        matcher = PathMatcher(["*.cpp"], ["*/test/*"])
+        self.assertFalse(matcher.matches("src/wallet/test/util.cpp"))
+        self.assertFalse(matcher.matches("src/test/util/setup_common.cpp"))
+        self.assertTrue(matcher.matches("src/wallet/wallet.cpp"))
+        self.assertTrue(matcher.prunes("src/wallet/test/fuzz"))
+    
+    def test_name_patterns_match_at_any_depth(self):
+        """A pattern without a slash matches names in any directory."""
+        matcher = PathMatcher(["*.h"])
+        self.assertTrue(matcher.matches("init.h"))
+        self.assertTrue(matcher.matches("src/wallet/db.h"))
+        self.assertFalse(matcher.matches("src/wallet/db.cpp"))
+    
+    def test_slash_patterns_are_anchored(self):
+        """Patterns with a slash are relative to the root."""
+        matcher = PathMatcher(["src/consensus/*.cpp", "src/validation.cpp"])
+        self.assertTrue(matcher.matches("src/consensus/merkle.cpp"))
+        self.assertTrue(matcher.matches("src/validation.cpp"))
+        self.assertFalse(matcher.matches("lib/src/validation.cpp"))
+        self.assertTrue(matcher.prunes("src/wallet"))
+    
+    def test_double_star_matches_any_depth(self):
+        """** matches zero or more directories and a single * stays in a segment."""
+        matcher = PathMatcher(["src/**/*.cpp", "doc/**/*.md"])
+        self.assertTrue(matcher.matches("src/init.cpp"))
+        self.assertTrue(matcher.matches("src/wallet/rpc/coins.cpp"))
+        self.assertFalse(matcher.matches("doc/init.cpp"))
+        self.assertTrue(matcher.matches("doc/release-notes/notes.md"))
+        self.assertFalse(PathMatcher(["src/**/wallet/*.cpp"]).matches("src/wallet/rpc/coins.cpp"))
+    
+    def test_excluded_directory_excludes_subtree(self):
+        """An exclude matching a directory drops everything below it."""
+        matcher = PathMatcher(["*.cpp"], ["src/qt"])
+        self.assertFalse(matcher.matches("src/qt/forms/main.cpp"))
+        self.assertTrue(matcher.prunes("src/qt"))
+        self.assertTrue(matcher.matches("src/qtx/main.cpp"))
+    
+    def test_matchers_are_cached_per_pattern_tuple(self):
+        """The same pattern tuples share one compiled matcher."""
+        self.assertIs(cached_matcher(("*.cpp",), ("src/qt",)), cached_matcher(("*.cpp",), ("src/qt",)))
+        self.assertIsNot(cached_matcher(("*.cpp",)), cached_matcher(("*.h",)))
+
+class TestWalk(unittest.TestCase):
+    """Test walking a directory tree."""
+    
+    def test_walk_selects_and_prunes(self):
+        """walk yields selected files and does not enter excluded directories."""
+        with tempfile.TemporaryDirectory() as root:
+            for path in PATHS:
+                Path(root, path).parent.mkdir(parents=True, exist_ok=True)
+                Path(root, path).write_text("")
+            matcher = PathMatcher(["*.cpp", "*.h"], FNMATCH_EXCLUDES)
+            found = sorted(os.path.relpath(path, root).replace(os.sep, "/") for path in matcher.walk(root))
+            self.assertEqual(found, [
+                "src/contest/test.cpp",
+                "src/testing.cpp",
+                "src/validation.cpp",
+                "src/wallet/wallet.cpp"
+            ])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+"""
+Tests for building v3 indexes progressively and reporting their coverage.
+"""
+
+import os
+import sys
+import hashlib
+import importlib.util
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+import yaml
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# Add the v3 demo to path
+V3_DIR = Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"
+sys.path.append(str(V3_DIR))
+
+from embedding_switcher import load_index
+from embedding_switcher.base import BaseEmbeddingAdapter
+
+# Loaded by path, as v4 has a bitcoin_rag module too
+spec = importlib.util.spec_from_file_location("v3_bitcoin_rag", V3_DIR / "bitcoin_rag.py")
+v3_bitcoin_rag = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(v3_bitcoin_rag)
+
+# Functions per file; with a 60 character chunk size each is one chunk
+FILES = {
+    "src/net.cpp": 2,
+    "src/validation.cpp": 2,
+    "src/validation/checks.cpp": 3,
+    "src/validation/rules.h": 2,
+    "src/validation/state.cpp": 4,
+    "src/validationinterface.cpp": 3
+}
+
+CONFIG = {
+    "embedding": {"chunk_size": 60, "chunk_overlap": 0, "cache_dir": "embedding_cache"},
+    "subsystems": {"validation": {"key_files": ["validation.cpp"]}},
+    "file_patterns": {"include": ["*.cpp", "*.h"], "exclude": []}
+}
+
+class HashAdapter(BaseEmbeddingAdapter, Embeddings):
+    """Deterministic embedder deriving each vector from a hash of the text."""
+    
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+    
+    def embed_query(self, text):
+        return [float(b) for b in hashlib.sha256(text.encode()).digest()[:8]]
+    
+    def get_model_info(self):
+        return {"name": "hash"}
+
+def make_repository(path: Path):
+    """Commit FILES, each with its number of one-line functions, to a new repository."""
+    for name, functions in FILES.items():
+        source = path / name
+        source.parent.mkdir(parents=True, exist_ok=True)
+        stem = source.stem
+        source.write_text("".join(f"int {stem}_{i}(int x)\n{{\n    return x + {i};\n}}\n\n"
+                                  for i in range(functions)))
+    for args in (["init", "--quiet", "-b", "master"], ["add", "-A"], ["commit", "--quiet", "-m", "Initial commit"]):
+        subprocess.run(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+                       cwd=path, check=True, capture_output=True)
+
+def sources(chunks):
+    return [chunk.metadata["source"] for chunk in chunks]
+
+class TestCoverageMetadata(unittest.TestCase):
+    """Test the coverage recorded with each published build."""
+    
+    def test_counts_chunks_and_files(self):
+        """Chunk and file counts are taken over the indexed and total chunks."""
+        total = [Document(page_content="", metadata={"source": source}) for source in "aaabbc"]
+        self.assertEqual(v3_bitcoin_rag.coverage_metadata(total[:4], total), {
+            "chunks": 4, "chunks_total": 6, "files": 2, "files_total": 3, "coverage": 66.7, "complete": False
+        })
+        self.assertEqual(v3_bitcoin_rag.coverage_metadata(total, total)["coverage"], 100.0)
+        self.assertTrue(v3_bitcoin_rag.coverage_metadata(total, total)["complete"])
+    
+    def test_empty_subsystem_is_complete(self):
+        """Nothing to index counts as full coverage rather than dividing by zero."""
+        metadata = v3_bitcoin_rag.coverage_metadata([], [])
+        self.assertEqual((metadata["coverage"], metadata["complete"]), (100.0, True))
+    
+    def test_file_boundary_is_capped_at_the_chunk_count(self):
+        """A stage end past the last chunk ends at the last chunk."""
+        chunks = [Document(page_content="", metadata={"source": source}) for source in "aab"]
+        self.assertEqual(v3_bitcoin_rag.file_boundary(chunks, 10), 3)
+        self.assertEqual(v3_bitcoin_rag.file_boundary([], 4), 0)
+
+class TestProgressiveBuild(unittest.TestCase):
+    """Test staged builds over a small repository with a fake embedder."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        # BitcoinRAG reads the repository and writes its cache relative to the working directory
+        os.chdir(self.tmp.name)
+        make_repository(Path("bitcoin"))
+        Path("embedding_config.yaml").write_text(yaml.safe_dump(CONFIG))
+        self.rag = v3_bitcoin_rag.BitcoinRAG("embedding_config.yaml")
+        self.rag.embedding_switcher.register_adapter("codebert", HashAdapter())
+    
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+    
+    def published_sources(self, key):
+        """Sources of the chunks in the build the manifest points a key at."""
+        vector_store = load_index(self.rag.indexes.lookup(key), HashAdapter())
+        ids = vector_store.index_to_docstore_id
+        return sources(vector_store.docstore.search(ids[i]) for i in range(len(ids)))
+    
+    def test_coverage_grows_by_stage(self):
+        """Key files come first, then each stage about doubles the chunk count."""
+        key = self.rag.index_key("validation")
+        stages = list(self.rag._progressive_build(key))
+        self.assertEqual([stage["chunks"] for stage in stages], [2, 5, 10, 14])
+        self.assertEqual([stage["coverage"] for stage in stages], [14.3, 35.7, 71.4, 100.0])
+        self.assertEqual([stage["files"] for stage in stages], [1, 2, 4, 5])
+        self.assertTrue(all(stage["chunks_total"] == 14 and stage["files_total"] == 5 for stage in stages))
+        self.assertEqual([stage["complete"] for stage in stages], [False, False, False, True])
+        self.assertEqual(self.rag.indexes.entry(key)["metadata"], stages[-1])
+    
+    def test_published_stages_never_split_a_file(self):
+        """Every build published along the way holds all or none of a file's chunks."""
+        key = self.rag.index_key("validation")
+        for stage in self.rag._progressive_build(key):
+            published = self.published_sources(key)
+            self.assertEqual(len(published), stage["chunks"])
+            for source in set(published):
+                self.assertEqual(published.count(source), FILES[source])
+            self.assertIn("src/validation.cpp", published)
+            self.assertNotIn("src/net.cpp", published)
+    
+    def test_first_stage_without_key_files_ends_on_a_file_boundary(self):
+        """Without key files the first stage is PROGRESSIVE_FIRST_CHUNKS, moved to the end of a file."""
+        self.rag.config["subsystems"] = {}
+        key = self.rag.index_key()
+        with mock.patch.object(v3_bitcoin_rag, "PROGRESSIVE_FIRST_CHUNKS", 3):
+            first = next(self.rag._progressive_build(key))
+        self.assertEqual(first["chunks"], 4)
+        self.assertEqual(sorted(set(self.published_sources(key))), ["src/net.cpp", "src/validation.cpp"])
+    
+    def test_lower_coverage_is_not_published(self):
+        """Restarting an interrupted build does not replace its build with a smaller one."""
+        key = self.rag.index_key("validation")
+        stages = self.rag._progressive_build(key)
+        next(stages)
+        next(stages)
+        interrupted = self.rag.indexes.lookup(key)
+        
+        restarted = self.rag._progressive_build(key)
+        self.assertEqual(next(restarted)["chunks"], 2)
+        self.assertEqual(self.rag.indexes.lookup(key), interrupted)
+        self.assertEqual(self.rag.indexes.entry(key)["metadata"]["chunks"], 5)
+        self.assertEqual(next(restarted)["chunks"], 5)
+        self.assertEqual(self.rag.indexes.lookup(key), interrupted)
+        self.assertEqual(next(restarted)["chunks"], 10)
+        self.assertNotEqual(self.rag.indexes.lookup(key), interrupted)
+    
+    def test_unknown_subsystem_is_rejected(self):
+        """A subsystem matching no files raises instead of publishing an empty index."""
+        key = self.rag.index_key("wallet")
+        with self.assertRaises(ValueError):
+            next(self.rag._progressive_build(key))
+        self.assertIsNone(self.rag.indexes.lookup(key))
+    
+    def test_build_progressive_finishes_in_the_background(self):
+        """The first stage is published before returning and the build completes in a thread."""
+        key = self.rag.build_progressive("validation")
+        self.assertIsNotNone(self.rag.indexes.lookup(key))
+        self.rag._builds[key].join(timeout=60)
+        coverage = self.rag.index_coverage(key)
+        self.assertEqual((coverage["coverage"], coverage["complete"], coverage["building"]), (100.0, True, False))
+        
+        # A complete index is not built again
+        build = self.rag.indexes.lookup(key)
+        self.assertEqual(self.rag.build_progressive("validation"), key)
+        self.assertEqual(self.rag.indexes.lookup(key), build)
+    
+    def test_build_progressive_finishes_an_interrupted_build(self):
+        """An index left incomplete, e.g. by an earlier process, is completed."""
+        key = self.rag.index_key("validation")
+        stages = self.rag._progressive_build(key)
+        next(stages)
+        self.assertFalse(self.rag.index_coverage(key)["complete"])
+        
+        self.rag.build_progressive("validation")
+        self.rag._builds[key].join(timeout=60)
+        self.assertEqual(self.rag.index_coverage(key)["chunks"], 14)
+    
+    def test_index_coverage_of_an_unbuilt_index(self):
+        """A key that was never published reports no coverage."""
+        coverage = self.rag.index_coverage(self.rag.index_key("validation"))
+        self.assertEqual(coverage, {"coverage": 0.0, "complete": False, "building": False})
+
+if __name__ == "__main__":
+    unittest.main()
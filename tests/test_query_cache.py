@@ -0,0 +1,95 @@
+"""
+Tests for caching query embeddings by model and normalized text.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from langchain_community.embeddings import FakeEmbeddings
+
+# Add the v3 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"))
+
+from embedding_switcher.query_cache import CachedQueryEmbeddings, QueryEmbeddingCache, normalize_query
+
+class CountingEmbeddings(FakeEmbeddings):
+    """Fake embeddings that record the queries they embed."""
+    
+    queries: list = []
+    
+    def embed_query(self, text):
+        self.queries.append(text)
+        return super().embed_query(text)
+
+class TestNormalizeQuery(unittest.TestCase):
+    """Test query normalization."""
+    
+    def test_whitespace_is_collapsed_and_case_kept(self):
+        """Runs of whitespace collapse to one space; identifiers keep their case."""
+        self.assertEqual(normalize_query("  How does\n\tCheckBlock   work? "), "How does CheckBlock work?")
+        self.assertNotEqual(normalize_query("CheckBlock"), normalize_query("checkblock"))
+
+class TestQueryEmbeddingCache(unittest.TestCase):
+    """Test LRU eviction and hit/miss counters."""
+    
+    def test_least_recently_used_entry_is_evicted(self):
+        """Reading an entry protects it from the next eviction."""
+        cache = QueryEmbeddingCache(max_entries=2)
+        cache.put("a", [1.0])
+        cache.put("b", [2.0])
+        self.assertEqual(cache.get("a"), [1.0])
+        cache.put("c", [3.0])
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), [1.0])
+        self.assertEqual(cache.get("c"), [3.0])
+    
+    def test_stats_count_hits_and_misses(self):
+        """Lookups are counted and clear resets them."""
+        cache = QueryEmbeddingCache(max_entries=4)
+        cache.get("a")
+        cache.put("a", [1.0])
+        cache.get("a")
+        cache.get("a")
+        self.assertEqual(cache.stats(), {"entries": 1, "max_entries": 4, "hits": 2, "misses": 1, "hit_rate": 2 / 3})
+        cache.clear()
+        self.assertEqual(cache.stats()["entries"], 0)
+        self.assertEqual(cache.stats()["hit_rate"], 0.0)
+    
+    def test_cached_embedding_is_a_copy(self):
+        """Changing a returned embedding does not change the cached one."""
+        cache = QueryEmbeddingCache()
+        cache.put("a", [1.0, 2.0])
+        cache.get("a").append(3.0)
+        self.assertEqual(cache.get("a"), [1.0, 2.0])
+
+class TestCachedQueryEmbeddings(unittest.TestCase):
+    """Test wrapping LangChain embeddings with the cache."""
+    
+    def setUp(self):
+        self.embeddings = CountingEmbeddings(size=8, queries=[])
+        self.cache = QueryEmbeddingCache()
+    
+    def test_repeated_query_is_embedded_once(self):
+        """Queries differing only in whitespace reuse one embedding."""
+        cached = CachedQueryEmbeddings(self.embeddings, "codebert", self.cache)
+        first = cached.embed_query("What is CheckBlock?")
+        second = cached.embed_query("What is  CheckBlock?\n")
+        self.assertEqual(first, second)
+        self.assertEqual(self.embeddings.queries, ["What is CheckBlock?"])
+    
+    def test_models_do_not_share_entries(self):
+        """The same query is embedded again for a different model."""
+        CachedQueryEmbeddings(self.embeddings, "codebert", self.cache).embed_query("mempool")
+        CachedQueryEmbeddings(self.embeddings, "unixcoder", self.cache).embed_query("mempool")
+        self.assertEqual(len(self.embeddings.queries), 2)
+        self.assertEqual(self.cache.stats()["entries"], 2)
+    
+    def test_documents_are_not_cached(self):
+        """Document embeddings bypass the cache, including as a matrix."""
+        cached = CachedQueryEmbeddings(self.embeddings, "codebert", self.cache)
+        self.assertEqual(len(cached.embed_documents(["a", "b"])), 2)
+        self.assertEqual(cached.embed_documents_np(["a", "b", "c"]).shape, (3, 8))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
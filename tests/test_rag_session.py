@@ -0,0 +1,152 @@
+"""
+Tests for keeping v3 indexes and QA chains warm across questions.
+"""
+
+import os
+import sys
+import hashlib
+import importlib.util
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+import yaml
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake import FakeListLLM
+
+# Add the v3 demo to path
+V3_DIR = Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"
+sys.path.append(str(V3_DIR))
+
+from embedding_switcher.base import BaseEmbeddingAdapter
+from embedding_switcher.docstore import DOCSTORE_FILE
+
+# Loaded by path, as v4 has a bitcoin_rag module too
+spec = importlib.util.spec_from_file_location("v3_bitcoin_rag", V3_DIR / "bitcoin_rag.py")
+v3_bitcoin_rag = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(v3_bitcoin_rag)
+
+CONFIG = {
+    "embedding": {"chunk_size": 60, "chunk_overlap": 0, "cache_dir": "embedding_cache", "max_resident_models": 1},
+    "file_patterns": {"include": ["*.cpp"], "exclude": []}
+}
+
+class HashAdapter(BaseEmbeddingAdapter, Embeddings):
+    """Deterministic embedder deriving each vector from a hash of the text."""
+    
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+    
+    def embed_query(self, text):
+        return [float(b) for b in hashlib.sha256(text.encode()).digest()[:8]]
+    
+    def get_model_info(self):
+        return {"name": "hash"}
+
+class TestRAGSession(unittest.TestCase):
+    """Test loading, reusing and reloading indexes through the manifest."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        # BitcoinRAG reads the repository and writes its cache relative to the working directory
+        os.chdir(self.tmp.name)
+        repo = Path("bitcoin")
+        (repo / "src").mkdir(parents=True)
+        (repo / "src" / "validation.cpp").write_text(
+            "".join(f"int check_{i}(int x)\n{{\n    return x + {i};\n}}\n\n" for i in range(4))
+        )
+        for args in (["init", "--quiet", "-b", "master"], ["add", "-A"], ["commit", "--quiet", "-m", "Initial commit"]):
+            subprocess.run(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+                           cwd=repo, check=True, capture_output=True)
+        Path("embedding_config.yaml").write_text(yaml.safe_dump(CONFIG))
+        
+        self.rag = v3_bitcoin_rag.BitcoinRAG("embedding_config.yaml")
+        self.rag.llm = FakeListLLM(responses=["It checks x."])
+        for name in ("codebert", "unixcoder"):
+            self.rag.embedding_switcher.register_factory(name, HashAdapter)
+        self.chunks = self.rag.load_repository()
+        self.session = self.rag.session
+    
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+    
+    def publish(self, model_name="codebert", chunks=None):
+        """Build and publish an index of the repository, returning its key."""
+        self.rag.create_embeddings(self.chunks if chunks is None else chunks, model_name)
+        return self.rag.index_key(model_name=model_name)
+    
+    def test_warm_chain_is_reused(self):
+        """Later questions get the same chain without opening the index again."""
+        key = self.publish()
+        chain = self.session.get_chain(key)
+        self.assertIs(self.session.get_chain(key), chain)
+        stats = self.session.stats()[key.slug()]
+        self.assertEqual((stats["loads"], stats["questions"]), (1, 2))
+    
+    def test_republished_index_swaps_index_and_chain(self):
+        """A new build of the key replaces the loaded index and chain; counters carry over."""
+        key = self.publish()
+        chain = self.session.get_chain(key)
+        self.publish(chunks=self.chunks[:2])
+        
+        reloaded = self.session.get_chain(key)
+        self.assertIsNot(reloaded, chain)
+        self.assertIs(self.session.get_chain(key), reloaded)
+        entry = self.session._entries[key]
+        self.assertEqual(entry["index_dir"], self.rag.indexes.lookup(key))
+        self.assertEqual(entry["vector_store"].index.ntotal, 2)
+        stats = self.session.stats()[key.slug()]
+        self.assertEqual((stats["loads"], stats["questions"]), (2, 3))
+    
+    def test_failed_reload_keeps_the_loaded_index(self):
+        """If a new build cannot be opened, questions are answered from the loaded one."""
+        key = self.publish()
+        chain = self.session.get_chain(key)
+        loaded = self.session._entries[key]["index_dir"]
+        self.publish(chunks=self.chunks[:2])
+        (self.rag.indexes.lookup(key) / DOCSTORE_FILE).unlink()
+        
+        self.assertIs(self.session.get_chain(key), chain)
+        self.assertEqual(self.session._entries[key]["index_dir"], loaded)
+    
+    def test_reloaded_model_is_attached_to_its_warm_index(self):
+        """An index whose model was unloaded drops it and gets the reloaded adapter on its next use."""
+        codebert, unixcoder = self.publish("codebert"), self.publish("unixcoder")
+        chain = self.session.get_chain(codebert)
+        first_adapter = self.session._entries[codebert]["vector_store"].embedding_function
+        self.session.get_chain(unixcoder)
+        self.assertEqual(self.rag.embedding_switcher.resident_embedders(), ["unixcoder"])
+        self.assertIsNone(self.session._entries[codebert]["vector_store"].embedding_function)
+        
+        self.assertIs(self.session.get_chain(codebert), chain)
+        adapter = self.session._entries[codebert]["vector_store"].embedding_function
+        self.assertIs(adapter, self.rag.embedding_switcher.embedders["codebert"])
+        self.assertIsNot(adapter, first_adapter)
+        self.assertIsNone(self.session._entries[unixcoder]["vector_store"].embedding_function)
+        self.assertEqual(self.session.stats()[codebert.slug()]["loads"], 1)
+    
+    def test_invalidate_reloads_on_the_next_question(self):
+        """An invalidated index is opened again with a new chain."""
+        key = self.publish()
+        chain = self.session.get_chain(key)
+        self.session.invalidate(key)
+        self.assertIsNot(self.session.get_chain(key), chain)
+    
+    def test_ask_answers_from_the_warm_chain(self):
+        """ask returns the LLM answer with the packed passages it was given."""
+        key = self.publish()
+        result = self.session.ask("What does check_2 return?", key)
+        self.assertEqual(result["answer"], "It checks x.")
+        self.assertTrue(result["sources"])
+        self.assertTrue(all(source["source"] == "src/validation.cpp" for source in result["sources"]))
+        self.assertGreater(self.session.stats()[key.slug()]["documents_read"], 0)
+    
+    def test_unpublished_index_is_an_error(self):
+        """Asking for a key that was never built raises FileNotFoundError."""
+        with self.assertRaises(FileNotFoundError):
+            self.session.get_chain(self.rag.index_key())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Tests for splitting CPU cores between model replicas and running batches on them.
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+import torch
+from transformers import RobertaConfig, RobertaModel
+
+# Add the v3 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4" / "bitcoin-demo-v3"))
+
+from embedding_switcher.replicas import (
+    ReplicaRunner, available_cores, best_replica_split, candidate_splits, partition_cores, pool_hidden_states
+)
+
+def padded_batch():
+    """Two inputs of different lengths, the shorter one padded."""
+    input_ids = np.array([[0, 11, 12, 13, 14, 2], [0, 21, 2, 1, 1, 1]], dtype=np.int64)
+    return {"input_ids": input_ids, "attention_mask": (input_ids != 1).astype(np.int64)}
+
+class TestCoreSplits(unittest.TestCase):
+    """Test partitioning cores and choosing splits."""
+    
+    def test_partition_cores(self):
+        """Replicas get disjoint, equal core sets; impossible splits fail."""
+        self.assertEqual(partition_cores(2, cores=range(8)), [[0, 1, 2, 3], [4, 5, 6, 7]])
+        self.assertEqual(partition_cores(3, 2, cores=range(8)), [[0, 1], [2, 3], [4, 5]])
+        with self.assertRaises(ValueError):
+            partition_cores(3, 3, cores=range(8))
+        with self.assertRaises(ValueError):
+            partition_cores(0, cores=range(8))
+    
+    def test_candidate_splits(self):
+        """Splits double the replicas and always end at one thread each."""
+        self.assertEqual(candidate_splits(8), [(1, 8), (2, 4), (4, 2), (8, 1)])
+        self.assertEqual(candidate_splits(6), [(1, 6), (2, 3), (4, 1), (6, 1)])
+    
+    def test_best_replica_split(self):
+        """The split with the highest throughput wins."""
+        rows = [{"replicas": 1, "threads_per_replica": 8, "docs_per_second": 10.0},
+                {"replicas": 4, "threads_per_replica": 2, "docs_per_second": 25.0}]
+        self.assertEqual(best_replica_split(rows), (4, 2))
+    
+    def test_pool_hidden_states(self):
+        """cls takes the first position; mean averages unpadded positions only."""
+        hidden = np.arange(12, dtype=np.float32).reshape(2, 3, 2)
+        mask = np.array([[1, 1, 1], [1, 0, 0]])
+        np.testing.assert_array_equal(pool_hidden_states(hidden, mask, "cls"), [[0, 1], [6, 7]])
+        np.testing.assert_array_equal(pool_hidden_states(hidden, mask, "mean"), [[2, 3], [6, 7]])
+
+class TestReplicaRunner(unittest.TestCase):
+    """Test embedding batches in a replica process."""
+    
+    @classmethod
+    def setUpClass(cls):
+        # A randomly initialized model saved locally, so no weights are downloaded
+        cls.tmp = tempfile.TemporaryDirectory()
+        torch.manual_seed(0)
+        config = RobertaConfig(vocab_size=100, hidden_size=32, num_hidden_layers=1, num_attention_heads=2,
+                               intermediate_size=64, max_position_embeddings=64)
+        cls.model = RobertaModel(config).eval()
+        cls.model_dir = str(Path(cls.tmp.name) / "tiny-roberta")
+        cls.model.save_pretrained(cls.model_dir)
+        cls.cores = available_cores()[:1]
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+    
+    def hidden(self, inputs):
+        """Hidden states of the in-process model for numpy inputs."""
+        with torch.no_grad():
+            return self.model(**{k: torch.from_numpy(v) for k, v in inputs.items()}).last_hidden_state.numpy()
+    
+    def test_batches_match_in_process_model(self):
+        """Results come back in order with the runner's or the batch's pooling."""
+        inputs = padded_batch()
+        hidden = self.hidden(inputs)
+        with ReplicaRunner(self.model_dir, 1, cores=self.cores) as runner:
+            first, second = runner.map([inputs, inputs])
+            mean = runner.submit(inputs, "mean").result(timeout=60)
+            stats = runner.stats()
+        np.testing.assert_allclose(first, hidden[:, 0, :], atol=1e-5)
+        np.testing.assert_allclose(second, first)
+        np.testing.assert_allclose(mean, pool_hidden_states(hidden, inputs["attention_mask"], "mean"), atol=1e-5)
+        self.assertEqual(stats["completed"], [3])
+        self.assertEqual(stats["cores"], [self.cores])
+    
+    def test_exited_replica_fails_its_batches(self):
+        """Batches of a killed replica fail instead of waiting forever."""
+        runner = ReplicaRunner(self.model_dir, 1, cores=self.cores)
+        try:
+            runner._processes[0].kill()
+            runner._processes[0].join()
+            future = runner.submit(padded_batch())
+            with self.assertRaisesRegex(RuntimeError, "exited"):
+                future.result(timeout=30)
+            self.assertEqual(runner.stats()["alive"], [False])
+            with self.assertRaisesRegex(RuntimeError, "All replicas"):
+                runner.submit(padded_batch())
+        finally:
+            runner.close()
+        with self.assertRaisesRegex(RuntimeError, "closed"):
+            runner.submit(padded_batch())
+    
+    def test_invalid_arguments(self):
+        """Unknown backends, pooling and dispatch policies fail before starting."""
+        with self.assertRaises(ValueError):
+            ReplicaRunner(self.model_dir, 1, backend="tensorrt", cores=self.cores)
+        with self.assertRaises(ValueError):
+            ReplicaRunner(self.model_dir, 1, backend="onnx", cores=self.cores)
+        with self.assertRaises(ValueError):
+            ReplicaRunner(self.model_dir, 1, pooling="max", cores=self.cores)
+        with self.assertRaises(ValueError):
+            ReplicaRunner(self.model_dir, 1, dispatch="random", cores=self.cores)
+
+if __name__ == "__main__":
+    unittest.main()
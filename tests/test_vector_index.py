@@ -0,0 +1,78 @@
+"""
+Tests for FAISS index construction and automatic tuning.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+import numpy as np
+
+# Add the v4 demo to path
+sys.path.append(str(Path(__file__).parent.parent / "bitcoin-demo-v4"))
+
+import faiss
+from vector_index import IndexConfig, AUTO_INDEX, auto_tune_index, build_index, faiss_index_bytes
+
+def random_vectors(n, d=32, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, d)).astype(np.float32)
+
+class TestAutoTuneIndex(unittest.TestCase):
+    """Test that tuned indexes keep row ids aligned with the input vectors."""
+    
+    def assert_rows_in_order(self, index, vectors):
+        _, ids = index.search(vectors, 1)
+        self_hits = np.mean(ids[:, 0] == np.arange(len(vectors)))
+        self.assertGreaterEqual(self_hits, 0.99)
+    
+    def test_hnsw_rows_follow_input_order(self):
+        """search(vectors[i]) returns i after HNSW tuning."""
+        vectors = random_vectors(3000)
+        config = IndexConfig(index_type=AUTO_INDEX, exact_threshold=1000, tuning_queries=100)
+        index, tuned, _ = auto_tune_index(vectors, config)
+        self.assertEqual(tuned.index_type, "hnsw")
+        self.assertEqual(index.ntotal, len(vectors))
+        self.assert_rows_in_order(index, vectors)
+    
+    def test_ivf_rows_follow_input_order(self):
+        """search(vectors[i]) returns i after IVF tuning."""
+        vectors = random_vectors(3000, seed=1)
+        config = IndexConfig(index_type=AUTO_INDEX, exact_threshold=1000, hnsw_max_vectors=2000,
+                             tuning_queries=100)
+        index, tuned, _ = auto_tune_index(vectors, config)
+        self.assertEqual(tuned.index_type, "ivf_flat")
+        self.assertEqual(index.ntotal, len(vectors))
+        self.assert_rows_in_order(index, vectors)
+    
+    def test_small_corpus_is_exact(self):
+        """Corpora below the threshold get an exact flat index."""
+        vectors = random_vectors(200)
+        index, tuned, report = auto_tune_index(vectors, IndexConfig(index_type=AUTO_INDEX))
+        self.assertEqual(tuned.index_type, "flat")
+        self.assertEqual(report["recall"], 1.0)
+        self.assert_rows_in_order(index, vectors)
+    
+    def test_untrainable_corpus_falls_back_to_flat(self):
+        """Too few vectors to train IVF-PQ gives a flat index."""
+        vectors = random_vectors(50)
+        index = build_index(vectors, IndexConfig(index_type="ivf_pq"))
+        self.assertEqual(index.ntotal, 50)
+        self.assert_rows_in_order(index, vectors)
+
+class TestIndexBytes(unittest.TestCase):
+    """Test the index size estimate used for memory accounting."""
+    
+    def test_estimate_matches_serialized_size(self):
+        """The estimate is within a few percent of the serialized index for every type."""
+        vectors = random_vectors(5000, d=64)
+        for index_type in ["flat", "hnsw", "sq8", "ivf_flat", "ivf_pq"]:
+            index = build_index(vectors, IndexConfig(index_type=index_type))
+            serialized = faiss.serialize_index(index).nbytes
+            self.assertAlmostEqual(faiss_index_bytes(index) / serialized, 1.0, delta=0.02, msg=index_type)
+    
+    def test_estimate_grows_with_vectors(self):
+        """A flat index costs d * 4 bytes per vector."""
+        index = build_index(random_vectors(100, d=16), IndexConfig(index_type="flat"))
+        self.assertEqual(faiss_index_bytes(index), 100 * 16 * 4)
+
+if __name__ == "__main__":
+    unittest.main()